@@ -46,7 +46,7 @@ def create_app():
     # Инициализируем генераторы и базу данных при запуске
     with app.app_context():
         # Импортируем модели ПЕРЕД созданием таблиц
-        from app.models import User
+        from app.models import User, Job, GroupStatsDay, Post, PostMetricsSnapshot, ScheduledPost, SchedulerLease, GeneratedImage
         
         # Создаем базу данных и таблицы, если их нет
         try:
@@ -79,23 +79,111 @@ def create_app():
             import traceback
             traceback.print_exc()
         
-        from generators.text_gen import TextGenerator
+        from generators.text_gen import TextGenerator, ProviderLimiter, create_response_cache
         from generators.image_gen import ImageGenerator
         
         config = app.config['API_CONFIG']
         
         # Создаем генераторы один раз
+        text_config = config.get('text_generation', {})
         app.text_generator = TextGenerator(
             api_key=config['api_keys']['deepseek'],
-            base_url=config['api_urls']['deepseek']
+            base_url=config['api_urls']['deepseek'],
+            timeout=text_config.get('timeout', 60),
+            max_workers=text_config.get('max_workers', 8),
+            batch_workers=text_config.get('batch_max_workers', 4),
+            cache=create_response_cache(text_config.get('cache')),
+            limiter=ProviderLimiter(
+                max_concurrent=text_config.get('max_concurrent_requests', 8),
+                requests_per_minute=text_config.get('requests_per_minute')
+            )
         )
         
+        # Повторный запрос с теми же параметрами отдается из кэша изображений
+        from generators.image_cache import create_image_cache
+        from app.smm.tasks import IMAGES_DIR
+        
         app.image_generator = ImageGenerator(
             config=config.get('image_generation', {
                 'provider': 'webui',
                 'webui': {'base_url': 'http://localhost:7860'}
-            })
+            }),
+            cache=create_image_cache(config.get('image_generation', {}).get('cache'), IMAGES_DIR)
+        )
+        
+        # Общая HTTP-сессия VK с пулом соединений и таймаутами
+        from generators.vk_publisher import configure_session
+        from generators.vk_rate_limiter import configure_rate_limit
+        
+        vk_http_config = config.get('vk', {}).get('http', {})
+        configure_session(
+            pool_size=vk_http_config.get('pool_size'),
+            retries=vk_http_config.get('retries'),
+            timeout=vk_http_config.get('timeout'),
+            upload_timeout=vk_http_config.get('upload_timeout'),
+            api_url=config.get('vk', {}).get('api_url'),
+            max_photo_size=config.get('vk', {}).get('max_photo_size_mb', 50) * 1024 * 1024
+        )
+        
+        # Сжатие фото перед загрузкой в VK в пуле процессов (создается до запуска рабочих потоков)
+        from generators.image_prep import configure_image_prep
+        
+        photo_processing = config.get('vk', {}).get('photo_processing', {})
+        configure_image_prep(
+            enabled=photo_processing.get('enabled'),
+            max_size=photo_processing.get('max_size'),
+            image_format=photo_processing.get('format'),
+            quality=photo_processing.get('quality'),
+            workers=photo_processing.get('workers')
+        )
+        
+        # Запросы больше допустимого фото (с запасом на поля формы) отклоняются до чтения тела
+        if app.config.get('MAX_CONTENT_LENGTH') is None:
+            app.config['MAX_CONTENT_LENGTH'] = (config.get('vk', {}).get('max_photo_size_mb', 50) + 1) * 1024 * 1024
+        
+        # Ограничение частоты запросов к VK на каждый токен доступа
+        vk_rate_config = config.get('vk', {}).get('rate_limit', {})
+        configure_rate_limit(
+            requests_per_second=vk_rate_config.get('requests_per_second'),
+            burst=vk_rate_config.get('burst'),
+            max_retries=vk_rate_config.get('max_retries'),
+            backoff_base=vk_rate_config.get('backoff_base'),
+            backoff_max=vk_rate_config.get('backoff_max')
+        )
+        
+        # Фоновая очередь задач (генерация изображений не блокирует запросы)
+        from app.jobs import JobQueue
+        from app.smm.tasks import generate_image_task, preupload_images_task
+        
+        jobs_config = config.get('jobs', {})
+        app.job_queue = JobQueue(
+            app,
+            handlers={
+                'generate_image': generate_image_task,
+                'preupload_images': preupload_images_task
+            },
+            workers=jobs_config.get('workers', 2),
+            lease_seconds=jobs_config.get('lease_seconds', 600),
+            max_attempts=jobs_config.get('max_attempts', 3)
+        )
+        app.job_queue.start()
+        
+        # Локальный планировщик публикаций (диспетчер работает в одном процессе)
+        from app.scheduler import PostScheduler
+        from generators.vk_publisher import VKPublisher
+        
+        scheduler_config = config.get('scheduler', {})
+        app.post_scheduler = PostScheduler(
+            app,
+            publisher_factory=lambda group_id: VKPublisher(config['vk']['access_token'], group_id),
+            poll_interval=scheduler_config.get('poll_interval', 30),
+            lease_seconds=scheduler_config.get('lease_seconds', 120),
+            max_attempts=scheduler_config.get('max_attempts', 5),
+            retry_base=scheduler_config.get('retry_base', 60),
+            batch_size=scheduler_config.get('batch_size', 50)
         )
+        if scheduler_config.get('enabled', True):
+            app.post_scheduler.start()
 
     # Регистрируем блюпринты
     from app.auth import bp as auth_bp
@@ -0,0 +1,222 @@
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Callable
+
+from sqlalchemy import or_, and_
+
+from app import db
+from app.models import Job
+
+class JobQueue:
+    """
+    Очередь фоновых задач с состоянием в базе данных приложения
+
+    Задачи хранятся в таблице Job, поэтому перезапуск процесса не теряет
+    поставленную в очередь работу. Внешний брокер не нужен: задачи
+    выполняются пулом потоков внутри процесса.
+
+    Задача захватывается атомарным UPDATE с арендой (lease_until). Если
+    процесс упал во время выполнения, аренда истекает и задача снова
+    становится доступной, пока не исчерпан лимит попыток. Благодаря этому
+    очередь корректно работает и при нескольких процессах с одной базой.
+    """
+
+    def __init__(self, app, handlers: Dict[str, Callable[[str, Dict[str, Any]], Dict[str, Any]]],
+                 workers: int = 2, lease_seconds: int = 600, max_attempts: int = 3,
+                 poll_interval: float = 1.0, retention_days: int = 7):
+        """
+        Args:
+            app: Приложение Flask (обработчики выполняются в его контексте)
+            handlers: Обработчики по типу задачи: handler(job_id, payload) -> result
+            workers: Число рабочих потоков
+            lease_seconds: Время аренды задачи рабочим потоком
+            max_attempts: Максимум попыток выполнения после сбоев процесса
+            poll_interval: Период опроса базы на случай задач от других процессов
+            retention_days: Сколько дней хранить завершенные задачи
+        """
+        self.app = app
+        self.handlers = handlers
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Запускает рабочие потоки"""
+        with self.app.app_context():
+            self._purge_finished()
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'job_worker_{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Останавливает рабочие потоки после завершения текущих задач"""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def submit(self, kind: str, payload: Dict[str, Any], user_id: Optional[int] = None) -> str:
+        """
+        Ставит задачу в очередь
+
+        Args:
+            kind: Тип задачи (ключ в handlers)
+            payload: Параметры задачи (должны сериализоваться в JSON)
+            user_id: Владелец задачи
+
+        Returns:
+            Идентификатор задачи
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            user_id=user_id,
+            status='queued',
+            payload=json.dumps(payload, ensure_ascii=False)
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        with self._wakeup:
+            self._wakeup.notify()
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Возвращает задачу по идентификатору"""
+        return db.session.get(Job, job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Отменяет задачу
+
+        Задача в очереди отменяется сразу. Выполняющейся задаче ставится
+        флаг отмены: обработчик узнает о нем при следующем report_progress
+        и прерывает работу, в том числе в другом процессе.
+
+        Returns:
+            True, если задача еще не завершена и отмена принята
+        """
+        cancelled = Job.query.filter_by(id=job_id, status='queued').update({
+            'status': 'cancelled',
+            'cancel_requested': True,
+            'finished_at': datetime.utcnow()
+        }, synchronize_session=False)
+        if not cancelled:
+            cancelled = Job.query.filter_by(id=job_id, status='running').update(
+                {'cancel_requested': True}, synchronize_session=False
+            )
+        db.session.commit()
+        return bool(cancelled)
+
+    def report_progress(self, job_id: str, progress: float, info: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Сохраняет прогресс выполняющейся задачи и продлевает ее аренду
+
+        Args:
+            job_id: Идентификатор задачи
+            progress: Доля выполненной работы (0-1)
+            info: Дополнительные сведения для клиента (должны сериализоваться в JSON)
+
+        Returns:
+            True, если задачу запросили отменить
+        """
+        Job.query.filter_by(id=job_id, status='running').update({
+            'progress': progress,
+            'progress_info': json.dumps(info, ensure_ascii=False) if info else None,
+            'lease_until': datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+        }, synchronize_session=False)
+        db.session.commit()
+        return bool(db.session.query(Job.cancel_requested).filter_by(id=job_id).scalar())
+
+    def _purge_finished(self):
+        border = datetime.utcnow() - timedelta(days=self.retention_days)
+        Job.query.filter(
+            Job.status.in_(['done', 'failed', 'cancelled']),
+            Job.finished_at < border
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    def _claim(self) -> Optional[Job]:
+        """Захватывает следующую доступную задачу"""
+        now = datetime.utcnow()
+        candidates = Job.query.filter(
+            Job.kind.in_(list(self.handlers)),
+            or_(
+                Job.status == 'queued',
+                and_(Job.status == 'running', Job.lease_until < now)
+            )
+        ).order_by(Job.created_at).limit(10).all()
+
+        for job in candidates:
+            if job.cancel_requested:
+                # Процесс упал, выполняя отмененную задачу, - повторять ее не нужно
+                Job.query.filter_by(id=job.id, attempts=job.attempts, status=job.status).update({
+                    'status': 'cancelled',
+                    'finished_at': now
+                }, synchronize_session=False)
+                db.session.commit()
+                continue
+
+            if job.attempts >= self.max_attempts:
+                # Процесс несколько раз падал на этой задаче - больше не пробуем
+                Job.query.filter_by(id=job.id, attempts=job.attempts, status=job.status).update({
+                    'status': 'failed',
+                    'error': 'Превышено число попыток выполнения',
+                    'finished_at': now
+                }, synchronize_session=False)
+                db.session.commit()
+                continue
+
+            # Условие на status и attempts делает захват атомарным между потоками и процессами
+            claimed = Job.query.filter_by(id=job.id, attempts=job.attempts, status=job.status).update({
+                'status': 'running',
+                'attempts': job.attempts + 1,
+                'lease_until': now + timedelta(seconds=self.lease_seconds),
+                'started_at': now
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                db.session.expire_all()
+                return db.session.get(Job, job.id)
+        return None
+
+    def _run(self, job: Job):
+        handler = self.handlers[job.kind]
+        try:
+            result = handler(job.id, json.loads(job.payload))
+            job.status = 'done'
+            job.result = json.dumps(result, ensure_ascii=False)
+        except Exception as e:
+            db.session.rollback()
+            # Обработчик прервал работу по запросу отмены (см. report_progress)
+            job.status = 'cancelled' if job.cancel_requested else 'failed'
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        job.lease_until = None
+        db.session.commit()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            job = None
+            try:
+                with self.app.app_context():
+                    job = self._claim()
+                    if job is not None:
+                        self._run(job)
+            except Exception as e:
+                print(f"⚠️ Ошибка обработки фоновой задачи: {e}")
+
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval)
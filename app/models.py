@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
+import json
+import os
 from app import db, bcrypt
 
 class User(UserMixin, db.Model):
@@ -20,3 +22,217 @@ class User(UserMixin, db.Model):
 
     def __repr__(self):
         return f'<User {self.username}>'
+
+class Job(db.Model):
+    """Фоновая задача (например, генерация изображения)"""
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    lease_until = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    progress = db.Column(db.Float, nullable=True)
+    progress_info = db.Column(db.Text, nullable=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('ix_job_status_created_at', 'status', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'progress': self.progress,
+            'progress_info': json.loads(self.progress_info) if self.progress_info else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class GroupStatsDay(db.Model):
+    """Дневная статистика сообщества VK (локальная копия stats.get)"""
+    id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.String(100), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    period_from = db.Column(db.Integer, nullable=False)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    visitors = db.Column(db.Integer, nullable=False, default=0)
+    mobile_views = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+    copies = db.Column(db.Integer, nullable=False, default=0)
+    synced_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Уникальный индекс (group_id, day) обслуживает и запросы по диапазону дат
+    __table_args__ = (
+        db.UniqueConstraint('group_id', 'day', name='uq_group_stats_day'),
+    )
+
+    def __repr__(self):
+        return f'<GroupStatsDay {self.group_id} {self.day}>'
+
+class Post(db.Model):
+    """Пост, опубликованный или запланированный через приложение"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    group_id = db.Column(db.String(100), nullable=False)
+    vk_post_id = db.Column(db.Integer, nullable=True)
+    message = db.Column(db.Text, nullable=False, default='')
+    has_photo = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(20), nullable=False, default='published')
+    # Для запланированных постов - время, на которое назначена публикация
+    published_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    snapshots = db.relationship('PostMetricsSnapshot', backref='post', lazy='dynamic',
+                                cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_post_user_group_published_at', 'user_id', 'group_id', 'published_at'),
+        db.Index('ix_post_group_vk_post_id', 'group_id', 'vk_post_id', unique=True),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'group_id': self.group_id,
+            'vk_post_id': self.vk_post_id,
+            'message': self.message,
+            'has_photo': self.has_photo,
+            'status': self.status,
+            'published_at': self.published_at.isoformat() if self.published_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<Post {self.group_id}_{self.vk_post_id} {self.status}>'
+
+class PostMetricsSnapshot(db.Model):
+    """Снимок статистики поста на момент запроса к VK"""
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    captured_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    reposts = db.Column(db.Integer, nullable=False, default=0)
+    comments = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_post_metrics_snapshot_post_captured_at', 'post_id', 'captured_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'views': self.views,
+            'likes': self.likes,
+            'reposts': self.reposts,
+            'comments': self.comments,
+            'captured_at': self.captured_at.isoformat() if self.captured_at else None
+        }
+
+    def __repr__(self):
+        return f'<PostMetricsSnapshot {self.post_id} {self.captured_at}>'
+
+class ScheduledPost(db.Model):
+    """Пост в локальной очереди отложенной публикации"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    group_id = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False, default='')
+    photo_path = db.Column(db.String(255), nullable=True)
+    # pending -> publishing -> published; failed после исчерпания попыток; cancelled
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    publish_at = db.Column(db.DateTime, nullable=False)
+    # Время следующей попытки: при повторе сдвигается вперед, publish_at не меняется
+    due_at = db.Column(db.DateTime, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    lease_until = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    published_at = db.Column(db.DateTime, nullable=True)
+
+    post = db.relationship('Post')
+
+    __table_args__ = (
+        db.Index('ix_scheduled_post_status_due_at', 'status', 'due_at'),
+        db.Index('ix_scheduled_post_user_publish_at', 'user_id', 'publish_at'),
+    )
+
+    @property
+    def guid(self):
+        """Идентификатор публикации для VK: повтор после сбоя не создаст второй пост"""
+        return f'smm-scheduled-{self.id}'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'group_id': self.group_id,
+            'message': self.message,
+            'has_photo': self.photo_path is not None,
+            'status': self.status,
+            'publish_at': self.publish_at.isoformat() if self.publish_at else None,
+            'attempts': self.attempts,
+            'error': self.error,
+            'vk_post_id': self.post.vk_post_id if self.post else None,
+            'published_at': self.published_at.isoformat() if self.published_at else None
+        }
+
+    def __repr__(self):
+        return f'<ScheduledPost {self.id} {self.status} {self.publish_at}>'
+
+class SchedulerLease(db.Model):
+    """Аренда роли ведущего диспетчера (один активный диспетчер на базу)"""
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(64), nullable=False)
+    lease_until = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} {self.owner}>'
+
+class GeneratedImage(db.Model):
+    """Сгенерированное изображение пользователя (файл может быть общим - кэш изображений)"""
+    id = db.Column(db.String(32), primary_key=True)
+    # Задача генерации (None - изображение взято из кэша без задачи)
+    job_id = db.Column(db.String(32), nullable=True, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    path = db.Column(db.String(255), nullable=False)
+    # Фото, уже сохраненное в группе: публикация обходится одним wall.post
+    vk_group_id = db.Column(db.String(100), nullable=True)
+    vk_attachment = db.Column(db.String(100), nullable=True)
+    uploaded_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # Поиск уже выданного пользователю файла (register_images)
+    __table_args__ = (
+        db.Index('ix_generated_image_user_path', 'user_id', 'path'),
+    )
+
+    def attachment_for(self, group_id):
+        """Вложение для wall.post, если фото предзагружено в эту группу"""
+        if self.vk_attachment and self.vk_group_id == str(group_id).lstrip('-'):
+            return self.vk_attachment
+        return None
+
+    def to_dict(self):
+        return {
+            'image_id': self.id,
+            'image_url': f"/static/generated_images/{os.path.basename(self.path)}",
+            'vk_group_id': self.vk_group_id,
+            'vk_attachment': self.vk_attachment
+        }
+
+    def __repr__(self):
+        return f'<GeneratedImage {self.id} {self.vk_attachment}>'
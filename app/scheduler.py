@@ -0,0 +1,255 @@
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, List
+
+from sqlalchemy import or_, and_, func
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import ScheduledPost, SchedulerLease
+
+LEADER_LEASE_NAME = 'post_scheduler'
+
+class PostScheduler:
+    """
+    Локальный планировщик публикаций VK
+
+    Запланированные посты хранятся в таблице ScheduledPost и публикуются
+    диспетчером в назначенное время обычным wall.post, без отложенных
+    записей VK.
+
+    Диспетчер работает только в одном процессе: ведущий определяется
+    арендой строки SchedulerLease, остальные процессы ждут ее истечения.
+    Готовые к публикации посты выбираются по индексу (status, due_at),
+    а до следующего срока диспетчер спит, не опрашивая таблицу целиком.
+    Повторная публикация после сбоя не создает дубль: в wall.post
+    передается guid поста.
+    """
+
+    def __init__(self, app, publisher_factory, poll_interval: float = 30.0,
+                 lease_seconds: int = 120, max_attempts: int = 5,
+                 retry_base: float = 60.0, batch_size: int = 50):
+        """
+        Args:
+            app: Приложение Flask (публикация выполняется в его контексте)
+            publisher_factory: Функция group_id -> VKPublisher
+            poll_interval: Максимальный интервал сна диспетчера в секундах
+            lease_seconds: Время аренды роли ведущего и публикуемого поста
+            max_attempts: Максимум попыток публикации поста
+            retry_base: Базовая задержка повтора в секундах (удваивается с каждой попыткой)
+            batch_size: Сколько готовых постов выбирать за один проход
+        """
+        self.app = app
+        self.publisher_factory = publisher_factory
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.batch_size = batch_size
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запускает поток диспетчера"""
+        self._thread = threading.Thread(target=self._dispatcher, name='post_scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает диспетчер после текущего прохода"""
+        self._stop.set()
+        self._notify()
+
+    def _notify(self):
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def schedule(self, user_id: Optional[int], group_id: str, message: str, publish_at: datetime,
+                 photo_path: Optional[str] = None) -> ScheduledPost:
+        """
+        Ставит пост в очередь публикации
+
+        Args:
+            user_id: Автор публикации
+            group_id: ID группы
+            message: Текст поста
+            publish_at: Время публикации (UTC)
+            photo_path: Путь к файлу фото (удаляется после публикации)
+
+        Returns:
+            Запись очереди
+        """
+        scheduled = ScheduledPost(
+            user_id=user_id,
+            group_id=str(group_id),
+            message=message,
+            photo_path=photo_path,
+            publish_at=publish_at,
+            due_at=publish_at
+        )
+        db.session.add(scheduled)
+        db.session.commit()
+
+        # Пост мог стать самым ранним - диспетчер пересчитает время сна
+        self._notify()
+        return scheduled
+
+    def cancel(self, scheduled_id: int, user_id: Optional[int] = None) -> bool:
+        """Отменяет пост, если его публикация еще не началась"""
+        query = ScheduledPost.query.filter_by(id=scheduled_id, status='pending')
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        photo_path = db.session.query(ScheduledPost.photo_path).filter_by(id=scheduled_id).scalar()
+        cancelled = query.update({'status': 'cancelled'}, synchronize_session=False)
+        db.session.commit()
+        if cancelled:
+            self._remove_photo(photo_path)
+        return bool(cancelled)
+
+    def list_scheduled(self, user_id: Optional[int], statuses: Optional[List[str]] = None,
+                       limit: int = 100) -> List[ScheduledPost]:
+        """Посты пользователя в очереди по времени публикации"""
+        query = ScheduledPost.query.filter(ScheduledPost.user_id == user_id)
+        if statuses:
+            query = query.filter(ScheduledPost.status.in_(statuses))
+        return query.order_by(ScheduledPost.publish_at).limit(limit).all()
+
+    def _acquire_leadership(self) -> bool:
+        """Захватывает или продлевает аренду роли ведущего"""
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=self.lease_seconds)
+
+        updated = SchedulerLease.query.filter(
+            SchedulerLease.name == LEADER_LEASE_NAME,
+            or_(SchedulerLease.owner == self.owner, SchedulerLease.lease_until < now)
+        ).update({'owner': self.owner, 'lease_until': lease_until}, synchronize_session=False)
+        db.session.commit()
+        if updated:
+            return True
+
+        if db.session.get(SchedulerLease, LEADER_LEASE_NAME) is not None:
+            return False
+        try:
+            db.session.add(SchedulerLease(name=LEADER_LEASE_NAME, owner=self.owner, lease_until=lease_until))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            # Другой процесс стал ведущим одновременно с нами
+            db.session.rollback()
+            return False
+
+    def _due_filter(self, now: datetime):
+        return or_(
+            and_(ScheduledPost.status == 'pending', ScheduledPost.due_at <= now),
+            # Процесс упал во время публикации - повторяем (guid исключит дубль)
+            and_(ScheduledPost.status == 'publishing', ScheduledPost.lease_until < now)
+        )
+
+    def _next_due(self) -> Optional[datetime]:
+        """Ближайший срок публикации (один поиск по индексу)"""
+        return db.session.query(func.min(ScheduledPost.due_at)).filter(
+            ScheduledPost.status == 'pending'
+        ).scalar()
+
+    def _claim(self, scheduled: ScheduledPost) -> bool:
+        now = datetime.utcnow()
+        # Условие на status и attempts делает захват атомарным между процессами
+        claimed = ScheduledPost.query.filter_by(
+            id=scheduled.id, status=scheduled.status, attempts=scheduled.attempts
+        ).update({
+            'status': 'publishing',
+            'attempts': scheduled.attempts + 1,
+            'lease_until': now + timedelta(seconds=self.lease_seconds)
+        }, synchronize_session=False)
+        db.session.commit()
+        return bool(claimed)
+
+    def dispatch_due(self) -> int:
+        """
+        Публикует посты, срок которых наступил
+
+        Returns:
+            Число обработанных постов
+        """
+        now = datetime.utcnow()
+        due = ScheduledPost.query.filter(self._due_filter(now)).order_by(
+            ScheduledPost.due_at
+        ).limit(self.batch_size).all()
+
+        processed = 0
+        for scheduled in due:
+            if self._stop.is_set():
+                break
+            if self._claim(scheduled):
+                db.session.refresh(scheduled)
+                self._publish(scheduled)
+                processed += 1
+        return processed
+
+    def _publish(self, scheduled: ScheduledPost):
+        from app.smm.post_history import record_post
+
+        try:
+            result = self.publisher_factory(scheduled.group_id).publish_post(
+                message=scheduled.message,
+                photo=scheduled.photo_path,
+                group_id=scheduled.group_id,
+                from_group=True,
+                guid=scheduled.guid
+            )
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+
+        now = datetime.utcnow()
+        if result.get('success'):
+            post = record_post(scheduled.user_id, scheduled.group_id, result.get('post_id'),
+                               scheduled.message, has_photo=scheduled.photo_path is not None,
+                               published_at=now)
+            scheduled.status = 'published'
+            scheduled.post_id = post.id if post else None
+            scheduled.published_at = now
+            scheduled.error = None
+            self._remove_photo(scheduled.photo_path)
+        elif scheduled.attempts >= self.max_attempts:
+            scheduled.status = 'failed'
+            scheduled.error = result.get('error')
+            self._remove_photo(scheduled.photo_path)
+            print(f"❌ Не удалось опубликовать запланированный пост {scheduled.id}: {scheduled.error}")
+        else:
+            scheduled.status = 'pending'
+            scheduled.error = result.get('error')
+            scheduled.due_at = now + timedelta(seconds=self.retry_base * (2 ** (scheduled.attempts - 1)))
+            print(f"⚠️ Повтор публикации поста {scheduled.id} в {scheduled.due_at}: {scheduled.error}")
+        scheduled.lease_until = None
+        db.session.commit()
+
+    @staticmethod
+    def _remove_photo(photo_path: Optional[str]):
+        if photo_path and os.path.exists(photo_path):
+            os.remove(photo_path)
+
+    def _sleep_seconds(self) -> float:
+        next_due = self._next_due()
+        if next_due is None:
+            return self.poll_interval
+        # Не дольше poll_interval: продлеваем аренду и видим посты других процессов
+        return min(max((next_due - datetime.utcnow()).total_seconds(), 0.0), self.poll_interval)
+
+    def _dispatcher(self):
+        while not self._stop.is_set():
+            timeout = self.poll_interval
+            try:
+                with self.app.app_context():
+                    if self._acquire_leadership():
+                        while self.dispatch_due() and not self._stop.is_set():
+                            self._acquire_leadership()
+                        timeout = self._sleep_seconds()
+            except Exception as e:
+                print(f"⚠️ Ошибка планировщика публикаций: {e}")
+
+            with self._wakeup:
+                if not self._stop.is_set():
+                    self._wakeup.wait(timeout)
@@ -0,0 +1,204 @@
+from datetime import date
+from typing import Dict, Any, List
+
+import numpy as np
+from sqlalchemy import func, select
+
+from app import db
+from app.models import GroupStatsDay
+
+# Метрики дневной статистики в порядке столбцов матрицы
+METRICS = ('views', 'visitors', 'mobile_views', 'likes', 'comments', 'copies')
+_LIKES, _COMMENTS, _COPIES, _VISITORS = (METRICS.index(name) for name in ('likes', 'comments', 'copies', 'visitors'))
+
+# Метрики статистики постов (get_posts_stats)
+POST_METRICS = ('views', 'likes', 'reposts', 'comments')
+
+RESAMPLE_INTERVALS = ('day', 'week', 'month', 'year')
+
+# Юлианская дата 1970-01-01 00:00
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+class GroupSeries:
+    """
+    Дневные ряды метрик нескольких групп в колоночном виде
+
+    values - матрица int64 размером (группы, дни, метрики); дни без
+    данных заполнены нулями, поэтому все операции выполняются над
+    массивами целиком, без циклов по периодам.
+    """
+
+    def __init__(self, group_ids: List[str], days: np.ndarray, values: np.ndarray):
+        self.group_ids = group_ids
+        self.days = days
+        self.values = values
+
+def load_group_series(group_ids: List[str], date_from: date, date_to: date) -> GroupSeries:
+    """
+    Загружает дневную статистику групп из локального хранилища
+
+    Args:
+        group_ids: ID групп
+        date_from: Начальная дата
+        date_to: Конечная дата
+
+    Returns:
+        Ряды метрик групп за период
+    """
+    group_ids = [str(group_id) for group_id in group_ids]
+    days = np.arange(np.datetime64(date_from, 'D'), np.datetime64(date_to, 'D') + 1)
+    values = np.zeros((len(group_ids), len(days), len(METRICS)), dtype=np.int64)
+
+    # День читается как юлианская дата: числа разбираются в массив быстрее, чем объекты date
+    rows = db.session.execute(
+        select(
+            GroupStatsDay.group_id,
+            func.julianday(GroupStatsDay.day),
+            *(getattr(GroupStatsDay, name) for name in METRICS)
+        ).where(
+            GroupStatsDay.group_id.in_(group_ids),
+            GroupStatsDay.day.between(date_from, date_to)
+        )
+    ).all()
+
+    if rows and len(days):
+        columns = list(zip(*rows))
+        group_index = {group_id: i for i, group_id in enumerate(group_ids)}
+        gi = np.fromiter(map(group_index.__getitem__, columns[0]), dtype=np.intp, count=len(rows))
+        epoch_days = np.rint(np.array(columns[1], dtype=np.float64) - UNIX_EPOCH_JULIAN_DAY).astype(np.int64)
+        di = epoch_days - days[0].astype(np.int64)
+        values[gi, di] = np.array(columns[2:], dtype=np.int64).T
+
+    return GroupSeries(group_ids, days, values)
+
+def _bucket_starts(days: np.ndarray, interval: str) -> np.ndarray:
+    """Дата начала интервала (неделя с понедельника, месяц, год) для каждого дня"""
+    if interval == 'week':
+        # 1970-01-01 - четверг, сдвиг на 3 дня дает 0 для понедельника
+        return days - (days.astype(np.int64) + 3) % 7
+    if interval == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    if interval == 'year':
+        return days.astype('datetime64[Y]').astype('datetime64[D]')
+    return days
+
+def resample(series: GroupSeries, interval: str = 'day') -> GroupSeries:
+    """
+    Суммирует дневные ряды по неделям, месяцам или годам
+
+    Args:
+        series: Дневные ряды
+        interval: Интервал (day, week, month, year)
+
+    Returns:
+        Ряды с одной точкой на интервал (дата - начало интервала)
+    """
+    if interval not in RESAMPLE_INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+    if interval == 'day' or not len(series.days):
+        return series
+
+    buckets = _bucket_starts(series.days, interval)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    values = np.add.reduceat(series.values, starts, axis=1)
+    return GroupSeries(series.group_ids, buckets[starts], values)
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Скользящее среднее по оси периодов через накопленные суммы
+
+    Для первых window - 1 периодов среднее берется по доступным точкам.
+    """
+    window = max(int(window), 1)
+    cumsum = np.cumsum(values, axis=1, dtype=np.float64)
+    shifted = np.zeros_like(cumsum)
+    if values.shape[1] > window:
+        shifted[:, window:] = cumsum[:, :-window]
+    counts = np.minimum(np.arange(1, values.shape[1] + 1), window)
+    return (cumsum - shifted) / counts.reshape((1, -1) + (1,) * (values.ndim - 2))
+
+def engagement_rate(values: np.ndarray) -> np.ndarray:
+    """Вовлеченность: (лайки + комментарии + репосты) / посетители, 0 при отсутствии посетителей"""
+    interactions = values[..., _LIKES] + values[..., _COMMENTS] + values[..., _COPIES]
+    visitors = values[..., _VISITORS]
+    return np.divide(interactions, visitors, out=np.zeros(interactions.shape), where=visitors > 0)
+
+def group_report(series: GroupSeries, interval: str = 'day', window: int = 7) -> Dict[str, Any]:
+    """
+    Итоги, ряды по интервалам, скользящие средние и вовлеченность по группам
+
+    Args:
+        series: Дневные ряды групп
+        interval: Интервал группировки рядов
+        window: Окно скользящего среднего (в интервалах)
+
+    Returns:
+        Словарь {group_id: {'totals', 'engagement_rate', 'periods'}}, периоды по столбцам
+    """
+    sampled = resample(series, interval)
+    totals = series.values.sum(axis=1)
+    total_rate = engagement_rate(totals)
+    rates = engagement_rate(sampled.values)
+    rolling = rolling_mean(sampled.values, window)
+    rolling_rates = rolling_mean(rates[..., np.newaxis], window)[..., 0]
+
+    # Ряды отдаются по столбцам: один список на метрику вместо словаря на каждый период
+    period_from = [str(day) for day in sampled.days]
+    report = {}
+    for g, group_id in enumerate(series.group_ids):
+        report[group_id] = {
+            'totals': dict(zip(METRICS, totals[g].tolist())),
+            'engagement_rate': round(float(total_rate[g]), 4),
+            'periods': {
+                'period_from': period_from,
+                'metrics': dict(zip(METRICS, sampled.values[g].T.tolist())),
+                'rolling': dict(zip(METRICS, np.round(rolling[g].T, 2).tolist())),
+                'engagement_rate': np.round(rates[g], 4).tolist(),
+                'rolling_engagement_rate': np.round(rolling_rates[g], 4).tolist()
+            }
+        }
+    return report
+
+def top_posts(post_stats: Dict[str, Dict[str, Any]], n: int = 10,
+              by: str = 'engagement_rate') -> List[Dict[str, Any]]:
+    """
+    Лучшие посты по метрике
+
+    Args:
+        post_stats: Статистика постов в формате get_posts_stats()['stats']
+        n: Сколько постов вернуть
+        by: Метрика сортировки (views, likes, reposts, comments, engagement_rate)
+
+    Returns:
+        Список постов по убыванию метрики с рассчитанной вовлеченностью
+    """
+    if by not in POST_METRICS and by != 'engagement_rate':
+        raise ValueError(f"Unknown metric: {by}")
+    if not post_stats or n <= 0:
+        return []
+
+    post_ids = list(post_stats)
+    values = np.array(
+        [[post_stats[post_id].get(name, 0) for name in POST_METRICS] for post_id in post_ids],
+        dtype=np.int64
+    )
+    views = values[:, 0]
+    interactions = values[:, 1:].sum(axis=1)
+    rates = np.divide(interactions, views, out=np.zeros(len(post_ids)), where=views > 0)
+
+    key = rates if by == 'engagement_rate' else values[:, POST_METRICS.index(by)]
+    n = min(n, len(post_ids))
+    # argpartition выбирает n лучших за O(N), сортируется только результат
+    best = np.argpartition(-key, n - 1)[:n]
+    best = best[np.argsort(-key[best], kind='stable')]
+
+    return [
+        dict(post_stats[post_ids[i]], post_id=post_ids[i], engagement_rate=round(float(rates[i]), 4))
+        for i in best.tolist()
+    ]
+
+def analytics_report(group_ids: List[str], date_from: date, date_to: date,
+                     interval: str = 'day', window: int = 7) -> Dict[str, Any]:
+    """Отчет по группам за период по данным локального хранилища"""
+    series = load_group_series(group_ids, date_from, date_to)
+    return {'success': True, 'groups': group_report(series, interval, window)}
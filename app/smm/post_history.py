@@ -0,0 +1,154 @@
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+from sqlalchemy import func, or_, and_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import Post, PostMetricsSnapshot
+
+SNAPSHOT_METRICS = ('views', 'likes', 'reposts', 'comments')
+
+def record_post(user_id: Optional[int], group_id: str, vk_post_id: Optional[int], message: str,
+                has_photo: bool = False, status: str = 'published',
+                published_at: Optional[datetime] = None) -> Post:
+    """
+    Сохраняет опубликованный или запланированный пост
+
+    Повторная запись поста с тем же (group_id, vk_post_id) обновляет
+    существующую строку.
+
+    Args:
+        user_id: Автор публикации
+        group_id: ID группы
+        vk_post_id: ID поста в VK
+        message: Текст поста
+        has_photo: Пост с фотографией
+        status: published или scheduled
+        published_at: Время публикации (для запланированных - назначенное время)
+
+    Returns:
+        Запись поста
+    """
+    group_id = str(group_id)
+    vk_post_id = int(vk_post_id) if vk_post_id is not None else None
+    post = None
+    if vk_post_id is not None:
+        post = Post.query.filter_by(group_id=group_id, vk_post_id=vk_post_id).first()
+    if post is None:
+        post = Post(group_id=group_id, vk_post_id=vk_post_id)
+        db.session.add(post)
+
+    post.user_id = user_id
+    post.message = message
+    post.has_photo = has_photo
+    post.status = status
+    post.published_at = published_at or datetime.utcnow()
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Тот же пост параллельно записал другой запрос
+        db.session.rollback()
+        post = Post.query.filter_by(group_id=group_id, vk_post_id=vk_post_id).first()
+    return post
+
+def record_snapshots(group_id: str, stats: Dict[str, Dict[str, Any]]) -> int:
+    """
+    Сохраняет снимки статистики для известных приложению постов
+
+    Args:
+        group_id: ID группы
+        stats: Статистика в формате get_posts_stats()['stats'] (ключ - ID поста в VK)
+
+    Returns:
+        Число сохраненных снимков
+    """
+    vk_ids = {int(post_id): metrics for post_id, metrics in stats.items() if str(post_id).isdigit()}
+    if not vk_ids:
+        return 0
+
+    posts = Post.query.filter(
+        Post.group_id == str(group_id),
+        Post.vk_post_id.in_(list(vk_ids))
+    ).all()
+
+    now = datetime.utcnow()
+    for post in posts:
+        metrics = vk_ids[post.vk_post_id]
+        db.session.add(PostMetricsSnapshot(
+            post_id=post.id,
+            captured_at=now,
+            **{name: metrics.get(name, 0) for name in SNAPSHOT_METRICS}
+        ))
+    db.session.commit()
+    return len(posts)
+
+def _encode_cursor(post: Post) -> str:
+    return f"{post.published_at.isoformat()}_{post.id}"
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    published_at, post_id = cursor.rsplit('_', 1)
+    return datetime.fromisoformat(published_at), int(post_id)
+
+def list_posts(user_id: Optional[int], group_id: str, limit: int = 20,
+               cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Страница истории постов пользователя в группе, новые первыми
+
+    Используется постраничная выборка по курсору (published_at, id): каждая
+    страница читается по индексу (user_id, group_id, published_at) без OFFSET.
+
+    Args:
+        user_id: Автор публикаций
+        group_id: ID группы
+        limit: Размер страницы
+        cursor: Курсор из next_cursor предыдущей страницы
+
+    Returns:
+        Словарь с постами (и последним снимком статистики каждого) и next_cursor
+
+    Raises:
+        ValueError: Неверный курсор
+    """
+    query = Post.query.filter(Post.user_id == user_id, Post.group_id == str(group_id))
+    if cursor:
+        published_at, post_id = _decode_cursor(cursor)
+        query = query.filter(or_(
+            Post.published_at < published_at,
+            and_(Post.published_at == published_at, Post.id < post_id)
+        ))
+    posts = query.order_by(Post.published_at.desc(), Post.id.desc()).limit(limit + 1).all()
+
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    latest = latest_snapshots([post.id for post in posts])
+
+    items = []
+    for post in posts:
+        item = post.to_dict()
+        snapshot = latest.get(post.id)
+        item['metrics'] = snapshot.to_dict() if snapshot else None
+        items.append(item)
+
+    return {
+        'success': True,
+        'posts': items,
+        'next_cursor': _encode_cursor(posts[-1]) if has_more else None
+    }
+
+def latest_snapshots(post_ids: List[int]) -> Dict[int, PostMetricsSnapshot]:
+    """Последний снимок статистики для каждого поста"""
+    if not post_ids:
+        return {}
+
+    last = db.session.query(
+        PostMetricsSnapshot.post_id,
+        func.max(PostMetricsSnapshot.captured_at).label('captured_at')
+    ).filter(PostMetricsSnapshot.post_id.in_(post_ids)).group_by(PostMetricsSnapshot.post_id).subquery()
+
+    snapshots = PostMetricsSnapshot.query.join(last, and_(
+        PostMetricsSnapshot.post_id == last.c.post_id,
+        PostMetricsSnapshot.captured_at == last.c.captured_at
+    )).all()
+    return {snapshot.post_id: snapshot for snapshot in snapshots}
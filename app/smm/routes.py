@@ -1,11 +1,34 @@
-from flask import render_template, request, jsonify, current_app, send_from_directory
+from flask import render_template, request, jsonify, current_app, send_from_directory, Response
 from flask_login import login_required, current_user
 from app import db
 from app.smm import bp
+from app.models import Post, PostMetricsSnapshot, GeneratedImage
 from generators.vk_publisher import VKPublisher
+from generators import vk_rate_limiter
+from app.smm.stats_store import GroupStatsStore
+from app.smm.analytics import analytics_report, top_posts, RESAMPLE_INTERVALS
+from app.smm.post_history import record_post, record_snapshots, list_posts
+from app.smm.tasks import image_result
 from generators.image_gen import ImageGenerator
+from generators.text_gen import TextGenerator, PostRequest
 import os
-from datetime import datetime, timedelta
+import json
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List
+
+@bp.before_request
+def reject_oversized_request():
+    """Загрузка больше MAX_CONTENT_LENGTH отклоняется до чтения тела запроса"""
+    max_length = current_app.config.get('MAX_CONTENT_LENGTH')
+    if max_length and request.content_length and request.content_length > max_length:
+        return request_too_large(None)
+
+@bp.errorhandler(413)
+def request_too_large(e):
+    """Загрузка больше MAX_CONTENT_LENGTH (фото сверх допустимого размера)"""
+    return jsonify({'success': False, 'error': 'Файл слишком большой'}), 413
 
 @bp.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -35,7 +58,10 @@ def profile():
 @bp.route('/content-generator')
 @login_required
 def content_generator():
-    return render_template('smm/content_generator.html')
+    img_gen = current_app.image_generator
+    return render_template('smm/content_generator.html',
+                           image_provider=img_gen.provider,
+                           enhance_prompt=img_gen.backend.enhance_enabled())
 
 @bp.route('/vk-publisher')
 @login_required
@@ -55,6 +81,8 @@ def generate_content():
         topic = data.get('topic', '')
         tone = data.get('tone', '')
         platform = data.get('platform', '')
+        # Новый вариант текста в обход кэша
+        fresh = bool(data.get('fresh', False))
         
         if not topic:
             return jsonify({'success': False, 'error': 'Тема не может быть пустой'}), 400
@@ -62,15 +90,11 @@ def generate_content():
         # Генерируем контент
         text_generator = current_app.text_generator
         
-        # Устанавливаем параметры генератора
-        text_generator.set_topic(topic)
-        text_generator.set_tone(tone)
-        
-        # Генерируем текст сообщения
-        message = text_generator.generate_post()
+        # Параметры передаются в вызов, а не в общий генератор приложения
+        post_request = PostRequest(topic=topic, tone=tone, use_cache=not fresh)
         
-        # Генерируем описание изображения
-        image_description = text_generator.generate_post_image_description()
+        # Генерируем текст сообщения и описание изображения параллельно
+        message, image_description = text_generator.generate_post_with_image_description(post_request)
         
         return jsonify({
             'success': True,
@@ -78,12 +102,131 @@ def generate_content():
             'image_description': image_description
         })
         
+    except TimeoutError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 504
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def _sse_event(event, data):
+    """Форматирует событие Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@bp.route('/generate-content/stream', methods=['POST'])
+@login_required
+def generate_content_stream():
+    """Потоковая генерация поста через Server-Sent Events"""
+    data = request.get_json() or {}
+    topic = data.get('topic', '')
+    tone = data.get('tone', '')
+    fresh = bool(data.get('fresh', False))
+    
+    if not topic:
+        return jsonify({'success': False, 'error': 'Тема не может быть пустой'}), 400
+    
+    text_generator = current_app.text_generator
+    post_request = PostRequest(topic=topic, tone=tone, use_cache=not fresh)
+    
+    # Промпт для изображения генерируется параллельно с текстом поста
+    image_future = text_generator.executor.submit(
+        text_generator.generate_post_image_description, post_request
+    )
+    
+    def events():
+        try:
+            # При отключении клиента генератор закрывается, а вместе с ним
+            # и соединение с моделью, поэтому лишние токены не генерируются
+            with closing(text_generator.stream_post(post_request)) as tokens:
+                for token in tokens:
+                    yield _sse_event('token', {'text': token})
+            
+            image_description = image_future.result(timeout=text_generator.timeout)
+            yield _sse_event('image_description', {'image_description': image_description})
+            yield _sse_event('done', {'success': True})
+        except Exception as e:
+            yield _sse_event('error', {'success': False, 'error': str(e) or 'Превышено время ожидания'})
+        finally:
+            image_future.cancel()
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.route('/generate-batch', methods=['POST'])
+@login_required
+def generate_batch():
+    """
+    Пакетная генерация постов (контент-план)
+    
+    Принимает либо список items с парами topic/tone, либо одну тему
+    topic/tone с числом вариантов variants. Результаты отдаются через
+    Server-Sent Events по мере готовности, ошибки - по каждому элементу.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    include_image_description = bool(data.get('include_image_description', False))
+    fresh = bool(data.get('fresh', False))
+    max_items = current_app.config['API_CONFIG'].get('text_generation', {}).get('batch_max_items', 50)
+    
+    items = data.get('items')
+    if items:
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return jsonify({'success': False, 'error': 'items должен быть списком объектов с полями topic и tone'}), 400
+        if len(items) > max_items:
+            return jsonify({'success': False, 'error': f'Не более {max_items} постов за один запрос'}), 400
+        post_requests = [
+            PostRequest(topic=str(item.get('topic') or ''), tone=str(item.get('tone') or ''), use_cache=not fresh)
+            for item in items
+        ]
+    elif data.get('topic'):
+        try:
+            variants = int(data.get('variants', 1))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Число вариантов должно быть целым'}), 400
+        # Число вариантов проверяется до того, как они создаются
+        if variants > max_items:
+            return jsonify({'success': False, 'error': f'Не более {max_items} постов за один запрос'}), 400
+        post_request = PostRequest(topic=str(data['topic']), tone=str(data.get('tone') or ''))
+        post_requests = TextGenerator.variants(post_request, max(variants, 1))
+    else:
+        return jsonify({'success': False, 'error': 'Укажите список items или тему topic'}), 400
+    
+    text_generator = current_app.text_generator
+    
+    def events():
+        succeeded = 0
+        with closing(text_generator.generate_batch(post_requests, include_image_description)) as results:
+            for result in results:
+                succeeded += result['success']
+                yield _sse_event('result', result)
+        yield _sse_event('done', {
+            'success': True,
+            'total': len(post_requests),
+            'succeeded': succeeded,
+            'failed': len(post_requests) - succeeded
+        })
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@bp.route('/generate-content/cache-stats')
+@login_required
+def generate_content_cache_stats():
+    """Счетчики кэша ответов генератора текста"""
+    return jsonify({
+        'success': True,
+        'cache': current_app.text_generator.cache_stats()
+    })
+
 @bp.route('/vk/groups')
 @login_required
 def get_vk_groups():
@@ -103,6 +246,13 @@ def get_vk_groups():
             'error': str(e)
         }), 500
 
+def _get_generated_image(image_id):
+    """Сгенерированное изображение текущего пользователя, если файл еще существует"""
+    image = db.session.get(GeneratedImage, str(image_id))
+    if image is None or image.user_id != current_user.id or not os.path.exists(image.path):
+        return None
+    return image
+
 @bp.route('/vk/publish', methods=['POST'])
 @login_required
 def publish_to_vk():
@@ -116,7 +266,8 @@ def publish_to_vk():
             photo_file = None
         else:
             # Данные приходят из формы публикатора
-            message = request.form.get('message', '')
+            data = request.form
+            message = data.get('message', '')
             photo_file = request.files.get('photo')
         
         if not message:
@@ -128,27 +279,33 @@ def publish_to_vk():
         
         vk_publisher = VKPublisher(vk_token, vk_group_id)
         
-        # Обработка фотографии
-        photo_path = None
-        if photo_file and photo_file.filename:
-            upload_dir = 'uploads'
-            if not os.path.exists(upload_dir):
-                os.makedirs(upload_dir)
-            filename = f"vk_photo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
-            photo_path = os.path.join(upload_dir, filename)
-            photo_file.save(photo_path)
+        # Фото передается на сервер VK прямо из потока запроса, без временного файла
+        photo = photo_file if photo_file and photo_file.filename else None
+        attachments = None
+        
+        # Сгенерированное изображение берется с диска по идентификатору, без повторной загрузки браузером
+        if photo is None and data.get('image_id'):
+            image = _get_generated_image(data['image_id'])
+            if image is None:
+                return jsonify({'success': False, 'error': 'Изображение не найдено'}), 404
+            # Предзагруженное в группу фото публикуется одним wall.post
+            attachments = image.attachment_for(vk_group_id)
+            if attachments is None:
+                photo = image.path
         
         # Публикуем пост
         result = vk_publisher.publish_post(
             message=message,
-            photo_path=photo_path,
+            photo=photo,
             group_id=vk_group_id,
-            from_group=True
+            from_group=True,
+            attachments=attachments
         )
         
-        # Удаляем временный файл
-        if photo_path and os.path.exists(photo_path):
-            os.remove(photo_path)
+        if result.get('success'):
+            post = record_post(current_user.id, vk_group_id, result.get('post_id'), message,
+                               has_photo=photo is not None or attachments is not None)
+            result['id'] = post.id if post else None
         
         return jsonify(result)
         
@@ -158,35 +315,172 @@ def publish_to_vk():
             'error': str(e)
         }), 500
 
-@bp.route('/vk/schedule', methods=['POST'])
+def _parse_group_ids(group_ids) -> Optional[List[str]]:
+    """
+    ID групп из списка чисел или числовых строк (минус перед ID допускается)
+    
+    Returns:
+        Список ID без минуса или None, если group_ids - не список или ID не числовой
+    """
+    if not isinstance(group_ids, list):
+        return None
+    parsed = []
+    for group_id in group_ids:
+        if isinstance(group_id, bool) or not isinstance(group_id, (int, str)):
+            return None
+        group_id = str(group_id).strip().lstrip('-')
+        if not group_id.isdigit():
+            return None
+        parsed.append(group_id)
+    return parsed
+
+@bp.route('/vk/publish-multi', methods=['POST'])
 @login_required
-def schedule_vk_post():
-    """Планирование поста в VK"""
+def publish_to_vk_groups():
+    """
+    Публикация одного поста в нескольких группах VK
+    
+    Принимает group_ids (список в JSON или через запятую в форме), текст и
+    необязательное фото. Возвращает результаты по каждой группе.
+    """
     try:
-        message = request.form.get('message', '')
-        publish_date = request.form.get('publish_date', '')
+        if request.is_json:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({'success': False, 'error': 'Ожидается JSON-объект'}), 400
+            group_ids = data.get('group_ids') or []
+            photo_file = None
+        else:
+            data = request.form
+            group_ids = [group_id for group_id in data.get('group_ids', '').split(',') if group_id.strip()]
+            photo_file = request.files.get('photo')
+        message = data.get('message', '')
         
-        if not message or not publish_date:
-            return jsonify({'success': False, 'error': 'Текст и дата публикации обязательны'}), 400
+        if not message:
+            return jsonify({'success': False, 'error': 'Текст поста не может быть пустым'}), 400
+        group_ids = _parse_group_ids(group_ids)
+        if group_ids is None:
+            return jsonify({'success': False, 'error': 'group_ids должен быть списком числовых ID групп'}), 400
+        if not group_ids:
+            return jsonify({'success': False, 'error': 'Не указаны группы для публикации'}), 400
         
         config = current_app.config['API_CONFIG']
         vk_token = config['vk']['access_token']
-        vk_group_id = config['vk']['group_id']
+        max_groups = config['vk'].get('fanout_max_groups', 50)
+        if len(group_ids) > max_groups:
+            return jsonify({'success': False, 'error': f'Не более {max_groups} групп за один запрос'}), 400
         
-        vk_publisher = VKPublisher(vk_token, vk_group_id)
+        photo = photo_file if photo_file and photo_file.filename else None
+        if photo is None and data.get('image_id'):
+            image = _get_generated_image(data['image_id'])
+            if image is None:
+                return jsonify({'success': False, 'error': 'Изображение не найдено'}), 404
+            photo = image.path
+        
+        vk_publisher = VKPublisher(vk_token)
+        result = vk_publisher.publish_to_groups(
+            message=message,
+            group_ids=group_ids,
+            photo=photo,
+            from_group=True,
+            max_workers=config['vk'].get('fanout_max_workers', 6)
+        )
+        
+        for group_id, group_result in result.get('results', {}).items():
+            if group_result['success']:
+                post = record_post(current_user.id, group_id, group_result['post_id'], message,
+                                   has_photo=photo is not None)
+                group_result['id'] = post.id if post else None
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def _parse_publish_at(value: str) -> datetime:
+    """
+    Время публикации из формы в UTC
+    
+    Принимает ISO 8601 со смещением (toISOString() браузера) или локальное
+    время сервера без смещения (datetime-local).
+    """
+    publish_at = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if publish_at.tzinfo is not None:
+        return publish_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime.utcfromtimestamp(publish_at.timestamp())
+
+def _save_scheduled_photo(photo_file) -> str:
+    """Сохраняет фото запланированного поста до момента публикации"""
+    upload_dir = os.path.join('uploads', 'scheduled')
+    os.makedirs(upload_dir, exist_ok=True)
+    photo_path = os.path.join(upload_dir, f"{uuid.uuid4().hex}.jpg")
+    photo_file.save(photo_path)
+    return photo_path
+
+@bp.route('/vk/schedule', methods=['POST'])
+@login_required
+def schedule_vk_post():
+    """
+    Планирование поста в VK
+    
+    По умолчанию пост ставится в локальную очередь планировщика. С флагом
+    vk_postponed=1 используется отложенная запись VK (publish_date).
+    """
+    try:
+        data = request.get_json() if request.is_json else request.form
+        message = data.get('message', '')
+        publish_date = data.get('schedule_date') or data.get('publish_date', '')
+        photo_file = request.files.get('photo')
+        
+        if not message or not publish_date:
+            return jsonify({'success': False, 'error': 'Текст и дата публикации обязательны'}), 400
         
         # Парсим дату
         try:
-            publish_datetime = datetime.strptime(publish_date, '%Y-%m-%dT%H:%M')
+            publish_at = _parse_publish_at(publish_date)
         except ValueError:
             return jsonify({'success': False, 'error': 'Неверный формат даты'}), 400
         
+        if publish_at < datetime.utcnow() - timedelta(minutes=1):
+            return jsonify({'success': False, 'error': 'Дата публикации уже прошла'}), 400
+        
+        config = current_app.config['API_CONFIG']
+        vk_token = config['vk']['access_token']
+        vk_group_id = config['vk']['group_id']
+        
+        photo = photo_file if photo_file and photo_file.filename else None
+        
+        if str(data.get('vk_postponed', '')) not in ('1', 'true'):
+            # Локальная очередь публикует пост позже - фото сохраняется до публикации
+            photo_path = _save_scheduled_photo(photo) if photo else None
+            scheduled = current_app.post_scheduler.schedule(
+                current_user.id, vk_group_id, message, publish_at, photo_path=photo_path
+            )
+            return jsonify({
+                'success': True,
+                'scheduled_id': scheduled.id,
+                'publish_at': scheduled.publish_at.isoformat(),
+                'message': 'Пост поставлен в очередь публикации'
+            })
+        
+        vk_publisher = VKPublisher(vk_token, vk_group_id)
+        # publish_date в VK - Unix timestamp
         result = vk_publisher.schedule_post(
             message=message,
-            publish_date=publish_datetime,
+            publish_date=int(publish_at.replace(tzinfo=timezone.utc).timestamp()),
+            photo=photo,
             group_id=vk_group_id
         )
         
+        if result.get('success'):
+            post = record_post(current_user.id, vk_group_id, result.get('post_id'), message,
+                               has_photo=photo is not None, status='scheduled',
+                               published_at=publish_at)
+            result['id'] = post.id if post else None
+        
         return jsonify(result)
         
     except Exception as e:
@@ -195,6 +489,32 @@ def schedule_vk_post():
             'error': str(e)
         }), 500
 
+@bp.route('/scheduler')
+@login_required
+def scheduler():
+    return render_template('smm/scheduler.html')
+
+@bp.route('/scheduler/posts')
+@login_required
+def get_scheduled_posts():
+    """Посты пользователя в очереди публикации (statuses - через запятую)"""
+    statuses = [status for status in request.args.get('statuses', '').split(',') if status]
+    try:
+        limit = min(max(int(request.args.get('limit', 100)), 1), 500)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Неверный размер страницы'}), 400
+    
+    posts = current_app.post_scheduler.list_scheduled(current_user.id, statuses, limit)
+    return jsonify({'success': True, 'posts': [post.to_dict() for post in posts]})
+
+@bp.route('/scheduler/posts/<int:scheduled_id>', methods=['DELETE'])
+@login_required
+def cancel_scheduled_post(scheduled_id):
+    """Отмена запланированного поста до начала публикации"""
+    if current_app.post_scheduler.cancel(scheduled_id, current_user.id):
+        return jsonify({'success': True})
+    return jsonify({'success': False, 'error': 'Пост не найден или уже публикуется'}), 404
+
 @bp.route('/vk/stats/<post_id>')
 @login_required
 def get_vk_post_stats(post_id):
@@ -210,6 +530,50 @@ def get_vk_post_stats(post_id):
         vk_publisher = VKPublisher(vk_token, vk_group_id)
         stats = vk_publisher.get_post_stats(post_id, vk_group_id)
         
+        if stats.get('success'):
+            record_snapshots(vk_group_id, {str(post_id): stats})
+        
+        return jsonify(stats)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/vk/stats', methods=['GET', 'POST'])
+@login_required
+def get_vk_posts_stats():
+    """Получить статистику нескольких постов VK одним запросом"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json() or {}
+            post_ids = data.get('post_ids', [])
+        else:
+            data = request.args
+            post_ids = request.args.get('post_ids', '').split(',')
+        post_ids = [str(post_id).strip() for post_id in post_ids if str(post_id).strip()]
+        
+        if not post_ids:
+            return jsonify({'success': False, 'error': 'Не указаны ID постов'}), 400
+        
+        config = current_app.config['API_CONFIG']
+        vk_token = config['vk']['access_token']
+        vk_group_id = config['vk']['group_id']
+        
+        vk_publisher = VKPublisher(vk_token, vk_group_id)
+        stats = vk_publisher.get_posts_stats(post_ids, vk_group_id)
+        
+        if stats.get('success'):
+            record_snapshots(vk_group_id, stats['stats'])
+        
+        # Лучшие посты по выбранной метрике (top=N, by=views|likes|reposts|comments|engagement_rate)
+        if stats.get('success') and data.get('top'):
+            try:
+                stats['top_posts'] = top_posts(stats['stats'], int(data['top']), data.get('by', 'engagement_rate'))
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+        
         return jsonify(stats)
         
     except Exception as e:
@@ -218,10 +582,61 @@ def get_vk_post_stats(post_id):
             'error': str(e)
         }), 500
 
+@bp.route('/vk/posts')
+@login_required
+def get_vk_posts():
+    """
+    История постов пользователя в группе с последней статистикой
+    
+    Параметры: limit (до 100), cursor (next_cursor предыдущей страницы),
+    refresh=1 - обновить статистику постов страницы одним запросом к VK.
+    """
+    try:
+        config = current_app.config['API_CONFIG']
+        vk_token = config['vk']['access_token']
+        vk_group_id = config['vk']['group_id']
+        
+        cursor = request.args.get('cursor')
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+            page = list_posts(current_user.id, vk_group_id, limit, cursor)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Неверные параметры страницы'}), 400
+        
+        published = [str(post['vk_post_id']) for post in page['posts']
+                     if post['vk_post_id'] is not None and post['status'] == 'published']
+        if request.args.get('refresh') == '1' and published:
+            stats = VKPublisher(vk_token, vk_group_id).get_posts_stats(published, vk_group_id)
+            if stats.get('success') and record_snapshots(vk_group_id, stats['stats']):
+                page = list_posts(current_user.id, vk_group_id, limit, cursor)
+        
+        return jsonify(page)
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/vk/posts/<int:post_id>/snapshots')
+@login_required
+def get_vk_post_snapshots(post_id):
+    """Снимки статистики поста из истории в хронологическом порядке"""
+    post = db.session.get(Post, post_id)
+    if post is None or post.user_id != current_user.id:
+        return jsonify({'success': False, 'error': 'Пост не найден'}), 404
+    
+    snapshots = post.snapshots.order_by(PostMetricsSnapshot.captured_at).all()
+    return jsonify({
+        'success': True,
+        'post': post.to_dict(),
+        'snapshots': [snapshot.to_dict() for snapshot in snapshots]
+    })
+
 @bp.route('/generate-image', methods=['POST'])
 @login_required
 def generate_image():
-    """Генерация изображения по описанию"""
+    """Постановка генерации изображения по описанию в фоновую очередь"""
     try:
         data = request.get_json()
         description = data.get('description', '')
@@ -229,29 +644,86 @@ def generate_image():
         if not description:
             return jsonify({'success': False, 'error': 'Описание изображения не может быть пустым'}), 400
         
-        img_gen = current_app.image_generator
-        
-        # Создаем папку для изображений если не существует
-        images_dir = 'static/generated_images'
-        if not os.path.exists(images_dir):
-            os.makedirs(images_dir)
+        # Количество вариантов за один проход генерации
+        max_images = current_app.config['API_CONFIG'].get('image_generation', {}).get('max_batch_size', 4)
+        try:
+            n = min(max(int(data.get('n', 1)), 1), max_images)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Количество изображений должно быть целым числом'}), 400
+        
+        seed = data.get('seed')
+        if seed is not None:
+            try:
+                seed = int(seed)
+            except (TypeError, ValueError):
+                return jsonify({'success': False, 'error': 'Зерно генерации должно быть целым числом'}), 400
+        fresh = bool(data.get('fresh', False))
+        # Улучшение промпта GPT-4o: None - по настройке провайдера
+        enhance = data.get('enhance_prompt')
+        if enhance is not None:
+            enhance = bool(enhance)
+        
+        # Изображения с теми же параметрами уже есть в кэше - отвечаем сразу, без задачи
+        if not fresh:
+            cached = current_app.image_generator.get_cached(description, n=n, seed=seed, enhance=enhance)
+            if cached is not None:
+                result = image_result(cached, current_user.id)
+                return jsonify({'success': True, 'status': 'done', 'cached': True, **result})
+        
+        job_id = current_app.job_queue.submit(
+            'generate_image',
+            {'description': description, 'n': n, 'seed': seed, 'fresh': fresh, 'enhance': enhance},
+            user_id=current_user.id
+        )
         
-        # Генерируем уникальное имя файла
-        filename = f"generated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
-        filepath = os.path.join(images_dir, filename)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f"/smm/generate-image/{job_id}",
+            'provider': current_app.image_generator.provider
+        }), 202
         
-        # Генерируем и сохраняем изображение
-        img_gen.generate_and_save(description, filepath)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@bp.route('/generate-image/cache-stats')
+@login_required
+def generate_image_cache_stats():
+    """Счетчики и размер кэша изображений"""
+    cache = current_app.image_generator.cache
+    prompt_cache = current_app.image_generator.backend.enhance_cache
+    return jsonify({
+        'success': True,
+        'cache': {'enabled': True, **cache.stats()} if cache is not None else {'enabled': False},
+        'prompt_cache': {'enabled': True, **prompt_cache.stats()} if prompt_cache is not None else {'enabled': False}
+    })
+
+@bp.route('/generate-image/providers')
+@login_required
+def generate_image_providers():
+    """Состояние провайдеров изображений (задержка, ошибки, отключение при сбоях)"""
+    return jsonify({'success': True, 'providers': current_app.image_generator.backend.stats()})
+
+@bp.route('/generate-image/prepare', methods=['POST'])
+@login_required
+def prepare_image_prompt():
+    """Заблаговременное улучшение промпта, пока пользователь редактирует описание"""
+    try:
+        data = request.get_json()
+        description = data.get('description', '')
         
-        # Возвращаем URL изображения
-        image_url = f"/static/generated_images/{filename}"
+        if not description:
+            return jsonify({'success': False, 'error': 'Описание изображения не может быть пустым'}), 400
         
-        return jsonify({
-            'success': True,
-            'image_url': image_url,
-            'message': 'Изображение успешно сгенерировано',
-            'provider': img_gen.provider
-        })
+        enhance = data.get('enhance_prompt')
+        started = current_app.image_generator.prefetch_prompt(
+            description, enhance=bool(enhance) if enhance is not None else None
+        )
+        return jsonify({'success': True, 'started': started}), 202 if started else 200
         
     except Exception as e:
         return jsonify({
@@ -259,6 +731,42 @@ def generate_image():
             'error': str(e)
         }), 500
 
+@bp.route('/generate-image/<job_id>')
+@login_required
+def generate_image_status(job_id):
+    """Статус и результат фоновой генерации изображения"""
+    job = current_app.job_queue.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+    
+    response = job.to_dict()
+    result = response.pop('result') or {}
+    response.update(result)
+    response['success'] = job.status != 'failed'
+    if job.status == 'done':
+        response['message'] = 'Изображение успешно сгенерировано'
+    elif job.status == 'cancelled':
+        response['message'] = 'Генерация отменена'
+    return jsonify(response)
+
+@bp.route('/generate-image/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_generate_image(job_id):
+    """
+    Отмена генерации изображения
+    
+    Рендер Stable Diffusion прерывается, и WebUI сразу переходит к
+    следующему запросу. Вызывается и при закрытии страницы (sendBeacon).
+    """
+    job_queue = current_app.job_queue
+    job = job_queue.get(job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({'success': False, 'error': 'Задача не найдена'}), 404
+    
+    if not job_queue.cancel(job_id):
+        return jsonify({'success': False, 'error': 'Задача уже завершена', 'status': job.status}), 409
+    return jsonify({'success': True, 'job_id': job_id})
+
 @bp.route('/vk/check-token')
 @login_required
 def check_vk_token():
@@ -278,27 +786,50 @@ def check_vk_token():
             'error': str(e)
         }), 500
 
+@bp.route('/vk/rate-limit-metrics')
+@login_required
+def get_vk_rate_limit_metrics():
+    """Метрики ограничения частоты запросов к VK (время ожидания в очереди)"""
+    return jsonify({
+        'success': True,
+        'metrics': vk_rate_limiter.get_metrics()
+    })
+
 @bp.route('/vk/group-stats')
 @login_required
 def get_vk_group_stats():
-    """Получить статистику группы VK"""
+    """
+    Получить статистику группы VK
+    
+    Данные отдаются из локального хранилища; из VK догружаются только
+    отсутствующие и последние дни периода. По умолчанию возвращаются
+    только итоги, разбивка по периодам - с periods=1.
+    """
     try:
         date_from = request.args.get('date_from')
         date_to = request.args.get('date_to')
         interval = request.args.get('interval', 'day')
-        stats_groups = request.args.get('stats_groups')
+        include_periods = request.args.get('periods', '0') in ('1', 'true')
+        
+        try:
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else datetime.now().date()
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else date_to - timedelta(days=29)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Неверный формат даты'}), 400
         
         config = current_app.config['API_CONFIG']
         vk_token = config['vk']['access_token']
         vk_group_id = config['vk']['group_id']
         
         vk_publisher = VKPublisher(vk_token, vk_group_id)
-        stats = vk_publisher.get_group_stats(
-            group_id=vk_group_id,
-            date_from=date_from,
-            date_to=date_to,
+        store = GroupStatsStore(vk_publisher, refresh_days=config['vk'].get('stats_refresh_days', 2))
+        store.sync(vk_group_id, date_from, date_to)
+        stats = store.query(
+            vk_group_id,
+            date_from,
+            date_to,
             interval=interval,
-            stats_groups=stats_groups
+            include_periods=include_periods
         )
         
         return jsonify(stats)
@@ -309,6 +840,46 @@ def get_vk_group_stats():
             'error': str(e)
         }), 500
 
+@bp.route('/vk/analytics')
+@login_required
+def get_vk_analytics():
+    """
+    Аналитика групп VK: итоги, ряды по интервалам, скользящие средние и вовлеченность
+    
+    Параметры: group_ids (через запятую, по умолчанию группа из конфигурации),
+    date_from/date_to (YYYY-MM-DD), interval (day, week, month, year), window.
+    """
+    try:
+        config = current_app.config['API_CONFIG']
+        vk_token = config['vk']['access_token']
+        group_ids = [group_id.strip() for group_id in request.args.get('group_ids', '').split(',') if group_id.strip()]
+        group_ids = group_ids or [str(config['vk']['group_id'])]
+        interval = request.args.get('interval', 'day')
+        
+        try:
+            window = int(request.args.get('window', 7))
+            date_to = request.args.get('date_to')
+            date_from = request.args.get('date_from')
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else datetime.now().date()
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else date_to - timedelta(days=29)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Неверный формат параметров'}), 400
+        
+        if interval not in RESAMPLE_INTERVALS:
+            return jsonify({'success': False, 'error': f'Неизвестный интервал: {interval}'}), 400
+        
+        refresh_days = config['vk'].get('stats_refresh_days', 2)
+        for group_id in group_ids:
+            GroupStatsStore(VKPublisher(vk_token, group_id), refresh_days=refresh_days).sync(group_id, date_from, date_to)
+        
+        return jsonify(analytics_report(group_ids, date_from, date_to, interval, window))
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @bp.route('/static/generated_images/<filename>')
 def serve_generated_image(filename):
     """Отдача сгенерированных изображений"""
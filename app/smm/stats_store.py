@@ -0,0 +1,196 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import GroupStatsDay
+from generators.vk_publisher import VKPublisher, VKAPIError
+
+# Максимальная длина периода одного вызова stats.get
+SYNC_CHUNK_DAYS = 90
+
+# Формат группировки дней по интервалу (strftime SQLite)
+INTERVAL_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-%W',
+    'month': '%Y-%m',
+    'year': '%Y'
+}
+
+METRIC_COLUMNS = ('views', 'visitors', 'mobile_views', 'likes', 'comments', 'copies')
+
+def _day_start(day: date) -> int:
+    return int(datetime.combine(day, datetime.min.time()).timestamp())
+
+def _days(date_from: date, date_to: date):
+    day = date_from
+    while day <= date_to:
+        yield day
+        day += timedelta(days=1)
+
+def _ranges(days: List[date]) -> List[Tuple[date, date]]:
+    """Разбивает отсортированный список дней на непрерывные диапазоны не длиннее SYNC_CHUNK_DAYS"""
+    ranges = []
+    for day in days:
+        if ranges and day - ranges[-1][1] == timedelta(days=1) and (day - ranges[-1][0]).days < SYNC_CHUNK_DAYS:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+class GroupStatsStore:
+    """
+    Локальное хранилище дневной статистики сообщества
+
+    Дни, уже сохраненные в базе, повторно из VK не запрашиваются, кроме
+    последних refresh_days дней, данные за которые еще могут меняться.
+    Запросы по периодам и интервалам выполняются по локальным данным.
+    """
+
+    def __init__(self, publisher: VKPublisher, refresh_days: int = 2):
+        """
+        Args:
+            publisher: Клиент API VK
+            refresh_days: Сколько последних дней всегда запрашивать заново
+        """
+        self.publisher = publisher
+        self.refresh_days = refresh_days
+
+    def sync(self, group_id: str, date_from: date, date_to: date) -> int:
+        """
+        Загружает из VK недостающие и недавние дни периода
+
+        Все недостающие диапазоны запрашиваются пакетом через execute.
+
+        Returns:
+            Число запрошенных из VK дней
+        """
+        today = date.today()
+        date_to = min(date_to, today)
+        if date_from > date_to:
+            return 0
+
+        existing = {
+            row.day for row in db.session.query(GroupStatsDay.day).filter(
+                GroupStatsDay.group_id == str(group_id),
+                GroupStatsDay.day.between(date_from, date_to)
+            )
+        }
+        refresh_border = today - timedelta(days=self.refresh_days)
+        missing = [day for day in _days(date_from, date_to) if day not in existing or day >= refresh_border]
+        if not missing:
+            return 0
+
+        ranges = _ranges(missing)
+        batch = self.publisher.execute_batch()
+        for start, end in ranges:
+            batch.add('stats.get', {
+                'group_id': group_id,
+                'interval': 'day',
+                'timestamp_from': _day_start(start),
+                'timestamp_to': _day_start(end) + 86399
+            })
+
+        for (start, end), periods in zip(ranges, batch.execute()):
+            if isinstance(periods, VKAPIError):
+                raise periods
+            self._store(str(group_id), start, end, periods)
+
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Тот же период параллельно синхронизировал другой запрос
+            db.session.rollback()
+        return len(missing)
+
+    def _store(self, group_id: str, start: date, end: date, periods: List[Dict[str, Any]]):
+        by_day = {date.fromtimestamp(period['period_from']): period for period in periods}
+        rows = {
+            row.day: row for row in GroupStatsDay.query.filter(
+                GroupStatsDay.group_id == group_id,
+                GroupStatsDay.day.between(start, end)
+            )
+        }
+
+        now = datetime.utcnow()
+        for day in _days(start, end):
+            # Дни без активности VK не возвращает - сохраняем их нулями, чтобы не запрашивать снова
+            period = by_day.get(day, {})
+            visitors = period.get('visitors', {})
+            activity = period.get('activity', {})
+
+            row = rows.get(day)
+            if row is None:
+                row = GroupStatsDay(group_id=group_id, day=day)
+                db.session.add(row)
+            row.period_from = period.get('period_from', _day_start(day))
+            row.views = visitors.get('views', 0)
+            row.visitors = visitors.get('visitors', 0)
+            row.mobile_views = visitors.get('mobile_views', 0)
+            row.likes = activity.get('likes', 0)
+            row.comments = activity.get('comments', 0)
+            row.copies = activity.get('copies', 0)
+            row.synced_at = now
+
+    def query(self, group_id: str, date_from: date, date_to: date, interval: str = 'day',
+              include_periods: bool = True) -> Dict[str, Any]:
+        """
+        Статистика за период по локальным данным
+
+        Args:
+            group_id: ID группы
+            date_from: Начальная дата
+            date_to: Конечная дата
+            interval: Группировка периодов (day, week, month, year, all)
+            include_periods: Включать разбивку по периодам
+
+        Returns:
+            Словарь в формате get_group_stats: итоги visitors/activity и периоды
+        """
+        sums = [func.sum(getattr(GroupStatsDay, column)) for column in METRIC_COLUMNS]
+        base = db.session.query(func.min(GroupStatsDay.period_from), *sums).filter(
+            GroupStatsDay.group_id == str(group_id),
+            GroupStatsDay.day.between(date_from, date_to)
+        )
+
+        totals = base.one()
+        stats = {
+            'visitors': [self._visitors(totals)],
+            'activity': [self._activity(totals)]
+        }
+
+        if include_periods:
+            if interval in INTERVAL_FORMATS:
+                bucket = func.strftime(INTERVAL_FORMATS[interval], GroupStatsDay.day)
+                rows = base.add_columns(bucket).group_by(bucket).order_by(bucket.desc()).all()
+            else:
+                rows = [totals] if totals[0] is not None else []
+            stats['periods'] = [
+                {
+                    'period_from': row[0],
+                    'visitors': self._visitors(row),
+                    'activity': self._activity(row)
+                }
+                for row in rows
+            ]
+
+        return {'success': True, 'stats': stats}
+
+    @staticmethod
+    def _visitors(row) -> Dict[str, int]:
+        return {
+            'views': row[1] or 0,
+            'visitors': row[2] or 0,
+            'mobile_views': row[3] or 0
+        }
+
+    @staticmethod
+    def _activity(row) -> Dict[str, int]:
+        return {
+            'likes': row[4] or 0,
+            'comments': row[5] or 0,
+            'reposts': row[6] or 0,  # copies = reposts
+            'copies': row[6] or 0
+        }
@@ -0,0 +1,200 @@
+import os
+import uuid
+from datetime import datetime
+from flask import current_app
+
+from app import db
+from app.models import Job, GeneratedImage
+from generators.image_cache import FORMAT_EXTENSIONS
+from generators.image_gen import detect_image_format
+from generators.image_providers import RenderProgress
+
+# Папка для сгенерированных изображений (отдается как /static/generated_images)
+IMAGES_DIR = 'static/generated_images'
+
+def generate_image_task(job_id, payload):
+    """
+    Обработчик фоновой задачи генерации изображения
+    
+    Args:
+        job_id: Идентификатор задачи (используется в имени файла)
+        payload: Параметры задачи с описанием изображения
+        
+    Returns:
+        Словарь с URL и идентификаторами всех изображений пакета и провайдером
+    """
+    img_gen = current_app.image_generator
+    
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    
+    progress, preview_paths = job_progress(job_id)
+    try:
+        if img_gen.cache is not None:
+            # fresh - новый вариант вместо сохраненного в кэше
+            filepaths = img_gen.generate_cached(
+                payload['description'],
+                n=payload.get('n', 1),
+                seed=payload.get('seed'),
+                use_cache=not payload.get('fresh', False),
+                enhance=payload.get('enhance'),
+                progress=progress
+            )
+        else:
+            # Имя файла по идентификатору задачи не пересекается с другими генерациями
+            filename = f"generated_{job_id}.png"
+            filepaths = img_gen.generate_and_save(
+                payload['description'],
+                os.path.join(IMAGES_DIR, filename),
+                n=payload.get('n', 1),
+                seed=payload.get('seed'),
+                enhance=payload.get('enhance'),
+                progress=progress
+            )
+    finally:
+        for path in preview_paths:
+            if os.path.exists(path):
+                os.remove(path)
+    
+    job = db.session.get(Job, job_id)
+    return image_result(filepaths, job.user_id if job else None, job_id)
+
+def job_progress(job_id):
+    """
+    Прогресс генерации для задачи очереди
+    
+    Каждый шаг ожидания записывает прогресс и промежуточный кадр в задачу
+    (кадр - в файл рядом с изображениями), а отмена задачи пользователем
+    прерывает генерацию.
+    
+    Returns:
+        RenderProgress и список файлов промежуточных кадров (удаляются после генерации)
+    """
+    job_queue = current_app.job_queue
+    interval = current_app.config['API_CONFIG'].get('image_generation', {}).get('progress_interval', 1.0)
+    preview_paths = []
+    written = {'preview': None, 'url': None, 'frame': 0}
+    
+    def on_tick(progress):
+        info = {'eta': progress.eta}
+        if progress.preview is not None and progress.preview is not written['preview']:
+            extension = FORMAT_EXTENSIONS.get(detect_image_format(progress.preview), '.png')
+            path = os.path.join(IMAGES_DIR, f"preview_{job_id}{extension}")
+            # Запись через временный файл: браузер не получит недописанный кадр
+            with open(f"{path}.tmp", 'wb') as f:
+                f.write(progress.preview)
+            os.replace(f"{path}.tmp", path)
+            if path not in preview_paths:
+                preview_paths.append(path)
+            written['preview'] = progress.preview
+            written['frame'] += 1
+            # Номер кадра в URL, чтобы браузер не показывал прежний из кэша
+            written['url'] = f"/static/generated_images/{os.path.basename(path)}?v={written['frame']}"
+        if written['url']:
+            info['preview_url'] = written['url']
+        return job_queue.report_progress(job_id, progress.progress, info)
+    
+    return RenderProgress(on_tick, interval), preview_paths
+
+def image_result(filepaths, user_id, job_id=None):
+    """
+    Регистрирует изображения пользователя и формирует результат генерации
+    
+    Если включена предзагрузка, ставит задачу загрузки изображений в VK.
+    
+    Returns:
+        Словарь с URL и идентификаторами изображений и провайдером
+    """
+    images = register_images(filepaths, user_id, job_id)
+    
+    # Фото загружается в VK сразу после генерации - публикация сводится к wall.post
+    vk_config = current_app.config['API_CONFIG'].get('vk', {})
+    if vk_config.get('preupload_generated_images', False) and vk_config.get('group_id'):
+        # Изображения из кэша могли быть загружены в группу раньше
+        pending = [image.id for image in images if not image.attachment_for(vk_config['group_id'])]
+        if pending:
+            current_app.job_queue.submit('preupload_images', {
+                'image_ids': pending,
+                'group_id': str(vk_config['group_id'])
+            }, user_id=user_id)
+    
+    image_urls = [f"/static/generated_images/{os.path.basename(path)}" for path in filepaths]
+    return {
+        'image_url': image_urls[0],
+        'image_urls': image_urls,
+        'image_id': images[0].id,
+        'image_ids': [image.id for image in images],
+        'provider': current_app.image_generator.provider
+    }
+
+def register_images(filepaths, user_id, job_id=None):
+    """
+    Сохраняет сгенерированные файлы пользователя в таблице изображений
+    
+    Файл из кэша, уже выданный пользователю, сохраняет прежнюю запись (и ее
+    идентификатор, и предзагруженное вложение VK) - повторные запросы с теми
+    же параметрами не добавляют записей.
+    
+    Returns:
+        Записи изображений в порядке filepaths
+    """
+    existing = {}
+    for image in GeneratedImage.query.filter(
+        GeneratedImage.user_id == user_id,
+        GeneratedImage.path.in_(filepaths)
+    ).order_by(GeneratedImage.created_at):
+        existing.setdefault(image.path, image)
+    
+    images = []
+    created = []
+    for path in filepaths:
+        image = existing.get(path)
+        if image is None:
+            image = GeneratedImage(id=uuid.uuid4().hex, job_id=job_id, user_id=user_id, path=path)
+            existing[path] = image
+            created.append(image)
+        images.append(image)
+    
+    if created:
+        db.session.add_all(created)
+        db.session.commit()
+    return images
+
+def preupload_images_task(job_id, payload):
+    """
+    Обработчик фоновой задачи предзагрузки изображений в группу VK
+    
+    Args:
+        job_id: Идентификатор задачи
+        payload: image_ids и group_id
+        
+    Returns:
+        Словарь {image_id: вложение} для загруженных фото и ошибки по остальным
+    """
+    from generators.vk_publisher import VKPublisher
+    
+    group_id = str(payload['group_id']).lstrip('-')
+    publisher = VKPublisher(current_app.config['API_CONFIG']['vk']['access_token'], group_id)
+    
+    attachments = {}
+    errors = {}
+    for image_id in payload['image_ids']:
+        image = db.session.get(GeneratedImage, image_id)
+        if image is None or not os.path.exists(image.path):
+            continue
+        if image.attachment_for(group_id):
+            attachments[image_id] = image.vk_attachment
+            continue
+        try:
+            image.vk_attachment = publisher.upload_photo(image.path, group_id)
+        except Exception as e:
+            # Без предзагрузки фото будет загружено при публикации
+            errors[image_id] = str(e)
+            continue
+        image.vk_group_id = group_id
+        image.uploaded_at = datetime.utcnow()
+        db.session.commit()
+        attachments[image_id] = image.vk_attachment
+    
+    if errors and not attachments:
+        raise Exception(f"Не удалось загрузить изображения в VK: {errors}")
+    return {'attachments': attachments, 'errors': errors}
@@ -0,0 +1,110 @@
+"""
+Аналитика по локальной статистике групп: NumPy против цикла по строкам
+
+Запуск из корня репозитория:
+    python benchmarks/bench_analytics.py
+
+Заполняет временную базу SQLite дневной статистикой GROUPS групп за
+YEARS лет, строит отчеты analytics_report по дням, неделям и месяцам и
+сравнивает их с подсчетом итогов циклом по объектам ORM.
+"""
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from app import db
+from app.models import GroupStatsDay
+from app.smm.analytics import METRICS, analytics_report, top_posts
+
+GROUPS = 50
+YEARS = 5
+POSTS = 100_000
+
+DATE_TO = date(2025, 12, 31)
+DATE_FROM = DATE_TO - timedelta(days=365 * YEARS)
+
+def make_app(db_path: str) -> Flask:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+def fill(group_ids):
+    rng = random.Random(1)
+    rows = []
+    days = (DATE_TO - DATE_FROM).days + 1
+    for group_id in group_ids:
+        for offset in range(days):
+            day = DATE_FROM + timedelta(days=offset)
+            row = {name: rng.randint(0, 1000) for name in METRICS}
+            row.update(group_id=group_id, day=day, period_from=int(time.mktime(day.timetuple())))
+            rows.append(row)
+    db.session.execute(insert(GroupStatsDay), rows)
+    db.session.commit()
+    return len(rows)
+
+def dict_loop_totals(group_ids):
+    """Итоги прежним способом: объекты ORM и словари по каждой строке"""
+    totals = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    rows = GroupStatsDay.query.filter(
+        GroupStatsDay.group_id.in_(group_ids),
+        GroupStatsDay.day.between(DATE_FROM, DATE_TO)
+    ).all()
+    for row in rows:
+        group_totals = totals[row.group_id]
+        for name in METRICS:
+            group_totals[name] += getattr(row, name)
+    return totals
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+def main():
+    group_ids = [str(100000 + i) for i in range(GROUPS)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(str(Path(tmp) / 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            count = fill(group_ids)
+            print(f'{GROUPS} groups x {YEARS} years: {count} rows')
+
+            for interval in ('day', 'week', 'month'):
+                report, elapsed = timed(analytics_report, group_ids, DATE_FROM, DATE_TO, interval)
+                print(f'analytics_report ({interval}): {elapsed:.2f} s')
+                if interval == 'month':
+                    monthly = report
+
+            totals, elapsed = timed(dict_loop_totals, group_ids)
+            print(f'dict loop, totals only: {elapsed:.2f} s')
+
+            # Сверка: месячные суммы сходятся с итогами, посчитанными на Python
+            for group_id in group_ids:
+                group = monthly['groups'][group_id]
+                assert group['totals'] == totals[group_id]
+                for name in METRICS:
+                    assert sum(group['periods']['metrics'][name]) == totals[group_id][name]
+            print('monthly sums match the dict loop')
+
+    rng = random.Random(2)
+    post_stats = {
+        str(post_id): {name: rng.randint(0, 10000) for name in ('views', 'likes', 'reposts', 'comments')}
+        for post_id in range(POSTS)
+    }
+    _, elapsed = timed(top_posts, post_stats, 10)
+    print(f'top 10 of {POSTS} posts: {elapsed:.2f} s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Подготовка фото к загрузке в VK: размер и время JPEG/WebP, загрузка
+по медленному каналу как есть и после сжатия
+
+Запуск из корня репозитория:
+    python benchmarks/bench_image_prep.py
+
+Изображения генерируются: плавные градиенты с мелким шумом, по размеру
+и сжимаемости близкие к PNG из Stable Diffusion. Сервер загрузки
+принимает тело не быстрее UPLOAD_MBIT Мбит/с.
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from generators import image_prep
+from generators.vk_publisher import VKPublisher, _prepare_photo
+from tests.fake_servers import FakeServer, JSONHandler
+
+SIZES = [(1024, 1024), (1024, 1024), (1792, 1024), (1024, 1792), (1536, 1024), (1024, 1024)]
+UPLOAD_MBIT = 20
+
+def make_png(size, seed: int) -> bytes:
+    channels = [
+        Image.linear_gradient('L').rotate(seed * 40).resize(size),
+        Image.radial_gradient('L').resize(size),
+        Image.linear_gradient('L').transpose(Image.Transpose.ROTATE_90).resize(size)
+    ]
+    image = Image.merge('RGB', channels)
+    noise = Image.effect_noise(size, 30 + seed * 5).convert('RGB')
+    image = Image.blend(image, noise, 0.2)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+class ThrottledUploadHandler(JSONHandler):
+    """Сервер загрузки, читающий тело со скоростью не выше rate байт/с"""
+
+    rate = UPLOAD_MBIT * 1e6 / 8
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        received = 0
+        started = time.monotonic()
+        while received < length:
+            received += len(self.rfile.read(min(65536, length - received)))
+            delay = started + received / self.rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        self._json({'server': 1, 'photo': '[]', 'hash': 'hash', 'size': length})
+
+def upload_all(publisher, upload_url, files, enabled: bool) -> float:
+    image_prep.configure_image_prep(enabled=enabled, workers=2 if enabled else 0)
+    started = time.perf_counter()
+    for path in files:
+        publisher._upload_file(upload_url, _prepare_photo(path))
+    return time.perf_counter() - started
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        files = []
+        for i, size in enumerate(SIZES):
+            path = Path(tmp) / f'sample_{i}_{size[0]}x{size[1]}.png'
+            path.write_bytes(make_png(size, i))
+            files.append(str(path))
+        original = sum(os.path.getsize(path) for path in files)
+        print(f'{len(files)} PNG, {original / 1e6:.1f} MB')
+
+        for image_format, quality in (('JPEG', 85), ('WEBP', 80)):
+            started = time.perf_counter()
+            results = [image_prep.process_image(path, (1280, 1280), image_format, quality) for path in files]
+            elapsed = time.perf_counter() - started
+            print(f'{image_format} q{quality}: {sum(map(len, results)) / 1e6:.2f} MB, '
+                  f'{elapsed / len(files) * 1000:.0f} ms per image')
+
+        server = FakeServer(ThrottledUploadHandler).start()
+        try:
+            publisher = VKPublisher('token')
+            upload_url = f'{server.url}/upload'
+            as_is = upload_all(publisher, upload_url, files, enabled=False)
+            prepared = upload_all(publisher, upload_url, files, enabled=True)
+        finally:
+            server.stop()
+            image_prep.configure_image_prep(enabled=False)
+        print(f'upload at {UPLOAD_MBIT} Mbit/s: as-is {as_is:.2f} s, prepared {prepared:.2f} s (with encoding)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Сохранение изображения провайдера: запись байтов как есть против
+декодирования и повторного сжатия через PIL
+
+Запуск из корня репозитория:
+    python benchmarks/bench_save_image.py
+
+Пиковая память (VmHWM из /proc, только Linux) измеряется в отдельном
+процессе для каждого способа, чтобы замеры не влияли друг на друга.
+ru_maxrss для этого не подходит: дочерний процесс наследует его от
+родителя.
+"""
+import io
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PIL import Image
+
+from generators.image_gen import save_image_bytes
+
+SIZE = (1024, 1024)
+ROUNDS = 10
+
+def make_png() -> bytes:
+    """PNG с шумом - по энтропии близок к реальному рендеру, хуже всего сжимается"""
+    image = Image.effect_noise(SIZE, 64).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def pil_round_trip(data: bytes, filename: str):
+    Image.open(io.BytesIO(data)).save(filename)
+
+def raw_write(data: bytes, filename: str):
+    save_image_bytes(data, filename)
+
+METHODS = {'decode + re-encode': pil_round_trip, 'raw write': raw_write}
+
+def peak_rss() -> int:
+    """Пиковый RSS процесса в КБ"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    raise RuntimeError('VmHWM недоступен')
+
+def peak_rss_growth(name: str, data: bytes, filename: str) -> int:
+    """Прирост пикового RSS (КБ) от одного сохранения"""
+    base = peak_rss()
+    METHODS[name](data, filename)
+    return peak_rss() - base
+
+def main():
+    data = make_png()
+    print(f'PNG {SIZE[0]}x{SIZE[1]}: {len(data) / 1e6:.1f} MB')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / 'source.png'
+        source.write_bytes(data)
+        target = str(Path(tmp) / 'out.png')
+
+        for name, method in METHODS.items():
+            started = time.process_time()
+            for _ in range(ROUNDS):
+                method(data, target)
+            cpu = (time.process_time() - started) / ROUNDS
+
+            rss = subprocess.run(
+                [sys.executable, __file__, '--rss', name, str(source), target],
+                check=True, capture_output=True, text=True
+            ).stdout.strip()
+            print(f'{name}: {cpu * 1000:.1f} ms CPU, +{int(rss) / 1024:.1f} MB peak RSS')
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--rss':
+        _, _, name, source, target = sys.argv
+        print(peak_rss_growth(name, Path(source).read_bytes(), target))
+    else:
+        main()
@@ -0,0 +1,65 @@
+"""
+Общая keep-alive сессия VKPublisher против нового соединения на каждый вызов
+
+Запуск из корня репозитория:
+    python benchmarks/bench_vk_session.py
+
+Публикует посты с фото через локальный фейковый API VK и считает
+принятые сервером TCP-соединения. Режим «без пула» воспроизводит
+прежнее поведение: каждый запрос идет через свою сессию requests.
+На loopback без TLS разница во времени - только установка TCP; с
+api.vk.com каждое новое соединение добавляет еще и TLS-рукопожатие.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import requests
+
+from generators import image_prep, vk_rate_limiter
+from generators.vk_publisher import VKPublisher
+from tests.fake_servers import fake_vk_server
+
+POSTS = 10
+
+class PerCallSession:
+    """Сессия, открывающая новое соединение для каждого запроса"""
+
+    def request(self, method, url, **kwargs):
+        with requests.Session() as session:
+            return session.request(method, url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+def run(pooled: bool, photo: bytes):
+    server = fake_vk_server()
+    try:
+        publisher = VKPublisher('token', base_url=f'{server.url}/method')
+        if not pooled:
+            publisher.session = PerCallSession()
+        started = time.perf_counter()
+        for _ in range(POSTS):
+            result = publisher.publish_post('Пост', photo=photo, group_id='1')
+            assert result['success'], result
+        elapsed = time.perf_counter() - started
+        return server.requests, server.connections, elapsed
+    finally:
+        server.stop()
+
+def main():
+    # Замеряем соединения, а не сжатие фото и ожидание лимита запросов
+    image_prep.configure_image_prep(enabled=False)
+    vk_rate_limiter.configure_rate_limit(requests_per_second=1000, burst=1000)
+    photo = os.urandom(256 * 1024)
+
+    for name, pooled in (('shared session', True), ('session per call', False)):
+        requests_count, connections, elapsed = run(pooled, photo)
+        print(f'{name}: {POSTS} posts, {requests_count} HTTP requests, '
+              f'{connections} TCP connections, {elapsed * 1000:.0f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from .text_gen import TextGenerator
+from .text_gen import TextGenerator, PostRequest
 from .image_gen import ImageGenerator
 
-__all__ = ['TextGenerator', 'ImageGenerator']
+__all__ = ['TextGenerator', 'PostRequest', 'ImageGenerator']
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Dict, Any, List
+
+# Расширение файла по формату изображения (см. detect_image_format)
+FORMAT_EXTENSIONS = {
+    'PNG': '.png',
+    'JPEG': '.jpg',
+    'WEBP': '.webp'
+}
+
+def make_image_key(provider: str, model: Optional[str], prompt: str, size: str, quality: str,
+                   seed: Optional[int], n: int) -> str:
+    """
+    Вычисляет ключ кэша по параметрам генерации изображения
+
+    Returns:
+        SHA-256 от канонического JSON-представления параметров
+    """
+    payload = json.dumps(
+        {'provider': provider, 'model': model, 'prompt': prompt, 'size': size,
+         'quality': quality, 'seed': seed, 'n': n},
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ImageCache:
+    """
+    Кэш сгенерированных изображений на диске с индексом в SQLite
+
+    Файлы называются по хэшу содержимого, поэтому разные генерации не
+    перезаписывают файлы друг друга, а запись индекса связывает ключ
+    параметров генерации (make_image_key) с файлами: повторный запрос с
+    теми же параметрами находит готовые изображения. Индекс хранит
+    размер и время последнего обращения к записи: записи старше max_age
+    удаляются, а при превышении max_bytes вытесняются давно не
+    использованные (LRU).
+    """
+
+    def __init__(self, directory: str, index_path: str, max_bytes: int = 500 * 1024 * 1024,
+                 max_age: Optional[float] = 30 * 86400):
+        """
+        Args:
+            directory: Папка для файлов изображений
+            index_path: Путь к файлу индекса SQLite
+            max_bytes: Максимальный суммарный размер файлов
+            max_age: Время жизни записи в секундах (None - без ограничения)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(index_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS image_cache ('
+                'key TEXT PRIMARY KEY, files TEXT NOT NULL, size INTEGER NOT NULL, '
+                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS ix_image_cache_accessed_at '
+                'ON image_cache (accessed_at)'
+            )
+
+    def _paths(self, files: str) -> List[str]:
+        return [os.path.join(self.directory, name) for name in json.loads(files)]
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """
+        Пути к изображениям записи, если она есть и все файлы на месте
+
+        Обращение обновляет время последнего использования записи.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT files, created_at FROM image_cache WHERE key = ?', (key,)
+            ).fetchone()
+            paths = None
+            if row is not None:
+                files, created_at = row
+                paths = self._paths(files)
+                if self._is_expired(created_at) or not all(os.path.exists(path) for path in paths):
+                    self._conn.execute('DELETE FROM image_cache WHERE key = ?', (key,))
+                    self._remove_unreferenced(paths)
+                    paths = None
+                else:
+                    self._conn.execute(
+                        'UPDATE image_cache SET accessed_at = ? WHERE key = ?', (time.time(), key)
+                    )
+
+            if paths is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return paths
+
+    def put(self, key: str, images: List[bytes], extensions: List[str]) -> List[str]:
+        """
+        Сохраняет изображения под ключом и вытесняет лишние записи
+
+        Прежняя запись с тем же ключом не удаляется сразу: на ее файлы
+        могут ссылаться уже выданные изображения (GeneratedImage, открытые
+        редактор и публикация). Она переименовывается в отдельный ключ,
+        недоступный через get(), и удаляется обычным вытеснением по
+        max_age и LRU.
+
+        Args:
+            key: Ключ кэша (make_image_key)
+            images: Закодированные изображения
+            extensions: Расширения файлов для каждого изображения
+
+        Returns:
+            Пути к сохраненным файлам
+        """
+        names = [
+            f"{hashlib.sha256(data).hexdigest()[:40]}{extension}"
+            for data, extension in zip(images, extensions)
+        ]
+        for name, data in zip(names, images):
+            path = os.path.join(self.directory, name)
+            # Запись через временный файл: читатель не увидит недописанное изображение
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        now = time.time()
+        with self._lock, self._conn:
+            # Новый вариант для тех же параметров (fresh): прежний остается до вытеснения
+            self._conn.execute(
+                'UPDATE image_cache SET key = ? WHERE key = ?', (f'{key}:replaced:{uuid.uuid4().hex}', key)
+            )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO image_cache (key, files, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, json.dumps(names), sum(len(data) for data in images), now, now)
+            )
+            self._evict(now, keep=key)
+        return [os.path.join(self.directory, name) for name in names]
+
+    def evict(self) -> int:
+        """Удаляет устаревшие записи и вытесняет лишние по LRU; возвращает число удаленных записей"""
+        with self._lock, self._conn:
+            return self._evict(time.time())
+
+    def _evict(self, now: float, keep: Optional[str] = None) -> int:
+        removed = []
+        if self.max_age is not None:
+            removed = self._conn.execute(
+                'SELECT key, files FROM image_cache WHERE created_at < ?', (now - self.max_age,)
+            ).fetchall()
+            self._conn.execute('DELETE FROM image_cache WHERE created_at < ?', (now - self.max_age,))
+
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM image_cache').fetchone()[0]
+        if total > self.max_bytes:
+            # Давно не использованные записи по индексу accessed_at, пока размер не уложится в лимит
+            for key, files, size in self._conn.execute(
+                'SELECT key, files, size FROM image_cache ORDER BY accessed_at'
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                self._conn.execute('DELETE FROM image_cache WHERE key = ?', (key,))
+                removed.append((key, files))
+                total -= size
+
+        for key, files in removed:
+            self._remove_unreferenced(self._paths(files))
+        return len(removed)
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.max_age is not None and time.time() - created_at > self.max_age
+
+    def _remove_unreferenced(self, paths: List[str]):
+        """Удаляет файлы, на которые не ссылается ни одна запись (одинаковые изображения хранятся одним файлом)"""
+        for path in paths:
+            name = os.path.basename(path)
+            if self._conn.execute(
+                'SELECT 1 FROM image_cache WHERE files LIKE ? LIMIT 1', (f'%"{name}"%',)
+            ).fetchone() is not None:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM image_cache'
+            ).fetchone()
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'entries': entries,
+            'size': size,
+            'max_size': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0
+        }
+
+def create_image_cache(config: Optional[Dict[str, Any]], directory: str) -> Optional[ImageCache]:
+    """
+    Создает кэш изображений по секции image_generation.cache конфигурации
+
+    Args:
+        config: Настройки кэша (enabled, max_size_mb, max_age_days, path)
+        directory: Папка для файлов изображений
+
+    Returns:
+        Экземпляр кэша или None, если кэш отключен
+    """
+    config = config or {}
+    if not config.get('enabled', True):
+        return None
+
+    max_age_days = config.get('max_age_days', 30)
+    return ImageCache(
+        directory=directory,
+        index_path=config.get('path', 'instance/image_cache.db'),
+        max_bytes=int(config.get('max_size_mb', 500) * 1024 * 1024),
+        max_age=max_age_days * 86400 if max_age_days is not None else None
+    )
@@ -1,41 +1,78 @@
-import requests
-import base64
 import io
 from PIL import Image
-import json
 from pathlib import Path
-from openai import OpenAI
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
+from generators.image_cache import ImageCache, make_image_key, FORMAT_EXTENSIONS
+from generators.image_providers import RenderProgress, create_provider, run_sync, run_background
+
+# Форматы по расширению файла
+EXTENSION_FORMATS = {
+    '.png': 'PNG',
+    '.jpg': 'JPEG',
+    '.jpeg': 'JPEG',
+    '.webp': 'WEBP'
+}
+
+def detect_image_format(data: bytes) -> Optional[str]:
+    """Определяет формат закодированного изображения по сигнатуре"""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+def save_image_bytes(data: bytes, filename: str, resize: Optional[Tuple[int, int]] = None,
+                     image_format: Optional[str] = None) -> str:
+    """
+    Сохраняет закодированное изображение в файл
+    
+    Если формат данных совпадает с целевым и изменение размера не нужно,
+    байты провайдера пишутся на диск как есть, без декодирования и
+    повторного сжатия. PIL используется только для конвертации и resize.
+    
+    Args:
+        data: Закодированное изображение (PNG/JPEG/WEBP)
+        filename: Путь к файлу
+        resize: Максимальные (ширина, высота) с сохранением пропорций
+        image_format: Целевой формат (по умолчанию - по расширению файла)
+        
+    Returns:
+        Путь к сохраненному файлу
+    """
+    target_format = image_format or EXTENSION_FORMATS.get(Path(filename).suffix.lower(), 'PNG')
+    
+    if resize is None and detect_image_format(data) == target_format:
+        with open(filename, 'wb') as f:
+            f.write(data)
+        return filename
+    
+    image = Image.open(io.BytesIO(data))
+    if resize is not None:
+        image.thumbnail(resize)
+    if target_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    image.save(filename, format=target_format)
+    return filename
 
 class ImageGenerator:
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], cache: Optional[ImageCache] = None):
         """
         Инициализация генератора изображений
         
+        Запросы к провайдеру асинхронные (см. image_providers): синхронные
+        методы лишь ждут результат из общего цикла событий.
+        
         Args:
             config: Конфигурация генерации изображений
+            cache: Кэш изображений по параметрам генерации (опционально)
         """
         self.config = config
         self.provider = config.get('provider', 'stable_diffusion')
-        self.client = requests.Session()
-        
-        # Инициализация клиентов в зависимости от провайдера
-        if self.provider == 'gpt4o':
-            gpt4o_config = config.get('gpt4o', {})
-            self.openai_client = OpenAI(
-                api_key=gpt4o_config.get('api_key'),
-                base_url=gpt4o_config.get('base_url', 'https://api.openai.com/v1')
-            )
-            self.text_model = gpt4o_config.get('text_model', 'gpt-4o')
-            self.image_model = gpt4o_config.get('image_model', 'dall-e-3')
-        elif self.provider == 'dalle':
-            dalle_config = config.get('dalle', {})
-            self.openai_client = OpenAI(api_key=dalle_config.get('api_key'))
-            self.model = dalle_config.get('model', 'dall-e-3')
-        else:
-            # WEBUI (Stable Diffusion)
-            webui_config = config.get('webui', {})
-            self.base_url = webui_config.get('base_url', 'http://localhost:7860')
+        self.cache = cache
+        self.backend = create_provider(self.provider, config)
+        self.model_name = self.backend.model_name
     
     def generate_image(self, prompt, size="1024x1024", quality="standard", n=1):
         """
@@ -48,134 +85,112 @@ class ImageGenerator:
             n: Количество изображений
             
         Returns:
-            PIL Image объект
+            Список PIL Image объектов (все изображения, полученные от провайдера)
         """
-        if self.provider == 'gpt4o':
-            return self._generate_with_gpt4o(prompt, size, quality, n)
-        elif self.provider == 'dalle':
-            return self._generate_with_dalle(prompt, size, quality, n)
-        else:
-            return self._generate_with_webui(prompt, size, quality, n)
+        return [
+            Image.open(io.BytesIO(data))
+            for data in self.generate_image_bytes(prompt, size, quality, n)
+        ]
     
-    def _generate_with_gpt4o(self, prompt, size, quality, n):
-        """Генерация через GPT-4o с vision capabilities"""
-        try:
-            # GPT-4o может генерировать изображения через специальный API
-            # Здесь мы используем GPT-4o для создания промпта для DALL-E
-            enhanced_prompt = self._enhance_prompt_with_gpt4o(prompt)
-            
-            # Затем используем DALL-E для генерации
-            return self._generate_with_dalle(enhanced_prompt, size, quality, n)
+    def generate_image_bytes(self, prompt, size="1024x1024", quality="standard", n=1, seed=None,
+                             enhance=None, progress: Optional[RenderProgress] = None) -> List[bytes]:
+        """
+        Генерирует изображения и возвращает их в том виде, как их отдал провайдер
+        
+        Args:
+            prompt: Текст промпта для генерации
+            size: Размер изображения (например, "1024x1024")
+            quality: Качество генерации ("standard" или "hd")
+            n: Количество изображений
+            seed: Зерно генерации (только Stable Diffusion; None - случайное)
+            enhance: Улучшать промпт перед генерацией (только GPT-4o; None - по настройке)
+            progress: Прогресс генерации и запрос отмены (см. RenderProgress);
+                при отмене выбрасывается GenerationCancelled
             
-        except Exception as e:
-            raise Exception(f"GPT-4o generation failed: {e}")
+        Returns:
+            Список закодированных изображений (обычно PNG)
+        """
+        return run_sync(self.agenerate_image_bytes(prompt, size, quality, n, seed, enhance, progress), progress)
     
-    def _enhance_prompt_with_gpt4o(self, original_prompt):
-        """Улучшает промпт с помощью GPT-4o"""
-        try:
-            response = self.openai_client.chat.completions.create(
-                model=self.text_model,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Ты эксперт по созданию промптов для генерации изображений. Твоя задача - улучшить данный промпт, сделав его более детальным и эффективным для генерации качественных изображений. Отвечай только улучшенным промптом на английском языке."
-                    },
-                    {
-                        "role": "user", 
-                        "content": f"Улучши этот промпт для генерации изображения: {original_prompt}"
-                    }
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            
-            return response.choices[0].message.content.strip()
-            
-        except Exception as e:
-            # Если GPT-4o недоступен, возвращаем оригинальный промпт
-            return original_prompt
+    async def agenerate_image_bytes(self, prompt, size="1024x1024", quality="standard", n=1,
+                                    seed=None, enhance=None, progress=None) -> List[bytes]:
+        """Асинхронный вариант generate_image_bytes для вызова из цикла событий провайдеров"""
+        return await self.backend.prepare_and_generate(prompt, size, quality, n, seed, enhance, progress)
     
-    def _generate_with_dalle(self, prompt, size, quality, n):
-        """Генерация через DALL-E"""
-        try:
-            # Преобразуем размер для DALL-E
-            size_mapping = {
-                "1024x1024": "1024x1024",
-                "1024x1792": "1024x1792", 
-                "1792x1024": "1792x1024"
-            }
-            dalle_size = size_mapping.get(size, "1024x1024")
-            
-            # Используем правильную модель для DALL-E
-            if self.provider == 'gpt4o':
-                dalle_model = self.image_model  # Используем модель изображений из конфига
-            else:
-                dalle_model = self.model  # Для провайдера dalle используем настроенную модель
-            
-            response = self.openai_client.images.generate(
-                model=dalle_model,
-                prompt=prompt,
-                size=dalle_size,
-                quality=quality,
-                n=min(n, 1)  # DALL-E поддерживает только 1 изображение за раз
-            )
-            
-            # Скачиваем изображение
-            image_url = response.data[0].url
-            image_response = requests.get(image_url)
-            image_response.raise_for_status()
-            
-            # Создаем PIL Image
-            image = Image.open(io.BytesIO(image_response.content))
-            return image
-            
-        except Exception as e:
-            raise Exception(f"DALL-E generation failed: {e}")
+    def prefetch_prompt(self, prompt, enhance=None) -> bool:
+        """
+        Запускает улучшение промпта заранее, не дожидаясь результата
+        
+        Пока пользователь редактирует описание, промпт улучшается в фоне,
+        и сама генерация берет его из кэша провайдера.
+        
+        Returns:
+            True, если провайдер улучшает промпт и запрос запущен
+        """
+        if not self.backend.enhance_enabled(enhance):
+            return False
+        run_background(self.backend.prepare_prompt(prompt, enhance))
+        return True
+    
+    def cache_key(self, prompt, size="1024x1024", quality="standard", n=1, seed=None, enhance=None) -> str:
+        """Ключ кэша изображений для параметров генерации"""
+        return make_image_key(self.provider, self.backend.model_for(enhance), prompt, size, quality, seed, n)
     
-    def _generate_with_webui(self, prompt, size, quality, n):
-        """Генерация через Stable Diffusion"""
-        # Парсим размер
-        width, height = map(int, size.split('x'))
+    def get_cached(self, prompt, size="1024x1024", quality="standard", n=1, seed=None,
+                   enhance=None) -> Optional[List[str]]:
+        """
+        Пути к ранее сгенерированным изображениям с теми же параметрами
         
-        # Настройки качества
-        steps = 20 if quality == "standard" else 30
+        Returns:
+            Список путей или None, если кэш отключен или записи нет
+        """
+        if self.cache is None:
+            return None
+        return self.cache.get(self.cache_key(prompt, size, quality, n, seed, enhance))
+    
+    def generate_cached(self, prompt, size="1024x1024", quality="standard", n=1, seed=None,
+                        use_cache=True, enhance=None, progress=None) -> List[str]:
+        """
+        Генерирует изображения через кэш
         
-        # Базовый payload для Stable Diffusion
-        payload = {
-            "prompt": prompt,
-            "negative_prompt": "blurry, low quality, cartoon, anime, ugly, bad anatomy",
-            "width": width,
-            "height": height,
-            "steps": steps,
-            "cfg_scale": 7,
-            "sampler_name": "DPM++ 2M Karras",
-            "seed": -1,
-            "batch_size": n
-        }
+        При use_cache=True готовые изображения с теми же параметрами
+        возвращаются без обращения к провайдеру. Новые изображения
+        сохраняются в кэш (при use_cache=False - заменяя прежний вариант).
         
-        try:
-            response = self.client.post(
-                url=f'{self.base_url}/sdapi/v1/txt2img',
-                json=payload,
-                timeout=120  # Увеличиваем таймаут для генерации
-            )
-            response.raise_for_status()
-            
-            result = response.json()
+        Returns:
+            Список путей к файлам изображений
+        """
+        if use_cache:
+            cached = self.get_cached(prompt, size, quality, n, seed, enhance)
+            if cached is not None:
+                return cached
+        
+        payloads = self.generate_image_bytes(prompt, size, quality, n, seed, enhance, progress)
+        extensions = [FORMAT_EXTENSIONS.get(detect_image_format(data), '.png') for data in payloads]
+        return self.cache.put(self.cache_key(prompt, size, quality, n, seed, enhance), payloads, extensions)
+    
+    def generate_and_save(self, prompt, filename="generated_image.png", resize=None, image_format=None, **kwargs):
+        """
+        Генерирует и сохраняет изображения
+        
+        Первое изображение сохраняется под именем filename, остальные
+        изображения пакета - с суффиксом номера (image_1.png, image_2.png, ...).
+        Без resize и смены формата данные провайдера пишутся на диск без
+        перекодирования (см. save_image_bytes).
+        
+        Args:
+            prompt: Текст промпта для генерации
+            filename: Путь к файлу первого изображения
+            resize: Максимальные (ширина, высота) для уменьшения (опционально)
+            image_format: Целевой формат PNG/JPEG/WEBP (по умолчанию - по расширению)
             
-            if 'images' in result and len(result['images']) > 0:
-                # Декодируем base64 и возвращаем PIL Image
-                image_data = base64.b64decode(result['images'][0])
-                image = Image.open(io.BytesIO(image_data))
-                return image
-            else:
-                raise Exception("No images in response")
-                
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Stable Diffusion API request failed: {e}")
-
-    def generate_and_save(self, prompt, filename="generated_image.png", **kwargs):
-        """Генерирует и сохраняет изображение"""
-        image = self.generate_image(prompt, **kwargs)
-        image.save(filename)
-        return filename
\ No newline at end of file
+        Returns:
+            Список имен сохраненных файлов
+        """
+        payloads = self.generate_image_bytes(prompt, **kwargs)
+        path = Path(filename)
+        filenames = []
+        for i, data in enumerate(payloads):
+            image_filename = str(path) if i == 0 else str(path.with_name(f"{path.stem}_{i}{path.suffix}"))
+            filenames.append(save_image_bytes(data, image_filename, resize, image_format))
+        return filenames
\ No newline at end of file
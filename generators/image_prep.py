@@ -0,0 +1,170 @@
+import io
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, List, Tuple, Union
+
+from PIL import Image, ImageOps
+
+# Настройки подготовки фото к загрузке (меняются через configure_image_prep)
+_settings = {
+    'enabled': True,
+    # VK хранит фото до 2560 px, но в ленте и просмотрщике показывает не больше 1280 px
+    'max_size': (1280, 1280),
+    'format': 'JPEG',
+    'quality': 85,
+    'workers': 2
+}
+_executor = None
+_executor_lock = threading.Lock()
+
+# Параметры кодирования по формату: без exif/icc_profile метаданные не сохраняются
+_SAVE_OPTIONS = {
+    'JPEG': {'optimize': True, 'progressive': True, 'subsampling': '4:2:0'},
+    'WEBP': {'method': 4}
+}
+
+ImageSource = Union[str, bytes]
+
+def configure_image_prep(enabled: Optional[bool] = None, max_size: Optional[Tuple[int, int]] = None,
+                         image_format: Optional[str] = None, quality: Optional[int] = None,
+                         workers: Optional[int] = None):
+    """
+    Настраивает подготовку фото перед загрузкой в VK
+
+    Вызывается при старте приложения до запуска рабочих потоков: пул
+    процессов создается сразу, пока процесс еще однопоточный.
+
+    Args:
+        enabled: Подготавливать фото (иначе загружаются как есть)
+        max_size: Максимальные (ширина, высота) с сохранением пропорций
+        image_format: Формат результата - JPEG или WEBP
+        quality: Качество сжатия (1-95)
+        workers: Число процессов пула (0 - кодирование в вызывающем потоке)
+    """
+    global _executor
+    with _executor_lock:
+        if enabled is not None:
+            _settings['enabled'] = enabled
+        if max_size is not None:
+            _settings['max_size'] = tuple(max_size)
+        if image_format is not None:
+            if image_format.upper() not in _SAVE_OPTIONS:
+                raise ValueError(f"Unsupported image format: {image_format}")
+            _settings['format'] = image_format.upper()
+        if quality is not None:
+            _settings['quality'] = quality
+        if workers is not None:
+            _settings['workers'] = workers
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+        if _settings['enabled'] and _settings['workers'] > 0:
+            _executor = ProcessPoolExecutor(max_workers=_settings['workers'])
+            # Запускаем процессы сразу, а не при первой загрузке фото
+            for future in [_executor.submit(os.getpid) for _ in range(_settings['workers'])]:
+                future.result()
+
+def is_enabled() -> bool:
+    return _settings['enabled']
+
+def process_image(source: ImageSource, max_size: Tuple[int, int], image_format: str = 'JPEG',
+                  quality: int = 85) -> bytes:
+    """
+    Уменьшает и перекодирует изображение
+
+    Поворот из EXIF применяется к пикселям, сами метаданные (EXIF,
+    ICC, текстовые блоки PNG) в результат не попадают. Прозрачность при
+    сохранении в JPEG заменяется белым фоном.
+
+    Args:
+        source: Путь к файлу или закодированное изображение
+        max_size: Максимальные (ширина, высота) с сохранением пропорций
+        image_format: Формат результата - JPEG или WEBP
+        quality: Качество сжатия
+
+    Returns:
+        Закодированное изображение
+    """
+    image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+    # Для JPEG декодер сразу уменьшает изображение кратно 1/2-1/8 - быстрее полного декодирования
+    image.draft('RGB', max_size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(max_size, Image.LANCZOS, reducing_gap=3.0)
+
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA', 'L'):
+        image = image.convert('RGBA')
+
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=quality, **_SAVE_OPTIONS[image_format])
+    return output.getvalue()
+
+def _source_size(source: ImageSource) -> int:
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+def _worth_it(source: ImageSource, result: bytes) -> bool:
+    """Результат меньше исходного файла (уже сжатое фото не раздувается)"""
+    return len(result) < _source_size(source)
+
+def prepare_for_upload(source: ImageSource) -> ImageSource:
+    """
+    Подготавливает фото к загрузке в VK в пуле процессов
+
+    Декодирование и сжатие выполняются в отдельном процессе, поэтому не
+    занимают GIL потоков веб-сервера. Если изображение не удалось
+    обработать или результат не меньше исходного, возвращается исходное фото.
+
+    Args:
+        source: Путь к файлу или закодированное изображение
+
+    Returns:
+        Сжатое изображение (bytes) или исходный source
+    """
+    if not _settings['enabled']:
+        return source
+    return prepare_many([source])[0]
+
+def prepare_many(sources: List[ImageSource]) -> List[ImageSource]:
+    """Подготавливает несколько фото параллельно (см. prepare_for_upload)"""
+    if not _settings['enabled']:
+        return list(sources)
+
+    args = (_settings['max_size'], _settings['format'], _settings['quality'])
+    executor = _executor
+    results = []
+    if executor is not None:
+        try:
+            futures = [executor.submit(process_image, source, *args) for source in sources]
+            for source, future in zip(sources, futures):
+                results.append(_result_or_source(source, future.result))
+            return results
+        except BrokenProcessPool:
+            print("⚠️ Пул подготовки изображений недоступен, сжатие выполняется в текущем процессе")
+            _discard_executor(executor)
+            results = []
+
+    for source in sources:
+        results.append(_result_or_source(source, lambda: process_image(source, *args)))
+    return results
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+
+def _result_or_source(source: ImageSource, get_result) -> ImageSource:
+    try:
+        result = get_result()
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        print(f"⚠️ Не удалось подготовить изображение, загружается исходное: {e}")
+        return source
+    return result if _worth_it(source, result) else source
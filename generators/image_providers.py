@@ -0,0 +1,652 @@
+import asyncio
+import base64
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, List, Callable
+
+import httpx
+from openai import AsyncOpenAI
+
+from generators.text_gen import create_response_cache, make_cache_key
+
+# Размеры, которые поддерживает DALL-E (остальные заменяются квадратом)
+DALLE_SIZES = ('1024x1024', '1024x1792', '1792x1024')
+
+PROMPT_ENHANCE_SYSTEM_PROMPT = "Ты эксперт по созданию промптов для генерации изображений. Твоя задача - улучшить данный промпт, сделав его более детальным и эффективным для генерации качественных изображений. Отвечай только улучшенным промптом на английском языке."
+
+# Параметры запроса улучшения промпта (входят в ключ кэша)
+PROMPT_ENHANCE_PARAMS = {'max_tokens': 500, 'temperature': 0.7}
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Общий для процесса цикл событий генерации изображений
+
+    Цикл работает в отдельном потоке и создается при первом обращении.
+    Все запросы к провайдерам выполняются в нем, поэтому одновременные
+    генерации не занимают по потоку каждая.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='image_providers', daemon=True)
+            thread.start()
+            _loop = loop
+        return _loop
+
+class GenerationCancelled(Exception):
+    """Генерация отменена по запросу (см. RenderProgress)"""
+
+class RenderProgress:
+    """
+    Прогресс генерации и запрос ее отмены
+
+    Провайдер обновляет прогресс в цикле событий (update). Поток, который
+    ждет результат в run_sync, каждые interval секунд вызывает
+    on_tick(progress): так прогресс передается наружу, а ответ True
+    отменяет генерацию.
+    """
+
+    def __init__(self, on_tick: Optional[Callable[['RenderProgress'], bool]] = None, interval: float = 1.0):
+        """
+        Args:
+            on_tick: Функция progress -> нужно ли отменить генерацию
+            interval: Период вызова on_tick в секундах
+        """
+        self.on_tick = on_tick
+        self.interval = interval
+        self.progress = 0.0
+        self.eta = None
+        self.preview = None
+
+    def update(self, progress: float, eta: Optional[float] = None, preview: Optional[bytes] = None):
+        """
+        Args:
+            progress: Доля выполненной работы (0-1)
+            eta: Оценка оставшегося времени в секундах
+            preview: Промежуточный кадр (закодированное изображение)
+        """
+        self.progress = progress
+        self.eta = eta
+        if preview is not None:
+            self.preview = preview
+
+def run_sync(coro, progress: Optional[RenderProgress] = None):
+    """
+    Выполняет корутину в общем цикле событий и ждет результат в вызывающем потоке
+
+    С progress пока корутина выполняется, периодически вызывается
+    progress.on_tick; если он запросил отмену, корутина отменяется и
+    выбрасывается GenerationCancelled. Если on_tick выбросил исключение,
+    корутина тоже отменяется, а исключение передается вызывающему.
+    """
+    loop = get_event_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync нельзя вызывать из цикла событий провайдеров - используйте await")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    if progress is None or progress.on_tick is None:
+        return future.result()
+
+    try:
+        while True:
+            try:
+                return future.result(timeout=progress.interval)
+            except FutureTimeoutError:
+                if progress.on_tick(progress):
+                    raise GenerationCancelled("Генерация отменена")
+    except BaseException:
+        # Отмена, ошибка on_tick или прерывание потока: результат никто не ждет.
+        # Отмена задачи в цикле событий прерывает и запрос к провайдеру
+        future.cancel()
+        raise
+
+def run_background(coro):
+    """Запускает корутину в общем цикле событий, не дожидаясь результата"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+class ImageProvider:
+    """
+    Асинхронный провайдер генерации изображений
+
+    Число одновременных запросов к API провайдера ограничено семафором
+    max_concurrent; остальные запросы ждут в цикле событий, не занимая
+    потоков.
+    """
+
+    name = None
+    # Кэш улучшенных промптов (только у провайдеров, которые их улучшают)
+    enhance_cache = None
+
+    def __init__(self, config: Dict[str, Any], max_concurrent: int = 4, timeout: float = 120):
+        """
+        Args:
+            config: Секция конфигурации провайдера
+            max_concurrent: Максимум одновременных запросов к провайдеру
+            timeout: Таймаут запроса в секундах
+        """
+        self.config = config
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.model_name = None
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+    async def generate(self, prompt: str, size: str = "1024x1024", quality: str = "standard",
+                       n: int = 1, seed: Optional[int] = None,
+                       progress: Optional[RenderProgress] = None) -> List[bytes]:
+        """
+        Генерирует изображения
+
+        Провайдеры, которые умеют сообщать прогресс, обновляют progress.
+
+        Returns:
+            Список закодированных изображений в том виде, как их отдал провайдер
+        """
+        raise NotImplementedError
+
+    def enhance_enabled(self, enhance: Optional[bool] = None) -> bool:
+        """Улучшается ли промпт перед генерацией (None - по настройке провайдера)"""
+        return False
+
+    async def prepare_prompt(self, prompt: str, enhance: Optional[bool] = None) -> str:
+        """Промпт, который передается модели изображений"""
+        return prompt
+
+    def model_for(self, enhance: Optional[bool] = None) -> Optional[str]:
+        """Модели, участвующие в генерации (для ключа кэша изображений)"""
+        return self.model_name
+
+    async def prepare_and_generate(self, prompt: str, size: str = "1024x1024", quality: str = "standard",
+                                   n: int = 1, seed: Optional[int] = None, enhance: Optional[bool] = None,
+                                   progress: Optional[RenderProgress] = None) -> List[bytes]:
+        """Подготавливает промпт (prepare_prompt) и генерирует по нему изображения"""
+        prompt = await self.prepare_prompt(prompt, enhance)
+        return await self.generate(prompt, size, quality, n, seed, progress)
+
+    async def _limited(self, coro):
+        """Выполняет запрос к провайдеру, заняв слот семафора"""
+        try:
+            async with self._slots:
+                return await coro
+        finally:
+            # Запрос отменен, пока ждал слот, - корутина так и не была запущена
+            coro.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'provider': self.name, 'model': self.model_name, 'max_concurrent': self.max_concurrent}
+
+class WebUIProvider(ImageProvider):
+    """
+    Stable Diffusion WebUI (API /sdapi/v1)
+
+    Пока идет рендер, прогресс и промежуточный кадр опрашиваются через
+    /sdapi/v1/progress, а при отмене запроса рендер прерывается через
+    /sdapi/v1/interrupt, чтобы GPU сразу освободился. Оба вызова
+    относятся к текущему рендеру сервера, поэтому выполняются только при
+    max_concurrent=1 (запросы к WebUI идут по одному).
+    """
+
+    name = 'webui'
+
+    def __init__(self, config: Dict[str, Any], max_concurrent: int = 1, timeout: float = 120):
+        super().__init__(config, max_concurrent, timeout)
+        self.base_url = config.get('base_url', 'http://localhost:7860')
+        self.model_name = config.get('model')
+        self.progress_interval = config.get('progress_interval', 1.0)
+        self.live_preview = config.get('live_preview', True)
+        self.client = httpx.AsyncClient(base_url=self.base_url, timeout=timeout)
+
+    async def generate(self, prompt, size="1024x1024", quality="standard", n=1, seed=None, progress=None):
+        # Парсим размер
+        width, height = map(int, size.split('x'))
+
+        # Базовый payload для Stable Diffusion
+        payload = {
+            "prompt": prompt,
+            "negative_prompt": "blurry, low quality, cartoon, anime, ugly, bad anatomy",
+            "width": width,
+            "height": height,
+            "steps": 20 if quality == "standard" else 30,
+            "cfg_scale": 7,
+            "sampler_name": "DPM++ 2M Karras",
+            "seed": -1 if seed is None else seed,
+            "batch_size": n
+        }
+
+        exclusive = self.max_concurrent == 1
+        async with self._slots:
+            poller = None
+            if progress is not None and exclusive:
+                poller = asyncio.ensure_future(self._poll_progress(progress))
+            try:
+                response = await self.client.post('/sdapi/v1/txt2img', json=payload)
+                response.raise_for_status()
+            except asyncio.CancelledError:
+                if exclusive:
+                    # Иначе WebUI дорисует изображение для ушедшего клиента, занимая GPU
+                    await self._interrupt()
+                raise
+            except httpx.HTTPError as e:
+                raise Exception(f"Stable Diffusion API request failed: {e}")
+            finally:
+                if poller is not None:
+                    poller.cancel()
+
+        result = response.json()
+        if not result.get('images'):
+            raise Exception("No images in response")
+        # Возвращаем все изображения пакета (batch_size), а не только первое
+        return [base64.b64decode(image_data) for image_data in result['images']]
+
+    async def _poll_progress(self, progress: RenderProgress):
+        params = {'skip_current_image': 'false' if self.live_preview else 'true'}
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            try:
+                response = await self.client.get('/sdapi/v1/progress', params=params)
+                response.raise_for_status()
+                data = response.json()
+            except (httpx.HTTPError, ValueError):
+                # Прогресс необязателен - рендер продолжается
+                continue
+            preview = data.get('current_image')
+            progress.update(
+                data.get('progress') or 0.0,
+                data.get('eta_relative'),
+                base64.b64decode(preview) if preview else None
+            )
+
+    async def _interrupt(self):
+        try:
+            response = await self.client.post('/sdapi/v1/interrupt', timeout=10)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"⚠️ Не удалось прервать рендер Stable Diffusion: {e}")
+
+class DalleProvider(ImageProvider):
+    """DALL-E (OpenAI Images API)"""
+
+    name = 'dalle'
+
+    def __init__(self, config: Dict[str, Any], max_concurrent: int = 4, timeout: float = 120):
+        super().__init__(config, max_concurrent, timeout)
+        self.image_model = config.get('model', 'dall-e-3')
+        self.model_name = self.image_model
+        self.client = AsyncOpenAI(
+            api_key=config.get('api_key'),
+            base_url=config.get('base_url', 'https://api.openai.com/v1'),
+            timeout=timeout
+        )
+        # Изображения, отданные ссылкой, скачиваются через общий пул соединений
+        self.http = httpx.AsyncClient(timeout=timeout)
+
+    async def generate(self, prompt, size="1024x1024", quality="standard", n=1, seed=None, progress=None):
+        try:
+            return await self._generate_dalle(prompt, size, quality, n)
+        except Exception as e:
+            raise Exception(f"DALL-E generation failed: {e}")
+
+    async def _generate_dalle(self, prompt, size, quality, n):
+        dalle_size = size if size in DALLE_SIZES else "1024x1024"
+
+        # DALL-E 3 отдает одно изображение за запрос - пакет собирается параллельными запросами
+        if self.image_model == 'dall-e-2':
+            per_request, requests_count = n, 1
+        else:
+            per_request, requests_count = 1, n
+        responses = await asyncio.gather(*(
+            self._limited(self.client.images.generate(
+                model=self.image_model,
+                prompt=prompt,
+                size=dalle_size,
+                quality=quality,
+                n=per_request,
+                # Изображение приходит в ответе - без отдельного скачивания по URL
+                response_format='b64_json'
+            ))
+            for _ in range(requests_count)
+        ))
+
+        items = [item for response in responses for item in response.data]
+        return list(await asyncio.gather(*(self._image_data(item) for item in items)))
+
+    async def _image_data(self, item) -> bytes:
+        if item.b64_json:
+            return base64.b64decode(item.b64_json)
+        response = await self.http.get(item.url)
+        response.raise_for_status()
+        return response.content
+
+class GPT4oProvider(DalleProvider):
+    """
+    DALL-E с промптом, улучшенным GPT-4o
+
+    Улучшение промпта - отдельный этап перед генерацией: его можно
+    отключить для запроса (промпт уже составлен моделью) или запустить
+    заранее, пока пользователь редактирует описание. Результат
+    запоминается по исходному промпту, а одновременные запросы с одним
+    промптом ждут один вызов модели.
+    """
+
+    name = 'gpt4o'
+
+    def __init__(self, config: Dict[str, Any], max_concurrent: int = 4, timeout: float = 120):
+        super().__init__(dict(config, model=config.get('image_model', 'dall-e-3')), max_concurrent, timeout)
+        self.text_model = config.get('text_model', 'gpt-4o')
+        self.model_name = f"{self.text_model}+{self.image_model}"
+        self.enhance_by_default = config.get('enhance_prompt', True)
+        self.enhance_cache = create_response_cache(config.get('enhance_cache', {'enabled': True}))
+        self._enhancing = {}
+
+    def enhance_enabled(self, enhance=None):
+        return self.enhance_by_default if enhance is None else bool(enhance)
+
+    async def prepare_prompt(self, prompt, enhance=None):
+        if not self.enhance_enabled(enhance):
+            return prompt
+        return await self.enhance_prompt(prompt)
+
+    def model_for(self, enhance=None):
+        # Без улучшения изображение генерирует только DALL-E по исходному промпту
+        return self.model_name if self.enhance_enabled(enhance) else self.image_model
+
+    async def enhance_prompt(self, original_prompt: str) -> str:
+        """Улучшает промпт с помощью GPT-4o (из кэша, если он уже улучшался)"""
+        messages = [
+            {"role": "system", "content": PROMPT_ENHANCE_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Улучши этот промпт для генерации изображения: {original_prompt}"}
+        ]
+        key = make_cache_key(self.text_model, messages, PROMPT_ENHANCE_PARAMS)
+        if self.enhance_cache is not None:
+            cached = self.enhance_cache.get(key)
+            if cached is not None:
+                return cached
+
+        # Запрос с тем же промптом уже идет (например, запущен заранее) - ждем его
+        task = self._enhancing.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request_enhancement(key, messages, original_prompt))
+            self._enhancing[key] = task
+            task.add_done_callback(lambda _: self._enhancing.pop(key, None))
+        # shield: отмена одного ожидающего не прерывает запрос для остальных
+        return await asyncio.shield(task)
+
+    async def _request_enhancement(self, key: str, messages: List[Dict[str, str]], original_prompt: str) -> str:
+        try:
+            response = await self._limited(self.client.chat.completions.create(
+                model=self.text_model,
+                messages=messages,
+                **PROMPT_ENHANCE_PARAMS
+            ))
+            enhanced_prompt = response.choices[0].message.content.strip()
+        except Exception:
+            # Если GPT-4o недоступен, возвращаем оригинальный промпт (в кэш не попадает)
+            return original_prompt
+        if self.enhance_cache is not None and enhanced_prompt:
+            self.enhance_cache.set(key, enhanced_prompt)
+        return enhanced_prompt or original_prompt
+
+class ProviderHealth:
+    """
+    Живая статистика провайдера для маршрутизатора и автомат отключения
+
+    Задержка и доля ошибок - экспоненциальные скользящие средние. После
+    failure_threshold ошибок подряд провайдер отключается (цепь
+    размыкается) на reset_timeout секунд, затем получает один пробный
+    запрос: успех возвращает его в работу, ошибка снова отключает.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0, alpha: float = 0.3):
+        """
+        Args:
+            failure_threshold: Ошибок подряд до отключения провайдера
+            reset_timeout: Через сколько секунд отключенный провайдер получает пробный запрос
+            alpha: Вес последнего запроса в скользящих средних
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def available(self) -> bool:
+        """Можно ли отправить запрос (в полуоткрытом состоянии - только один пробный)"""
+        state = self.state
+        return state == 'closed' or (state == 'half_open' and not self.probing)
+
+    def started(self):
+        self.inflight += 1
+        self.requests += 1
+        if self.opened_at is not None:
+            self.probing = True
+
+    def succeeded(self, elapsed: float):
+        self.inflight -= 1
+        self.latency = elapsed if self.latency is None else self.alpha * elapsed + (1 - self.alpha) * self.latency
+        self.error_rate = (1 - self.alpha) * self.error_rate
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failed(self):
+        self.inflight -= 1
+        self.failures += 1
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_failures += 1
+        if self.probing or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self.probing:
+                print(f"⚠️ Провайдер изображений отключен на {self.reset_timeout:.0f} с после {self.consecutive_failures} ошибок подряд")
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+    def cancelled(self, elapsed: float):
+        """
+        Запрос отменен (проиграл дублирующему или генерацию отменили)
+
+        Это не успех и не ошибка, но ответ не пришел за elapsed секунд -
+        это нижняя граница задержки. Без нее проигравший провайдер
+        оставался бы без статистики и снова получал запросы первым.
+        """
+        self.inflight -= 1
+        self.probing = False
+        if self.latency is None or elapsed > self.latency:
+            self.latency = elapsed if self.latency is None else self.alpha * elapsed + (1 - self.alpha) * self.latency
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'latency': self.latency,
+            'error_rate': self.error_rate,
+            'consecutive_failures': self.consecutive_failures,
+            'inflight': self.inflight,
+            'requests': self.requests,
+            'failures': self.failures
+        }
+
+class RouterProvider(ImageProvider):
+    """
+    Маршрутизатор между несколькими провайдерами
+
+    Запрос отправляется провайдеру с наименьшей ожидаемой задержкой:
+    скользящая средняя задержки с поправкой на долю ошибок и очередь
+    запросов к нему. Если ответа нет за hedge_delay секунд, тот же
+    запрос дублируется следующему провайдеру и берется первый
+    успешный ответ, а второй запрос отменяется. При ошибке запрос
+    сразу уходит следующему провайдеру; провайдеры с отключенной цепью
+    (см. ProviderHealth) пропускаются.
+    """
+
+    name = 'router'
+
+    def __init__(self, config: Dict[str, Any], backends: List[ImageProvider]):
+        """
+        Args:
+            config: Секция router (hedge_delay, failure_threshold, reset_timeout)
+            backends: Провайдеры в порядке предпочтения (пока нет статистики)
+        """
+        super().__init__(config, max_concurrent=sum(backend.max_concurrent for backend in backends),
+                         timeout=max(backend.timeout for backend in backends))
+        self.backends = backends
+        self.hedge_delay = config.get('hedge_delay', 30.0)
+        self.health = [
+            ProviderHealth(
+                failure_threshold=config.get('failure_threshold', 3),
+                reset_timeout=config.get('reset_timeout', 60.0)
+            )
+            for _ in backends
+        ]
+        self.model_name = ','.join(backend.model_name or backend.name for backend in backends)
+
+    def _expected_latency(self, index: int) -> float:
+        backend, health = self.backends[index], self.health[index]
+        latency = health.latency
+        if latency is None:
+            if health.requests == 0:
+                # Провайдер без статистики пробуем первым, чтобы ее собрать
+                return 0.0
+            if health.failures:
+                # Ни одного успешного ответа - ждать его можно до таймаута
+                latency = backend.timeout
+            else:
+                # Первые запросы еще идут - считаем его не быстрее остальных
+                known = [other.latency for other in self.health if other.latency is not None]
+                latency = max(known) if known else backend.timeout
+        queued = health.inflight / backend.max_concurrent
+        return latency * (1 + queued) / max(1 - health.error_rate, 0.1)
+
+    def _ranked(self) -> List[int]:
+        """Индексы доступных провайдеров от лучшего к худшему"""
+        available = [index for index, health in enumerate(self.health) if health.available()]
+        return sorted(available, key=self._expected_latency)
+
+    def enhance_enabled(self, enhance=None):
+        return any(backend.enhance_enabled(enhance) for backend in self.backends)
+
+    async def prepare_prompt(self, prompt, enhance=None):
+        # Провайдер выбирается при генерации, и промпт улучшает он сам (см. _call);
+        # здесь улучшение только запускается заранее у всех, кто его выполняет
+        enhancing = [backend for backend in self.backends if backend.enhance_enabled(enhance)]
+        if enhancing:
+            await asyncio.gather(*(backend.prepare_prompt(prompt, enhance) for backend in enhancing))
+        return prompt
+
+    def model_for(self, enhance=None):
+        # Изображение может сгенерировать любой из провайдеров
+        return ','.join(backend.model_for(enhance) or backend.name for backend in self.backends)
+
+    async def _call(self, index: int, prompt, size, quality, n, seed, enhance, progress) -> List[bytes]:
+        backend, health = self.backends[index], self.health[index]
+        health.started()
+        started_at = time.monotonic()
+        try:
+            # Промпт улучшает выбранный провайдер (если умеет): время улучшения входит в его задержку
+            result = await backend.prepare_and_generate(prompt, size, quality, n, seed, enhance, progress)
+        except asyncio.CancelledError:
+            health.cancelled(time.monotonic() - started_at)
+            raise
+        except Exception:
+            health.failed()
+            raise
+        health.succeeded(time.monotonic() - started_at)
+        return result
+
+    async def generate(self, prompt, size="1024x1024", quality="standard", n=1, seed=None, progress=None):
+        # Промпт уже подготовлен - провайдеры используют его как есть
+        return await self.prepare_and_generate(prompt, size, quality, n, seed, False, progress)
+
+    async def prepare_and_generate(self, prompt, size="1024x1024", quality="standard", n=1, seed=None,
+                                   enhance=None, progress=None):
+        candidates = self._ranked()
+        if not candidates:
+            raise Exception("All image providers are unavailable (circuit open)")
+
+        pending = {}
+        errors = []
+
+        def launch():
+            index = candidates.pop(0)
+            # Цепь могла разомкнуться, пока ждали первый запрос
+            if not self.health[index].available():
+                return
+            task = asyncio.ensure_future(self._call(index, prompt, size, quality, n, seed, enhance, progress))
+            pending[task] = index
+
+        launch()
+        try:
+            while pending:
+                # Дублирующий запрос - только один и только если есть куда его отправить
+                hedge = self.hedge_delay if candidates and len(pending) == 1 else None
+                done, _ = await asyncio.wait(pending, timeout=hedge, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+                for task in done:
+                    index = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(f"{self.backends[index].name}: {task.exception()}")
+                # Все запущенные запросы завершились ошибкой - переходим к следующему провайдеру
+                while not pending and candidates:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise Exception(f"All image providers failed: {'; '.join(errors) or 'circuit open'}")
+
+    def stats(self):
+        return {
+            'provider': self.name,
+            'hedge_delay': self.hedge_delay,
+            'backends': [
+                {**backend.stats(), **health.stats()}
+                for backend, health in zip(self.backends, self.health)
+            ]
+        }
+
+PROVIDERS = {
+    'webui': WebUIProvider,
+    'dalle': DalleProvider,
+    'gpt4o': GPT4oProvider
+}
+
+def create_provider(provider: str, config: Dict[str, Any]) -> ImageProvider:
+    """
+    Создает провайдер по имени и секции image_generation конфигурации
+
+    Неизвестное имя означает WEBUI (Stable Diffusion), как и раньше.
+    Для router создаются все провайдеры из router.providers.
+    """
+    if provider == RouterProvider.name:
+        router_config = config.get('router', {})
+        names = router_config.get('providers', ['webui'])
+        if RouterProvider.name in names:
+            raise ValueError("Router cannot contain itself")
+        return RouterProvider(router_config, [create_provider(name, config) for name in names])
+
+    provider_class = PROVIDERS.get(provider, WebUIProvider)
+    provider_config = config.get(provider_class.name, {})
+    kwargs = {'timeout': provider_config.get('timeout', config.get('timeout', 120))}
+    if provider_config.get('max_concurrent') is not None:
+        kwargs['max_concurrent'] = provider_config['max_concurrent']
+    return provider_class(provider_config, **kwargs)
@@ -1,26 +1,15 @@
-from openai import OpenAI
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, FIRST_COMPLETED, wait
+from dataclasses import dataclass, replace
+from typing import Optional, Dict, Any, Iterable, Iterator
+from openai import OpenAI, APITimeoutError
 
-class TextGenerator:
-    def __init__(self, api_key, base_url):
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
-        self.tone = None
-        self.topic = None
-    
-    def set_tone(self, tone):
-        self.tone = tone
-    
-    def set_topic(self, topic):
-        self.topic = topic
-
-    def generate_post(self):
-        if not self.tone or not self.topic:
-            raise ValueError("Tone and topic must be set before generating post")
-            
-        response = self.client.chat.completions.create(
-          model="deepseek-chat",
-          #response_format={"type": "json_object"},
-          messages=[
-            {"role": "system", "content": """
+POST_SYSTEM_PROMPT = """
 Ты высококвалифицированный SMM специалист, который будет помогать в генерации текста для постов с заданной тебе тематикой и заданным тоном.
 Посты предназначены для соцсетей сообщества коллекционеров уникальных проб воздуха из экзотических локаций.
 Пробирки для проб воздуха и прочные кейсы для них продает компания AirSellers.
@@ -31,21 +20,470 @@ class TextGenerator:
 Предполагается, что в этих соцсетях пользователи делятся своими впечатлениями от посещения экзотических локаций и описывают свои эмоции, которые они испытали, а также опытом применения сервиса AirSellers для иных целей, кроме как для коллекционирования пробирок. Здесь же пользователи могут высказывать свои пожелания по улучшению сервиса и предложения по новым функциям.
 Генерируемый текст не должен содержать явной рекламы продукции компании AirSellers, но иногда можно упоминать ее в тексте, как нечто второстепенное, привычное и само собой подразумеваемое, возможно применение какого-то специфического жаргона пользователей этого сервиса.
 """
-            },
-             {"role": "user", "content": f"Сгенерируй пост, используя тон: {self.tone}, для соцсетей с темой {self.topic}"}
-            ]
-          )
-        return response.choices[0].message.content
-
-    def generate_post_image_description(self):
-        if not self.topic:
-            raise ValueError("Topic must be set before generating image description")
-            
-        response = self.client.chat.completions.create(
-          model="deepseek-chat",
-          messages=[
-            {"role": "system", "content": "Ты ассистент, который составит промпт для нейросети, которая будет генерировать изображения. Ты должен составлять промпт на заданную тематику на английском языке."},
-            {"role": "user", "content": f"Сгенерируй пормпт на английском языке для генерации изображения для соцсетей с темой {self.topic}."}
-          ]
+
+IMAGE_DESCRIPTION_SYSTEM_PROMPT = "Ты ассистент, который составит промпт для нейросети, которая будет генерировать изображения. Ты должен составлять промпт на заданную тематику на английском языке."
+
+@dataclass(frozen=True)
+class PostRequest:
+    """
+    Параметры генерации одного поста
+    
+    Объект неизменяемый, поэтому его можно безопасно передавать между потоками.
+    
+    Args:
+        topic: Тема поста
+        tone: Тон сообщения
+        use_cache: Брать ответ из кэша, если он есть (False - получить новый вариант)
+    """
+    topic: str
+    tone: str = ''
+    use_cache: bool = True
+
+def make_cache_key(model: str, messages, params: Dict[str, Any]) -> str:
+    """
+    Вычисляет ключ кэша по содержимому запроса к модели
+    
+    Args:
+        model: Имя модели
+        messages: Системный и пользовательский промпты
+        params: Параметры сэмплирования (temperature и т.п.)
+        
+    Returns:
+        SHA-256 от канонического JSON-представления запроса
+    """
+    payload = json.dumps(
+        {'model': model, 'messages': messages, 'params': params},
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Базовый класс кэша ответов модели со счетчиками попаданий"""
+    
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = 86400):
+        """
+        Args:
+            max_entries: Максимальное число записей (лишние вытесняются по LRU)
+            ttl: Время жизни записи в секундах (None - без ограничения)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl is not None and time.time() - created_at > self.ttl
+    
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+    
+    def set(self, key: str, value: str):
+        self._set(key, value)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'backend': self.backend,
+            'entries': len(self),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0
+        }
+
+class MemoryResponseCache(ResponseCache):
+    """Кэш ответов в памяти процесса"""
+    
+    backend = 'memory'
+    
+    def __init__(self, max_entries: int = 1000, ttl: Optional[float] = 86400):
+        super().__init__(max_entries, ttl)
+        self._entries = OrderedDict()
+    
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if self._is_expired(created_at):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def _set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+class SQLiteResponseCache(ResponseCache):
+    """Кэш ответов в файле SQLite, переживает перезапуск приложения"""
+    
+    backend = 'sqlite'
+    
+    def __init__(self, path: str, max_entries: int = 10000, ttl: Optional[float] = 86400):
+        super().__init__(max_entries, ttl)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS ix_response_cache_accessed_at '
+                'ON response_cache (accessed_at)'
+            )
+    
+    def _get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM response_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self._is_expired(created_at):
+                self._conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                return None
+            self._conn.execute(
+                'UPDATE response_cache SET accessed_at = ? WHERE key = ?', (time.time(), key)
+            )
+            return value
+    
+    def _set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?)', (key, value, now, now)
+            )
+            if self.ttl is not None:
+                self._conn.execute(
+                    'DELETE FROM response_cache WHERE created_at < ?', (now - self.ttl,)
+                )
+            # Вытесняем давно не использованные записи сверх лимита
+            self._conn.execute(
+                'DELETE FROM response_cache WHERE key IN ('
+                'SELECT key FROM response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+    
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
+
+class ProviderLimiter:
+    """
+    Ограничение нагрузки на API провайдера
+    
+    Общий для всех потоков процесса: ограничивает число одновременных
+    запросов и, если задано, их частоту (равномерно распределяя старты).
+    """
+    
+    def __init__(self, max_concurrent: int = 8, requests_per_minute: Optional[float] = None):
+        """
+        Args:
+            max_concurrent: Максимум одновременных запросов к провайдеру
+            requests_per_minute: Максимум запросов в минуту (None - без ограничения)
+        """
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+    
+    def __enter__(self):
+        self._slots.acquire()
+        if self._interval:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + self._interval
+            if start > now:
+                time.sleep(start - now)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._slots.release()
+        return False
+
+def create_response_cache(config: Optional[Dict[str, Any]]) -> Optional[ResponseCache]:
+    """
+    Создает кэш ответов по секции text_generation.cache конфигурации
+    
+    Args:
+        config: Настройки кэша (backend, max_entries, ttl, path)
+        
+    Returns:
+        Экземпляр кэша или None, если кэш не настроен
+    """
+    if not config or not config.get('enabled', True):
+        return None
+    
+    backend = config.get('backend', 'memory')
+    ttl = config.get('ttl', 86400)
+    if backend == 'sqlite':
+        return SQLiteResponseCache(
+            path=config.get('path', 'instance/text_cache.db'),
+            max_entries=config.get('max_entries', 10000),
+            ttl=ttl
         )
-        return response.choices[0].message.content
\ No newline at end of file
+    return MemoryResponseCache(max_entries=config.get('max_entries', 1000), ttl=ttl)
+
+class TextGenerator:
+    def __init__(self, api_key, base_url, timeout=60, max_workers=8,
+                 model="deepseek-chat", cache: Optional[ResponseCache] = None,
+                 limiter: Optional[ProviderLimiter] = None, batch_workers: int = 4):
+        """
+        Инициализация генератора текста
+        
+        Генератор не хранит состояния конкретного запроса: тема и тон
+        передаются в каждый вызов через PostRequest, поэтому один экземпляр
+        может одновременно обслуживать много потоков.
+        
+        Args:
+            api_key: Ключ API DeepSeek
+            base_url: Адрес OpenAI-совместимого API
+            timeout: Таймаут одного запроса к модели в секундах
+            max_workers: Размер пула потоков для параллельных запросов
+            model: Имя модели
+            cache: Кэш ответов модели (опционально)
+            limiter: Ограничение нагрузки на провайдера (по умолчанию max_workers одновременных запросов)
+            batch_workers: Размер отдельного пула для пакетной генерации
+        """
+        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.timeout = timeout
+        self.model = model
+        self.cache = cache
+        self.limiter = limiter or ProviderLimiter(max_concurrent=max_workers)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='text_gen')
+        # Пакеты выполняются в своем пуле, чтобы не занимать очередь интерактивных запросов
+        self.batch_workers = batch_workers
+        self.batch_executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix='text_gen_batch')
+    
+    def _cache_lookup(self, messages, use_cache, params):
+        """
+        Ищет ответ в кэше
+        
+        Returns:
+            Кортеж (ключ кэша или None, сохраненный ответ или None)
+        """
+        if self.cache is None:
+            return None, None
+        key = make_cache_key(self.model, messages, params)
+        if not use_cache:
+            return key, None
+        return key, self.cache.get(key)
+    
+    def _complete(self, messages, use_cache=True, **params):
+        """
+        Выполняет запрос к модели и возвращает текст ответа
+        
+        Если настроен кэш, одинаковые запросы (модель, промпты и параметры
+        сэмплирования) обслуживаются из него. При use_cache=False кэш не
+        читается, а полученный новый вариант заменяет сохраненный.
+        """
+        key, cached = self._cache_lookup(messages, use_cache, params)
+        if cached is not None:
+            return cached
+        
+        with self.limiter:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                timeout=self.timeout,
+                **params
+            )
+        content = response.choices[0].message.content
+        
+        if key is not None:
+            self.cache.set(key, content)
+        return content
+    
+    def _stream(self, messages, use_cache=True, **params):
+        """
+        Потоковый вариант _complete: отдает текст по мере генерации
+        
+        Закрытие генератора (например, при отключении клиента) закрывает
+        соединение с моделью, и оставшиеся токены не генерируются. В кэш
+        попадает только полностью полученный ответ.
+        """
+        key, cached = self._cache_lookup(messages, use_cache, params)
+        if cached is not None:
+            yield cached
+            return
+        
+        parts = []
+        with self.limiter, self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            timeout=self.timeout,
+            stream=True,
+            **params
+        ) as stream:
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        
+        if key is not None:
+            self.cache.set(key, ''.join(parts))
+    
+    def _post_messages(self, request):
+        return [
+            {"role": "system", "content": POST_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Сгенерируй пост, используя тон: {request.tone}, для соцсетей с темой {request.topic}"}
+        ]
+    
+    def _image_description_messages(self, request):
+        return [
+            {"role": "system", "content": IMAGE_DESCRIPTION_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Сгенерируй пормпт на английском языке для генерации изображения для соцсетей с темой {request.topic}."}
+        ]
+
+    def generate_post(self, request: PostRequest):
+        if not request.tone or not request.topic:
+            raise ValueError("Tone and topic are required to generate post")
+        
+        return self._complete(self._post_messages(request), use_cache=request.use_cache)
+
+    def stream_post(self, request: PostRequest):
+        """
+        Генерирует текст поста потоково
+        
+        Args:
+            request: Параметры генерации
+            
+        Yields:
+            Фрагменты текста поста по мере их получения от модели
+        """
+        if not request.tone or not request.topic:
+            raise ValueError("Tone and topic are required to generate post")
+        
+        yield from self._stream(self._post_messages(request), use_cache=request.use_cache)
+
+    def generate_post_image_description(self, request: PostRequest):
+        if not request.topic:
+            raise ValueError("Topic is required to generate image description")
+        
+        return self._complete(self._image_description_messages(request), use_cache=request.use_cache)
+    
+    def generate_post_with_image_description(self, request: PostRequest):
+        """
+        Генерирует текст поста и промпт для изображения параллельно
+        
+        Оба запроса к модели выполняются одновременно в пуле потоков,
+        поэтому общее время ответа равно времени самого долгого из них.
+        
+        Args:
+            request: Параметры генерации
+        
+        Returns:
+            Кортеж (текст поста, промпт для изображения)
+            
+        Raises:
+            TimeoutError: если модель не ответила за self.timeout секунд
+        """
+        post_future = self.executor.submit(self.generate_post, request)
+        image_future = self.executor.submit(self.generate_post_image_description, request)
+        
+        # Общий срок на оба ответа: второе ожидание получает только оставшееся время
+        deadline = time.monotonic() + self.timeout
+        try:
+            message = post_future.result(timeout=self.timeout)
+            image_description = image_future.result(timeout=max(deadline - time.monotonic(), 0))
+        except (FutureTimeoutError, APITimeoutError):
+            # APITimeoutError - таймаут самого клиента OpenAI внутри запроса
+            post_future.cancel()
+            image_future.cancel()
+            raise TimeoutError(f"Модель не ответила за {self.timeout} с")
+        
+        return message, image_description
+    
+    def _generate_batch_item(self, request: PostRequest, include_image_description: bool) -> Dict[str, Any]:
+        result = {
+            'topic': request.topic,
+            'tone': request.tone,
+            'message': self.generate_post(request)
+        }
+        if include_image_description:
+            result['image_description'] = self.generate_post_image_description(request)
+        return result
+    
+    def generate_batch(self, requests: Iterable[PostRequest],
+                       include_image_description: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Генерирует пакет постов с ограниченным параллелизмом
+        
+        Запросы выполняются в отдельном пуле batch_executor, а в пул
+        одновременно передается не больше batch_workers элементов, поэтому
+        пакет не задерживает интерактивные запросы в self.executor.
+        Нагрузку на провайдера ограничивает self.limiter. Ошибка одного
+        элемента не прерывает остальные.
+        
+        Args:
+            requests: Параметры генерации для каждого поста
+            include_image_description: Генерировать также промпт для изображения
+            
+        Yields:
+            Результаты в порядке завершения: словари с index (позиция во входном
+            списке), success и message/image_description либо error
+        """
+        items = enumerate(requests)
+        pending = {}
+        
+        try:
+            while True:
+                # Окно из batch_workers запросов: следующий элемент ставится, когда завершился предыдущий
+                for index, request in items:
+                    pending[self.batch_executor.submit(self._generate_batch_item, request, include_image_description)] = index
+                    if len(pending) >= self.batch_workers:
+                        break
+                if not pending:
+                    break
+                
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        yield {'index': index, 'success': True, **future.result()}
+                    except Exception as e:
+                        yield {'index': index, 'success': False, 'error': str(e)}
+        finally:
+            # Если потребитель прекратил чтение, не запускаем оставшиеся запросы
+            for future in pending:
+                future.cancel()
+    
+    @staticmethod
+    def variants(request: PostRequest, count: int):
+        """
+        Размножает запрос на count вариантов одного поста
+        
+        Варианты запрашиваются в обход кэша, иначе все они совпали бы.
+        """
+        return [replace(request, use_cache=False) for _ in range(count)]
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Возвращает счетчики кэша ответов"""
+        if self.cache is None:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.stats()}
@@ -1,19 +1,418 @@
+import io
+import os
 import requests
 import json
-from typing import Optional, Dict, Any
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Union, BinaryIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from generators import vk_rate_limiter, image_prep
+
+API_VERSION = '5.131'
+
+# Максимум вызовов API в одном запросе execute (ограничение VK)
+EXECUTE_MAX_CALLS = 25
+
+# Максимум постов в одном вызове wall.getById
+WALL_GET_BY_ID_MAX_POSTS = 100
+
+# Методы, которые что-то создают: повтор после внутренней ошибки VK может задублировать результат
+WRITE_METHODS = frozenset(['wall.post', 'photos.save'])
+
+def _error_code(response: requests.Response) -> Optional[int]:
+    """Код ошибки API VK из ответа (None, если ошибки нет)"""
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    if isinstance(data, dict) and isinstance(data.get('error'), dict):
+        return data['error'].get('error_code')
+    return None
+
+class VKAPIError(Exception):
+    """Ошибка, возвращенная API VK"""
+    
+    def __init__(self, code: Optional[int], message: str):
+        self.code = code
+        self.message = message
+        super().__init__(f"VK API Error: {message}")
+
+# Настройки общей HTTP-сессии VK (меняются через configure_session)
+_session_settings = {
+    'api_url': 'https://api.vk.com/method',
+    'pool_size': 10,
+    'retries': 3,
+    'timeout': (5, 30),
+    'upload_timeout': (5, 120),
+    'max_photo_size': 50 * 1024 * 1024
+}
+_session = None
+_session_lock = threading.Lock()
+
+def _as_timeout(value):
+    """Приводит таймаут из конфигурации (число или [connect, read]) к виду requests"""
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return value
+
+def configure_session(pool_size: Optional[int] = None, retries: Optional[int] = None,
+                      timeout=None, upload_timeout=None, api_url: Optional[str] = None,
+                      max_photo_size: Optional[int] = None):
+    """
+    Настраивает общую для процесса HTTP-сессию VK
+    
+    Вызывается один раз при старте приложения. Уже созданная сессия
+    пересоздается при следующем обращении.
+    
+    Args:
+        pool_size: Размер пула keep-alive соединений на хост
+        retries: Число повторов при ошибках соединения и ответах 502/503/504
+        timeout: Таймаут запросов к API (секунды или [connect, read])
+        upload_timeout: Таймаут загрузки файлов на сервер VK
+        api_url: Адрес API (например, локальный тестовый сервер)
+        max_photo_size: Максимальный размер загружаемого фото в байтах
+    """
+    global _session
+    with _session_lock:
+        if api_url is not None:
+            _session_settings['api_url'] = api_url
+        if pool_size is not None:
+            _session_settings['pool_size'] = pool_size
+        if retries is not None:
+            _session_settings['retries'] = retries
+        if timeout is not None:
+            _session_settings['timeout'] = _as_timeout(timeout)
+        if upload_timeout is not None:
+            _session_settings['upload_timeout'] = _as_timeout(upload_timeout)
+        if max_photo_size is not None:
+            _session_settings['max_photo_size'] = max_photo_size
+        if _session is not None:
+            _session.close()
+        _session = None
+
+def get_session() -> requests.Session:
+    """
+    Возвращает общую HTTP-сессию VK с пулом соединений
+    
+    Все экземпляры VKPublisher используют одну сессию, поэтому TCP/TLS
+    соединения с api.vk.com и серверами загрузки переиспользуются между
+    запросами и экземплярами.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retries = _session_settings['retries']
+            # Повторяем только то, что безопасно: ошибки соединения (запрос не ушел,
+            # для любого метода) и ответы шлюза на GET. 502/503/504 на POST мог прийти
+            # после того, как VK уже выполнил wall.post или execute, как и таймаут
+            # чтения, - повтор задублировал бы пост.
+            retry = Retry(
+                total=retries,
+                connect=retries,
+                read=0,
+                status=retries,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(['GET']),
+                backoff_factor=0.5
+            )
+            adapter = HTTPAdapter(
+                pool_connections=_session_settings['pool_size'],
+                pool_maxsize=_session_settings['pool_size'],
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+# Фото для загрузки: путь к файлу, содержимое или файловый объект (например, поток загрузки Flask)
+PhotoSource = Union[str, bytes, BinaryIO]
+
+class PhotoTooLargeError(Exception):
+    """Фото превышает допустимый размер загрузки"""
+
+def _check_photo_size(size: int):
+    max_size = _session_settings['max_photo_size']
+    if size > max_size:
+        raise PhotoTooLargeError(
+            f"Размер фото {size / 1048576:.1f} МБ превышает допустимые {max_size / 1048576:.0f} МБ"
+        )
+
+def _read_photo(photo: BinaryIO) -> bytes:
+    """Читает файловый объект целиком, не более допустимого размера фото"""
+    stream = getattr(photo, 'stream', photo)
+    data = stream.read(_session_settings['max_photo_size'] + 1)
+    _check_photo_size(len(data))
+    return data
+
+def _prepare_photo(photo: PhotoSource) -> PhotoSource:
+    """
+    Сжимает фото перед загрузкой (см. image_prep.prepare_for_upload)
+    
+    Файловый объект при этом читается целиком: для декодирования
+    изображение все равно нужно полностью.
+    """
+    if not image_prep.is_enabled():
+        return photo
+    if isinstance(photo, str):
+        _check_photo_size(os.path.getsize(photo))
+    elif isinstance(photo, (bytes, bytearray, memoryview)):
+        photo = bytes(photo)
+        _check_photo_size(len(photo))
+    else:
+        photo = _read_photo(photo)
+    return image_prep.prepare_for_upload(photo)
+
+@contextmanager
+def _photo_stream(photo: PhotoSource):
+    """
+    Открывает источник фото для чтения
+    
+    Yields:
+        (поток, размер в байтах, имя файла); файл по пути закрывается при выходе
+    """
+    if isinstance(photo, str):
+        with open(photo, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            _check_photo_size(size)
+            yield f, size, os.path.basename(photo)
+        return
+    
+    if isinstance(photo, (bytes, bytearray, memoryview)):
+        _check_photo_size(len(photo))
+        yield io.BytesIO(photo), len(photo), 'photo.jpg'
+        return
+    
+    # FileStorage Flask хранит имя файла в filename, а поток - в stream
+    name = getattr(photo, 'filename', None) or getattr(photo, 'name', None)
+    filename = os.path.basename(name) if isinstance(name, str) and name else 'photo.jpg'
+    stream = getattr(photo, 'stream', photo)
+    
+    if stream.seekable():
+        start = stream.tell()
+        size = stream.seek(0, io.SEEK_END) - start
+        stream.seek(start)
+        _check_photo_size(size)
+        yield stream, size, filename
+    else:
+        data = _read_photo(stream)
+        yield io.BytesIO(data), len(data), filename
+
+class _MultipartBody:
+    """
+    Тело multipart/form-data с одним файлом, читаемое по частям
+    
+    requests отправляет такое тело блоками через read() с заранее
+    известным Content-Length. seek()/tell() позволяют urllib3 перемотать
+    тело при повторе запроса.
+    """
+    
+    def __init__(self, stream: BinaryIO, size: int, filename: str, field: str = 'photo'):
+        boundary = uuid.uuid4().hex
+        filename = filename.replace('"', '').replace('\r', '').replace('\n', '')
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self._stream = stream
+        self._start = stream.tell()
+        self._size = size
+        self._pos = 0
+        self.len = len(self._head) + size + len(self._tail)
+    
+    def __len__(self):
+        return self.len
+    
+    def tell(self) -> int:
+        return self._pos
+    
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self.len
+        self._pos = min(max(offset, 0), self.len)
+        file_pos = min(max(self._pos - len(self._head), 0), self._size)
+        self._stream.seek(self._start + file_pos)
+        return self._pos
+    
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.len - self._pos
+        
+        head_end = len(self._head)
+        file_end = head_end + self._size
+        chunks = []
+        while size > 0 and self._pos < self.len:
+            if self._pos < head_end:
+                chunk = self._head[self._pos:self._pos + size]
+            elif self._pos < file_end:
+                chunk = self._stream.read(min(size, file_end - self._pos))
+                if not chunk:
+                    raise IOError("Поток фото закончился раньше заявленного размера")
+            else:
+                offset = self._pos - file_end
+                chunk = self._tail[offset:offset + size]
+            self._pos += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+class ExecuteBatch:
+    """
+    Пакет вызовов API VK, выполняемых через метод execute
+    
+    Вызовы накапливаются через add() и отправляются по EXECUTE_MAX_CALLS
+    за один HTTP-запрос, что сокращает число обращений к API (и расход
+    лимита запросов) до 25 раз.
+    
+    Пример:
+        batch = ExecuteBatch(publisher)
+        batch.add('wall.getById', {'posts': '-1_10'})
+        batch.add('stats.get', {'group_id': 1})
+        posts, stats = batch.execute()
+    """
+    
+    def __init__(self, publisher: 'VKPublisher'):
+        self.publisher = publisher
+        self._calls = []
+    
+    def add(self, method: str, params: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Добавляет вызов в пакет
+        
+        Returns:
+            Позиция результата вызова в списке, возвращаемом execute()
+        """
+        self._calls.append((method, params or {}))
+        return len(self._calls) - 1
+    
+    def __len__(self):
+        return len(self._calls)
+    
+    def execute(self) -> List[Any]:
+        """
+        Выполняет накопленные вызовы
+        
+        Returns:
+            Результаты в порядке добавления. Для неудавшегося вызова вместо
+            результата возвращается экземпляр VKAPIError - ошибка одного
+            вызова не прерывает остальные.
+        """
+        calls, self._calls = self._calls, []
+        results = []
+        for start in range(0, len(calls), EXECUTE_MAX_CALLS):
+            chunk = calls[start:start + EXECUTE_MAX_CALLS]
+            code = 'return [' + ','.join(
+                f'API.{method}({json.dumps(params, ensure_ascii=False)})' for method, params in chunk
+            ) + '];'
+            write = any(method in WRITE_METHODS for method, _ in chunk)
+            data = self.publisher._request('execute', {'code': code}, http_method='POST', write=write)
+            
+            # Неудавшиеся вызовы возвращаются как false, а их ошибки - в execute_errors по порядку
+            errors = iter(data.get('execute_errors', []))
+            for value in data['response']:
+                if value is False:
+                    error = next(errors, {})
+                    results.append(VKAPIError(error.get('error_code'), error.get('error_msg', 'Ошибка вызова в execute')))
+                else:
+                    results.append(value)
+        return results
 
 class VKPublisher:
-    def __init__(self, access_token: str, group_id: Optional[str] = None):
+    def __init__(self, access_token: str, group_id: Optional[str] = None, base_url: Optional[str] = None):
         """
         Инициализация VK Publisher
         
         Args:
             access_token: Токен доступа VK
             group_id: ID группы для публикации (опционально)
+            base_url: Адрес API (по умолчанию из configure_session)
         """
         self.access_token = access_token
         self.group_id = group_id
-        self.base_url = "https://api.vk.com/method"
+        self.base_url = base_url or _session_settings['api_url']
+        self.session = get_session()
+        self.timeout = _session_settings['timeout']
+        self.upload_timeout = _session_settings['upload_timeout']
+    
+    def _send(self, http_method: str, url: str, write: bool = False, **kwargs) -> requests.Response:
+        """
+        Отправляет HTTP-запрос к API VK с учетом лимита частоты запросов
+        
+        Перед каждой попыткой ожидает свободный слот в общем для процесса
+        token bucket токена доступа. Ответы с ошибками 6/9/10 повторяются
+        с экспоненциальным откатом и джиттером; для записи (write) - только
+        6/9, с которыми VK отклоняет запрос до выполнения.
+        
+        Returns:
+            Ответ последней попытки
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        bucket = vk_rate_limiter.get_bucket(self.access_token)
+        max_retries = vk_rate_limiter.max_retries()
+        retryable = vk_rate_limiter.REJECTED_ERROR_CODES if write else vk_rate_limiter.RETRYABLE_ERROR_CODES
+        
+        for attempt in range(max_retries + 1):
+            bucket.acquire()
+            response = self.session.request(http_method, url, **kwargs)
+            if attempt == max_retries or _error_code(response) not in retryable:
+                return response
+            bucket.record_retry()
+            time.sleep(vk_rate_limiter.backoff_delay(attempt))
+        return response
+    
+    def _request(self, method: str, params: Optional[Dict[str, Any]] = None,
+                 http_method: str = 'GET', write: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Выполняет вызов метода API VK
+        
+        Args:
+            method: Имя метода (например, wall.post)
+            params: Параметры вызова (токен и версия добавляются автоматически)
+            http_method: GET или POST (для длинных параметров, например кода execute)
+            write: Вызов что-то создает (по умолчанию - метод из WRITE_METHODS);
+                   такой вызов не повторяется после внутренней ошибки VK
+            
+        Returns:
+            Полный JSON-ответ API
+            
+        Raises:
+            VKAPIError: если API вернуло ошибку
+        """
+        url = f"{self.base_url}/{method}"
+        request_params = {'access_token': self.access_token, 'v': API_VERSION}
+        request_params.update(params or {})
+        if write is None:
+            write = method in WRITE_METHODS
+        
+        if http_method == 'POST':
+            response = self._send('POST', url, write=write, data=request_params)
+        else:
+            response = self._send('GET', url, write=write, params=request_params)
+        response.raise_for_status()
+        
+        data = response.json()
+        if 'error' in data:
+            raise VKAPIError(data['error'].get('error_code'), data['error'].get('error_msg', ''))
+        return data
+    
+    def _call_api(self, method: str, params: Optional[Dict[str, Any]] = None,
+                  http_method: str = 'GET') -> Any:
+        """Выполняет вызов метода API VK и возвращает поле response"""
+        return self._request(method, params, http_method)['response']
+    
+    def execute_batch(self) -> ExecuteBatch:
+        """Создает пакет вызовов, выполняемых через execute"""
+        return ExecuteBatch(self)
     
     def check_token(self) -> Dict[str, Any]:
         """
@@ -29,7 +428,7 @@ class VKPublisher:
         }
         
         try:
-            response = requests.get(url, params=params)
+            response = self._send('GET', url, params=params)
             
             if response.status_code != 200:
                 return {
@@ -83,7 +482,7 @@ class VKPublisher:
         }
         
         try:
-            response = requests.get(url, params=params)
+            response = self._send('GET', url, params=params)
             data = response.json()
             
             if 'error' in data:
@@ -93,51 +492,150 @@ class VKPublisher:
         except Exception as e:
             raise Exception(f"Ошибка получения групп: {str(e)}")
     
-    def upload_photo(self, photo_path: str, group_id: Optional[str] = None) -> str:
+    def upload_photo(self, photo: PhotoSource, group_id: Optional[str] = None) -> str:
         """
         Загрузить фото на сервер VK
         
         Args:
-            photo_path: Путь к файлу фото
+            photo: Фото - путь к файлу, bytes или файловый объект
             group_id: ID группы (если публикуем в группу)
             
         Returns:
             Строка с данными фото для публикации
         """
+        upload_data = self._upload_to_server(photo, group_id)
+        
+        # Сохраняем фото
+        save_url = f"{self.base_url}/photos.save"
+        save_params = {
+            'access_token': self.access_token,
+            'v': '5.131',
+            **self._photo_save_params(upload_data, group_id)
+        }
+            
+        save_response = self._send('GET', save_url, write=True, params=save_params)
+        save_data = save_response.json()
+        
+        if 'error' in save_data:
+            raise Exception(f"Ошибка сохранения фото: {save_data['error']['error_msg']}")
+        
+        photo = save_data['response'][0]
+        return f"photo{photo['owner_id']}_{photo['id']}"
+    
+    def _upload_to_server(self, photo: PhotoSource, group_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Загрузить файл фото на сервер загрузки VK
+        
+        Returns:
+            Ответ сервера загрузки (photo, server, hash) для photos.save
+        """
+        photo = _prepare_photo(photo)
+        
         # Получаем адрес сервера для загрузки
         upload_url = self._get_upload_server(group_id)
+        return self._upload_file(upload_url, photo)
+    
+    def _upload_file(self, upload_url: str, photo: PhotoSource) -> Dict[str, Any]:
+        """
+        Отправить фото на полученный адрес сервера загрузки
         
-        # Загружаем файл
-        with open(photo_path, 'rb') as f:
-            files = {'photo': f}
-            response = requests.post(upload_url, files=files)
+        Тело multipart читается из источника по частям, без промежуточного
+        файла и без копии всего изображения в памяти.
+        """
+        with _photo_stream(photo) as (stream, size, filename):
+            body = _MultipartBody(stream, size, filename)
+            response = self.session.post(
+                upload_url,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=self.upload_timeout
+            )
             
         upload_data = response.json()
         
         if 'error' in upload_data:
             raise Exception(f"Ошибка загрузки фото: {upload_data['error']['error_msg']}")
         
-        # Сохраняем фото
-        save_url = f"{self.base_url}/photos.save"
-        save_params = {
-            'access_token': self.access_token,
+        return upload_data
+    
+    def _photo_save_params(self, upload_data: Dict[str, Any], group_id: Optional[str] = None) -> Dict[str, Any]:
+        params = {
             'photo': upload_data['photo'],
             'server': upload_data['server'],
-            'hash': upload_data['hash'],
-            'v': '5.131'
+            'hash': upload_data['hash']
         }
-        
         if group_id:
-            save_params['group_id'] = group_id
+            params['group_id'] = group_id
+        return params
+    
+    def _save_photo_and_post(self, upload_data: Dict[str, Any], group_id: Optional[str],
+                             post_params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Сохранить загруженное фото и опубликовать с ним пост одним запросом execute
+        
+        Вместо двух последовательных вызовов photos.save и wall.post выполняется
+        один скрипт VKScript, который передает сохраненное фото в wall.post.
+        
+        Args:
+            upload_data: Ответ сервера загрузки
+            group_id: ID группы
+            post_params: Параметры wall.post (без токена и версии)
             
-        save_response = requests.get(save_url, params=save_params)
-        save_data = save_response.json()
+        Returns:
+            Ответ wall.post (содержит post_id)
+        """
+        save_params = json.dumps(self._photo_save_params(upload_data, group_id), ensure_ascii=False)
+        post_params = json.dumps(post_params, ensure_ascii=False)
+        # Добавляем вложение к объекту параметров wall.post выражением VKScript
+        attachment = '"attachments": "photo" + photo.owner_id + "_" + photo.id'
+        post_object = '{' + attachment + '}' if post_params == '{}' else post_params[:-1] + ', ' + attachment + '}'
         
-        if 'error' in save_data:
-            raise Exception(f"Ошибка сохранения фото: {save_data['error']['error_msg']}")
+        code = (
+            f'var photo = API.photos.save({save_params})[0];'
+            f'return API.wall.post({post_object});'
+        )
+        data = self._request('execute', {'code': code}, http_method='POST', write=True)
         
-        photo = save_data['response'][0]
-        return f"photo{photo['owner_id']}_{photo['id']}"
+        errors = data.get('execute_errors')
+        if errors:
+            raise VKAPIError(errors[0].get('error_code'), errors[0].get('error_msg', ''))
+        return data['response']
+    
+    def _publish_with_photo(self, params: Dict[str, Any], photo: PhotoSource,
+                            group_id: Optional[str], success_message: str,
+                            error_label: str) -> Dict[str, Any]:
+        """
+        Публикация поста с фото: загрузка файла и один запрос execute
+        
+        Итого 3 запроса к VK вместо 4 (getUploadServer, загрузка, execute).
+        """
+        try:
+            upload_data = self._upload_to_server(photo, group_id)
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Ошибка загрузки фото: {str(e)}'
+            }
+        
+        post_params = {k: v for k, v in params.items() if k not in ('access_token', 'v')}
+        
+        try:
+            post = self._save_photo_and_post(upload_data, group_id, post_params)
+            return {
+                'success': True,
+                'post_id': post['post_id'],
+                'message': success_message
+            }
+        except requests.exceptions.RequestException as e:
+            return {
+                'success': False,
+                'error': f'Ошибка сети: {str(e)}'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'{error_label}: {str(e)}'
+            }
     
     def _get_upload_server(self, group_id: Optional[str] = None) -> str:
         """
@@ -158,7 +656,7 @@ class VKPublisher:
         if group_id:
             params['group_id'] = group_id
             
-        response = requests.get(url, params=params)
+        response = self._send('GET', url, params=params)
         data = response.json()
         
         if 'error' in data:
@@ -166,16 +664,21 @@ class VKPublisher:
             
         return data['response']['upload_url']
     
-    def publish_post(self, message: str, photo_path: Optional[str] = None, 
-                    group_id: Optional[str] = None, from_group: bool = True) -> Dict[str, Any]:
+    def publish_post(self, message: str, photo: Optional[PhotoSource] = None, 
+                    group_id: Optional[str] = None, from_group: bool = True,
+                    guid: Optional[str] = None, attachments: Optional[str] = None) -> Dict[str, Any]:
         """
         Опубликовать пост в VK
         
         Args:
             message: Текст поста
-            photo_path: Путь к файлу фото (опционально)
+            photo: Фото - путь к файлу, bytes или файловый объект (опционально)
             group_id: ID группы для публикации
             from_group: Публиковать от имени группы
+            guid: Уникальный идентификатор публикации - VK не публикует
+                  повторно пост с тем же guid (защита от дублей при повторах)
+            attachments: Уже загруженные вложения (например, photo-1_2) -
+                         пост публикуется одним wall.post без загрузки фото
             
         Returns:
             Словарь с результатом публикации
@@ -186,25 +689,26 @@ class VKPublisher:
             'message': message,
             'v': '5.131'
         }
+        if guid:
+            params['guid'] = guid
+        if attachments:
+            params['attachments'] = attachments
         
         if group_id:
             params['owner_id'] = f"-{group_id}"
             if from_group:
                 params['from_group'] = 1
         
-        # Добавляем фото если указано
-        if photo_path:
-            try:
-                photo_attachment = self.upload_photo(photo_path, group_id)
-                params['attachments'] = photo_attachment
-            except Exception as e:
-                return {
-                    'success': False,
-                    'error': f'Ошибка загрузки фото: {str(e)}'
-                }
+        # С фото: photos.save и wall.post выполняются одним запросом execute
+        if photo:
+            return self._publish_with_photo(
+                params, photo, group_id,
+                success_message='Пост успешно опубликован',
+                error_label='Ошибка публикации'
+            )
         
         try:
-            response = requests.get(url, params=params)
+            response = self._send('GET', url, write=True, params=params)
             
             # Проверяем статус ответа
             if response.status_code != 200:
@@ -245,7 +749,117 @@ class VKPublisher:
                 'error': f'Ошибка публикации: {str(e)}'
             }
     
-    def schedule_post(self, message: str, publish_date: int, photo_path: Optional[str] = None,
+    def publish_to_groups(self, message: str, group_ids: List[str], photo: Optional[PhotoSource] = None,
+                          from_group: bool = True, max_workers: int = 6,
+                          guid: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Опубликовать один пост в нескольких группах
+        
+        Вызовы API для всех групп объединяются через execute: адреса серверов
+        загрузки, photos.save и wall.post - по одному запросу на каждые
+        EXECUTE_MAX_CALLS групп. Фото загружается на сервер каждой группы
+        параллельно (не более max_workers загрузок одновременно), поэтому
+        общее время близко ко времени самой медленной загрузки.
+        
+        Args:
+            message: Текст поста
+            group_ids: ID групп
+            photo: Фото - путь к файлу, bytes или файловый объект (опционально)
+            from_group: Публиковать от имени группы
+            max_workers: Максимум одновременных загрузок фото
+            guid: Идентификатор публикации (для каждой группы добавляется ID группы)
+            
+        Returns:
+            Словарь с результатами по группам: {'success', 'results': {group_id: {...}}}
+        """
+        group_ids = list(dict.fromkeys(str(group_id) for group_id in group_ids))
+        results = {}
+        
+        try:
+            attachments = {}
+            if photo:
+                # Фото сжимается один раз для всех групп
+                photo = _prepare_photo(photo)
+                # Файловый объект нельзя читать из нескольких потоков - читаем один раз
+                if not isinstance(photo, (str, bytes)):
+                    photo = _read_photo(photo)
+                attachments = self._upload_to_groups(photo, group_ids, max_workers, results)
+            
+            batch = self.execute_batch()
+            posting = [group_id for group_id in group_ids if group_id not in results]
+            for group_id in posting:
+                params = {'owner_id': f"-{group_id}", 'message': message}
+                if from_group:
+                    params['from_group'] = 1
+                if group_id in attachments:
+                    params['attachments'] = attachments[group_id]
+                if guid:
+                    params['guid'] = f"{guid}-{group_id}"
+                batch.add('wall.post', params)
+            
+            for group_id, response in zip(posting, batch.execute()):
+                if isinstance(response, VKAPIError):
+                    results[group_id] = {'success': False, 'error': f"VK API Error: {response.message}"}
+                else:
+                    results[group_id] = {'success': True, 'post_id': response['post_id']}
+        except requests.exceptions.RequestException as e:
+            return {'success': False, 'error': f'Ошибка сети: {str(e)}', 'results': results}
+        except Exception as e:
+            return {'success': False, 'error': f'Ошибка публикации: {str(e)}', 'results': results}
+        
+        return {
+            'success': any(result['success'] for result in results.values()),
+            'results': {group_id: results[group_id] for group_id in group_ids}
+        }
+    
+    def _upload_to_groups(self, photo: PhotoSource, group_ids: List[str], max_workers: int,
+                          results: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Загрузить фото в альбомы нескольких групп
+        
+        Ошибки по отдельным группам записываются в results.
+        
+        Returns:
+            Вложения для wall.post по группам
+        """
+        batch = self.execute_batch()
+        for group_id in group_ids:
+            batch.add('photos.getUploadServer', {'group_id': group_id})
+        
+        upload_urls = {}
+        for group_id, server in zip(group_ids, batch.execute()):
+            if isinstance(server, VKAPIError):
+                results[group_id] = {'success': False, 'error': f"Ошибка получения сервера: {server.message}"}
+            else:
+                upload_urls[group_id] = server['upload_url']
+        
+        # Серверы загрузки у каждой группы свои - загружаем параллельно
+        uploads = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(upload_urls) or 1))) as executor:
+            futures = {
+                group_id: executor.submit(self._upload_file, upload_url, photo)
+                for group_id, upload_url in upload_urls.items()
+            }
+            for group_id, future in futures.items():
+                try:
+                    uploads[group_id] = future.result()
+                except Exception as e:
+                    results[group_id] = {'success': False, 'error': f'Ошибка загрузки фото: {str(e)}'}
+        
+        batch = self.execute_batch()
+        saving = list(uploads)
+        for group_id in saving:
+            batch.add('photos.save', self._photo_save_params(uploads[group_id], group_id))
+        
+        attachments = {}
+        for group_id, saved in zip(saving, batch.execute()):
+            if isinstance(saved, VKAPIError):
+                results[group_id] = {'success': False, 'error': f"Ошибка сохранения фото: {saved.message}"}
+            else:
+                attachments[group_id] = f"photo{saved[0]['owner_id']}_{saved[0]['id']}"
+        return attachments
+    
+    def schedule_post(self, message: str, publish_date: int, photo: Optional[PhotoSource] = None,
                      group_id: Optional[str] = None, from_group: bool = True) -> Dict[str, Any]:
         """
         Запланировать публикацию поста
@@ -253,7 +867,7 @@ class VKPublisher:
         Args:
             message: Текст поста
             publish_date: Unix timestamp времени публикации
-            photo_path: Путь к файлу фото (опционально)
+            photo: Фото - путь к файлу, bytes или файловый объект (опционально)
             group_id: ID группы для публикации
             from_group: Публиковать от имени группы
             
@@ -273,19 +887,16 @@ class VKPublisher:
             if from_group:
                 params['from_group'] = 1
         
-        # Добавляем фото если указано
-        if photo_path:
-            try:
-                photo_attachment = self.upload_photo(photo_path, group_id)
-                params['attachments'] = photo_attachment
-            except Exception as e:
-                return {
-                    'success': False,
-                    'error': f'Ошибка загрузки фото: {str(e)}'
-                }
+        # С фото: photos.save и wall.post выполняются одним запросом execute
+        if photo:
+            return self._publish_with_photo(
+                params, photo, group_id,
+                success_message='Пост успешно запланирован',
+                error_label='Ошибка планирования'
+            )
         
         try:
-            response = requests.get(url, params=params)
+            response = self._send('GET', url, write=True, params=params)
             
             # Проверяем статус ответа
             if response.status_code != 200:
@@ -326,6 +937,98 @@ class VKPublisher:
                 'error': f'Ошибка планирования: {str(e)}'
             }
     
+    def _format_post_id(self, post_id: str, group_id: Optional[str] = None) -> Optional[str]:
+        """
+        Формирует ID поста в формате wall.getById (-{group_id}_{post_id})
+        
+        Returns:
+            Строка ID или None, если post_id не указан
+        """
+        if group_id and post_id:
+            # Если передан и group_id и post_id, используем формат -{group_id}_{post_id}
+            return f"-{group_id}_{post_id}"
+        elif post_id and '_' in str(post_id):
+            # Если post_id уже содержит group_id (например, "233444174_1")
+            return f"-{post_id}"
+        elif post_id:
+            # Если только post_id, добавляем group_id из конфига
+            return f"-{self.group_id}_{post_id}"
+        return None
+    
+    def get_posts_stats(self, post_ids: List[str], group_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Получить статистику нескольких постов
+        
+        ID объединяются по WALL_GET_BY_ID_MAX_POSTS в один вызов wall.getById,
+        а сами вызовы отправляются пакетом через execute. Так 300 постов
+        требуют 3 вызова API внутри одного HTTP-запроса вместо 300 запросов.
+        
+        Args:
+            post_ids: Список ID постов
+            group_id: ID группы
+            
+        Returns:
+            Словарь со статистикой по каждому ID поста и списком ненайденных постов
+        """
+        # Сохраняем порядок и убираем повторы
+        requested = {}
+        for post_id in post_ids:
+            posts_param = self._format_post_id(str(post_id).strip(), group_id)
+            if posts_param is not None:
+                requested.setdefault(posts_param, str(post_id).strip())
+        
+        if not requested:
+            return {
+                'success': False,
+                'error': 'Не указаны ID постов'
+            }
+        
+        keys = list(requested)
+        batch = self.execute_batch()
+        for start in range(0, len(keys), WALL_GET_BY_ID_MAX_POSTS):
+            batch.add('wall.getById', {'posts': ','.join(keys[start:start + WALL_GET_BY_ID_MAX_POSTS])})
+        
+        try:
+            results = batch.execute()
+        except requests.exceptions.RequestException as e:
+            return {
+                'success': False,
+                'error': f'Ошибка сети: {str(e)}'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Ошибка получения статистики: {str(e)}'
+            }
+        
+        stats = {}
+        errors = []
+        for result in results:
+            if isinstance(result, VKAPIError):
+                errors.append(str(result))
+                continue
+            for post in result:
+                posts_param = f"{post.get('owner_id')}_{post.get('id')}"
+                post_id = requested.get(posts_param)
+                if post_id is None:
+                    continue
+                stats[post_id] = {
+                    'post_id': post.get('id'),
+                    'likes': post.get('likes', {}).get('count', 0),
+                    'reposts': post.get('reposts', {}).get('count', 0),
+                    'comments': post.get('comments', {}).get('count', 0),
+                    'views': post.get('views', {}).get('count', 0)
+                }
+        
+        response = {
+            'success': True,
+            'stats': stats,
+            'missing': [post_id for post_id in requested.values() if post_id not in stats]
+        }
+        if errors:
+            response['errors'] = errors
+        return response
+    
     def get_post_stats(self, post_id: str, group_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Получить статистику поста
@@ -339,17 +1042,8 @@ class VKPublisher:
         """
         url = f"{self.base_url}/wall.getById"
         
-        # Формируем правильный формат ID поста для VK API
-        if group_id and post_id:
-            # Если передан и group_id и post_id, используем формат -{group_id}_{post_id}
-            posts_param = f"-{group_id}_{post_id}"
-        elif post_id and '_' in str(post_id):
-            # Если post_id уже содержит group_id (например, "233444174_1")
-            posts_param = f"-{post_id}"
-        elif post_id:
-            # Если только post_id, добавляем group_id из конфига
-            posts_param = f"-{self.group_id}_{post_id}"
-        else:
+        posts_param = self._format_post_id(post_id, group_id)
+        if posts_param is None:
             return {
                 'success': False,
                 'error': 'Не указан ID поста'
@@ -363,7 +1057,7 @@ class VKPublisher:
         
         try:
             print(f"Requesting VK post stats with params: {params}")
-            response = requests.get(url, params=params)
+            response = self._send('GET', url, params=params)
             if response.status_code != 200:
                 return {
                     'success': False,
@@ -471,7 +1165,7 @@ class VKPublisher:
             
         try:
             print(f"Requesting VK group stats with params: {params}")
-            response = requests.get(url, params=params)
+            response = self._send('GET', url, params=params)
             data = response.json()
             
             # Отладочная информация
@@ -519,6 +1213,28 @@ class VKPublisher:
                 'error': f'Ошибка получения статистики сообщества: {str(e)}'
             }
     
+    def get_group_stats_periods(self, group_id: str, timestamp_from: int, timestamp_to: int) -> List[Dict[str, Any]]:
+        """
+        Получить дневную статистику сообщества без агрегации
+        
+        Args:
+            group_id: ID группы
+            timestamp_from: Начало периода (Unix timestamp)
+            timestamp_to: Конец периода (Unix timestamp)
+            
+        Returns:
+            Список периодов stats.get с interval=day
+            
+        Raises:
+            VKAPIError: если API вернуло ошибку
+        """
+        return self._call_api('stats.get', {
+            'group_id': group_id,
+            'interval': 'day',
+            'timestamp_from': timestamp_from,
+            'timestamp_to': timestamp_to
+        })
+    
     def get_app_stats(self, app_id: str, date_from: Optional[str] = None,
                      date_to: Optional[str] = None, interval: str = 'day') -> Dict[str, Any]:
         """
@@ -558,7 +1274,7 @@ class VKPublisher:
                 pass  # Игнорируем неверный формат даты
             
         try:
-            response = requests.get(url, params=params)
+            response = self._send('GET', url, params=params)
             data = response.json()
             
             if 'error' in data:
@@ -0,0 +1,138 @@
+import hashlib
+import random
+import threading
+import time
+from typing import Optional, Dict, Any
+
+# Коды ошибок VK, после которых запрос имеет смысл повторить:
+# 6 - слишком много запросов в секунду, 9 - flood control, 10 - внутренняя ошибка сервера
+RETRYABLE_ERROR_CODES = (6, 9, 10)
+
+# Ошибки, с которыми VK отклоняет запрос до выполнения. Только их можно повторять
+# для записи (wall.post, photos.save): после ошибки 10 пост мог уже опубликоваться
+REJECTED_ERROR_CODES = (6, 9)
+
+# Настройки ограничения запросов (меняются через configure_rate_limit)
+_settings = {
+    'requests_per_second': 3.0,
+    'burst': 3,
+    'max_retries': 5,
+    'backoff_base': 0.5,
+    'backoff_max': 8.0
+}
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+class TokenBucket:
+    """
+    Token bucket для одного токена доступа VK
+
+    Хранит метрики ожидания в очереди: число запросов, суммарное и
+    максимальное время ожидания, число повторов после ошибок лимита.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        Args:
+            rate: Скорость пополнения (запросов в секунду)
+            capacity: Емкость (допустимый всплеск запросов)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.retries = 0
+
+    def acquire(self) -> float:
+        """
+        Резервирует право на запрос, при необходимости ожидая
+
+        Резервирование выполняется под блокировкой, а ожидание - вне ее,
+        поэтому потоки обслуживаются по порядку обращения.
+
+        Returns:
+            Время ожидания в секундах
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+            self.requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'total_wait': round(self.total_wait, 3),
+                'avg_wait': round(self.total_wait / self.requests, 3) if self.requests else 0.0,
+                'max_wait': round(self.max_wait, 3)
+            }
+
+def _token_label(access_token: str) -> str:
+    """Короткий отпечаток токена для метрик (сам токен не раскрывается)"""
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:8]
+
+def configure_rate_limit(requests_per_second: Optional[float] = None, burst: Optional[int] = None,
+                         max_retries: Optional[int] = None, backoff_base: Optional[float] = None,
+                         backoff_max: Optional[float] = None):
+    """
+    Настраивает ограничение запросов к API VK
+
+    Args:
+        requests_per_second: Допустимая частота запросов на один токен
+        burst: Допустимый всплеск запросов
+        max_retries: Максимум повторов после ошибок 6/9/10
+        backoff_base: Базовая задержка экспоненциального отката в секундах
+        backoff_max: Максимальная задержка отката в секундах
+    """
+    with _buckets_lock:
+        for key, value in (('requests_per_second', requests_per_second), ('burst', burst),
+                           ('max_retries', max_retries), ('backoff_base', backoff_base),
+                           ('backoff_max', backoff_max)):
+            if value is not None:
+                _settings[key] = value
+        _buckets.clear()
+
+def get_bucket(access_token: str) -> TokenBucket:
+    """Возвращает общий для процесса token bucket токена доступа"""
+    with _buckets_lock:
+        bucket = _buckets.get(access_token)
+        if bucket is None:
+            bucket = TokenBucket(_settings['requests_per_second'], _settings['burst'])
+            _buckets[access_token] = bucket
+        return bucket
+
+def max_retries() -> int:
+    return _settings['max_retries']
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальный откат с полным джиттером для попытки attempt (с 0)"""
+    cap = min(_settings['backoff_max'], _settings['backoff_base'] * (2 ** attempt))
+    return random.uniform(0, cap)
+
+def get_metrics() -> Dict[str, Any]:
+    """Метрики ожидания в очереди по всем токенам процесса"""
+    with _buckets_lock:
+        buckets = dict(_buckets)
+    return {
+        'settings': dict(_settings),
+        'tokens': {_token_label(token): bucket.metrics() for token, bucket in buckets.items()}
+    }
@@ -5,7 +5,7 @@ from pathlib import Path
 # Добавляем путь к папке generators
 sys.path.append(str(Path(__file__).parent / 'generators'))
 
-from text_gen import TextGenerator
+from text_gen import TextGenerator, PostRequest
 #from image_gen import ImageGenerator
 from pathlib import Path
 
@@ -20,10 +20,11 @@ deepseek_api_key = config['api_keys']['deepseek']
 deepseek_base_url = config['api_urls']['deepseek']
 stable_diffusion_base_url = config['api_urls']['stable_diffusion']
 
-post_gen = TextGenerator(deepseek_api_key, deepseek_base_url, tone="позитивный и весёлый", topic="""
+post_gen = TextGenerator(deepseek_api_key, deepseek_base_url)
+post_request = PostRequest(tone="позитивный и весёлый", topic="""
 Новая коллекция кухонных ножей от компании ZeroKnifes""")
-content = post_gen.generate_post()
-img_desc = post_gen.generate_post_image_description()
+content = post_gen.generate_post(post_request)
+img_desc = post_gen.generate_post_image_description(post_request)
 
 #img_gen = ImageGenerator(stable_diffusion_base_url)
 #image_file_name = img_gen.generate_and_save(img_desc)
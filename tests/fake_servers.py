@@ -0,0 +1,290 @@
+import hashlib
+import itertools
+import json
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиент закрыл соединение по таймауту - для тестов это ожидаемо
+        pass
+
+class FakeServer:
+    """
+    Локальный HTTP-сервер для тестов в отдельном потоке
+
+    Считает одновременные запросы (inflight, max_inflight), чтобы тесты
+    могли проверить, что запросы действительно шли параллельно, и
+    принятые TCP-соединения (connections) - для проверки keep-alive.
+    """
+
+    def __init__(self, handler_class):
+        self.inflight = 0
+        self.max_inflight = 0
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        handler_class.server_state = self
+        self._server = _QuietServer(('127.0.0.1', 0), handler_class)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def enter(self):
+        with self._lock:
+            self.requests += 1
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+
+    def leave(self):
+        with self._lock:
+            self.inflight -= 1
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_state = None
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # Заголовки и тело ответа пишутся отдельно: без TCP_NODELAY на keep-alive
+        # соединении второй сегмент ждет отложенного ACK клиента (~40 мс)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server_state.connected()
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _json(self, obj, status: int = 200):
+        body = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class FakeOpenAIHandler(JSONHandler):
+    """
+    OpenAI-совместимый /chat/completions
+
+    Отвечает через delay секунд текстом последнего сообщения пользователя,
+    поэтому по ответу видно, на какой запрос он пришел.
+    """
+
+    delay = 0.0
+
+    def do_POST(self):
+        state = self.server_state
+        state.enter()
+        try:
+            request = json.loads(self._body() or b'{}')
+            if not self.path.endswith('/chat/completions'):
+                return self._json({'error': {'message': 'not found'}}, 404)
+            time.sleep(self.delay)
+            self._json({
+                'id': 'chatcmpl-test',
+                'object': 'chat.completion',
+                'created': 0,
+                'model': request.get('model', 'test'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': request['messages'][-1]['content']},
+                    'finish_reason': 'stop'
+                }]
+            })
+        finally:
+            state.leave()
+
+def fake_openai_server(delay: float = 0.0) -> FakeServer:
+    """Запускает OpenAI-совместимый сервер с задержкой ответа delay секунд"""
+    handler = type('Handler', (FakeOpenAIHandler,), {'delay': delay})
+    return FakeServer(handler).start()
+
+class FakeVKHandler(JSONHandler):
+    """
+    Минимальный API VK: /method/<имя> и сервер загрузки фото /upload
+
+    Поддерживает execute со списком вызовов API.m({...}) и скрипт
+    публикации с фото из VKPublisher._save_photo_and_post. Если rps
+    больше нуля, запросы к API сверх rps в секунду на токен получают
+    ошибку 6, как на настоящем API.
+    """
+
+    rps = 0
+
+    def _params(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self._body()
+        if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            params.update({key: values[0] for key, values in parse_qs(body.decode('utf-8')).items()})
+        return url.path, params, body
+
+    def _handle(self):
+        state = self.server_state
+        state.enter()
+        try:
+            path, params, body = self._params()
+            if path == '/upload':
+                return self._json(state.vk.upload(body))
+            method = path.rsplit('/', 1)[-1]
+            if not state.vk.allow(params.get('access_token'), self.rps):
+                return self._json({'error': {'error_code': 6, 'error_msg': 'Too many requests per second'}})
+            state.vk.methods[method] += 1
+            error_code = state.vk.next_error(method)
+            if error_code is not None:
+                return self._json({'error': {'error_code': error_code, 'error_msg': 'Injected error'}})
+            if method == 'execute':
+                return self._json(state.vk.execute(params['code']))
+            try:
+                return self._json({'response': state.vk.call(method, params)})
+            except KeyError:
+                return self._json({'error': {'error_code': 3, 'error_msg': 'Unknown method passed'}})
+        finally:
+            state.leave()
+
+    do_GET = _handle
+    do_POST = _handle
+
+class FakeVK:
+    """Состояние фейкового API VK: вызовы, загруженные и сохраненные фото, отказы по лимиту"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.methods = Counter()
+        self.uploads = []
+        self.saved = []
+        self.throttled = 0
+        # Ошибки, которые вернут следующие вызовы метода: {метод: [код, ...]}
+        self.errors = {}
+        self._history = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def allow(self, token: str, rps: float) -> bool:
+        if not rps:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            history = [moment for moment in self._history.get(token, []) if now - moment < 1.0]
+            allowed = len(history) < rps
+            if allowed:
+                history.append(now)
+            else:
+                self.throttled += 1
+            self._history[token] = history
+            return allowed
+
+    def next_error(self, method: str) -> Optional[int]:
+        with self._lock:
+            codes = self.errors.get(method)
+            return codes.pop(0) if codes else None
+
+    def upload(self, body: bytes) -> dict:
+        # Содержимое файла - между заголовками части и закрывающим разделителем
+        start = body.index(b'\r\n\r\n') + 4
+        end = body.rindex(b'\r\n--')
+        data = body[start:end]
+        with self._lock:
+            self.uploads.append(data)
+        return {'server': 1, 'photo': json.dumps({'size': len(data)}), 'hash': hashlib.md5(data).hexdigest()}
+
+    def call(self, method: str, params: dict):
+        if method == 'users.get':
+            return [{'id': 1, 'first_name': 'Test', 'last_name': 'User'}]
+        if method == 'groups.getById':
+            return [{'id': int(params['group_id']), 'name': f"group {params['group_id']}"}]
+        if method == 'photos.getUploadServer':
+            return {'upload_url': f"{self.url}/upload?group_id={params.get('group_id')}"}
+        if method == 'photos.save':
+            photo_id = next(self._ids)
+            with self._lock:
+                self.saved.append(params)
+            return [{'owner_id': -int(params.get('group_id', 1)), 'id': photo_id}]
+        if method == 'wall.post':
+            return {'post_id': next(self._ids)}
+        if method == 'wall.getById':
+            posts = []
+            for item in str(params['posts']).split(','):
+                owner_id, post_id = (int(part) for part in item.rsplit('_', 1))
+                posts.append({
+                    'id': post_id, 'owner_id': owner_id,
+                    'likes': {'count': post_id % 7}, 'reposts': {'count': post_id % 3},
+                    'comments': {'count': post_id % 5}, 'views': {'count': post_id * 10}
+                })
+            return posts
+        raise KeyError(method)
+
+    def execute(self, code: str) -> dict:
+        calls = self._parse_calls(code)
+        if code.startswith('var photo = API.photos.save('):
+            # Скрипт публикации с фото: photos.save и wall.post по цепочке
+            photo = self.call('photos.save', calls[0][1])[0]
+            self.methods['photos.save'] += 1
+            self.methods['wall.post'] += 1
+            return {'response': self.call('wall.post', {'attachments': f"photo{photo['owner_id']}_{photo['id']}"})}
+
+        results, errors = [], []
+        for method, params in calls:
+            try:
+                results.append(self.call(method, params))
+            except KeyError:
+                results.append(False)
+                errors.append({'method': method, 'error_code': 3, 'error_msg': 'Unknown method passed'})
+        data = {'response': results}
+        if errors:
+            data['execute_errors'] = errors
+        return data
+
+    @staticmethod
+    def _parse_calls(code: str):
+        decoder = json.JSONDecoder()
+        calls = []
+        position = code.find('API.')
+        while position >= 0:
+            bracket = code.index('(', position)
+            method = code[position + 4:bracket]
+            try:
+                params, position = decoder.raw_decode(code, bracket + 1)
+            except ValueError:
+                # Параметры - выражение VKScript (wall.post с фото), а не JSON
+                params, position = {}, bracket + 1
+            calls.append((method, params))
+            position = code.find('API.', position)
+        return calls
+
+def fake_vk_server(rps: float = 0) -> FakeServer:
+    """
+    Запускает фейковый API VK
+
+    Адрес API - f'{server.url}/method', состояние - server.vk (FakeVK).
+    """
+    handler = type('Handler', (FakeVKHandler,), {'rps': rps})
+    server = FakeServer(handler)
+    server.vk = FakeVK(server.url)
+    return server.start()
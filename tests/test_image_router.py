@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+
+from generators.image_gen import ImageGenerator
+from generators.image_providers import ImageProvider, RouterProvider, run_sync
+
+class EnhancingProvider(ImageProvider):
+    """Провайдер, который улучшает промпт, как gpt4o; изображение - байты промпта"""
+
+    name = 'enhancing'
+
+    def __init__(self, config=None):
+        super().__init__(config or {})
+        self.model_name = 'text+image'
+        self.prepared = []
+
+    def enhance_enabled(self, enhance=None):
+        return True if enhance is None else bool(enhance)
+
+    async def prepare_prompt(self, prompt, enhance=None):
+        if not self.enhance_enabled(enhance):
+            return prompt
+        self.prepared.append(prompt)
+        return f'enhanced {prompt}'
+
+    def model_for(self, enhance=None):
+        return self.model_name if self.enhance_enabled(enhance) else 'image'
+
+    async def generate(self, prompt, size="1024x1024", quality="standard", n=1, seed=None, progress=None):
+        return [prompt.encode('utf-8')]
+
+class FakeProvider(ImageProvider):
+    """Провайдер с фиксированной задержкой, который может отвечать ошибкой"""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        super().__init__({})
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def generate(self, prompt, size="1024x1024", quality="standard", n=1, seed=None, progress=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f'{self.name} is down')
+        return [self.name.encode('utf-8')]
+
+def make_router(*backends, **config):
+    return RouterProvider(config, list(backends))
+
+def make_generator():
+    generator = ImageGenerator({'provider': 'router', 'router': {'providers': ['webui']}})
+    backend = EnhancingProvider()
+    generator.backend = RouterProvider({}, [backend])
+    return generator, backend
+
+def test_router_passes_enhance_to_backend():
+    generator, _ = make_generator()
+
+    assert generator.generate_image_bytes('кот') == ['enhanced кот'.encode('utf-8')]
+    assert generator.generate_image_bytes('кот', enhance=True) == ['enhanced кот'.encode('utf-8')]
+    assert generator.generate_image_bytes('кот', enhance=False) == ['кот'.encode('utf-8')]
+
+def test_router_generate_uses_prompt_as_is():
+    generator, backend = make_generator()
+
+    assert run_sync(generator.backend.generate('готовый промпт')) == ['готовый промпт'.encode('utf-8')]
+    assert backend.prepared == []
+
+def test_router_cache_key_depends_on_enhance():
+    generator, _ = make_generator()
+
+    assert generator.backend.model_for(True) == 'text+image'
+    assert generator.backend.model_for(False) == 'image'
+    assert generator.cache_key('кот', enhance=True) != generator.cache_key('кот', enhance=False)
+    assert generator.cache_key('кот') == generator.cache_key('кот', enhance=True)
+
+def test_router_prefetches_prompt():
+    generator, backend = make_generator()
+
+    assert generator.backend.enhance_enabled()
+    assert not generator.prefetch_prompt('кот', enhance=False)
+    assert generator.prefetch_prompt('кот')
+
+    deadline = time.monotonic() + 2
+    while not backend.prepared and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert backend.prepared == ['кот']
+
+def test_slow_provider_is_demoted_after_losing_hedge():
+    slow, fast = FakeProvider('slow', delay=0.5), FakeProvider('fast', delay=0.02)
+    router = make_router(slow, fast, hedge_delay=0.1)
+
+    results = [run_sync(router.generate('кот')) for _ in range(5)]
+
+    assert results == [[b'fast']] * 5
+    # Первый запрос ушел медленному и был продублирован, дальше - сразу быстрому
+    assert slow.calls == 1
+    assert fast.calls == 5
+    assert router.health[0].latency > router.health[1].latency
+
+def test_failed_provider_fails_over_to_next():
+    broken, backup = FakeProvider('broken', fail=True), FakeProvider('backup')
+    router = make_router(broken, backup, hedge_delay=None)
+
+    assert run_sync(router.generate('кот')) == [b'backup']
+    assert broken.calls == 1
+    assert router.health[0].failures == 1
+
+def test_all_providers_failed():
+    router = make_router(FakeProvider('a', fail=True), FakeProvider('b', fail=True), hedge_delay=None)
+
+    with pytest.raises(Exception, match='All image providers failed'):
+        run_sync(router.generate('кот'))
+
+def test_circuit_opens_and_half_opens():
+    flaky = FakeProvider('flaky', fail=True)
+    router = make_router(flaky, hedge_delay=None, failure_threshold=2, reset_timeout=0.2)
+    health = router.health[0]
+
+    for _ in range(2):
+        with pytest.raises(Exception, match='flaky is down'):
+            run_sync(router.generate('кот'))
+    assert health.state == 'open'
+
+    # Разомкнутая цепь - провайдер не получает запросов
+    with pytest.raises(Exception, match='circuit open'):
+        run_sync(router.generate('кот'))
+    assert flaky.calls == 2
+
+    # После reset_timeout - один пробный запрос; ошибка снова размыкает цепь
+    time.sleep(0.25)
+    assert health.state == 'half_open'
+    with pytest.raises(Exception, match='flaky is down'):
+        run_sync(router.generate('кот'))
+    assert flaky.calls == 3
+    assert health.state == 'open'
+
+    # Успешный пробный запрос возвращает провайдер в работу
+    flaky.fail = False
+    time.sleep(0.25)
+    assert run_sync(router.generate('кот')) == [b'flaky']
+    assert health.state == 'closed'
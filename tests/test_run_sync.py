@@ -0,0 +1,34 @@
+import asyncio
+import threading
+
+import pytest
+
+from generators.image_providers import GenerationCancelled, RenderProgress, run_sync
+
+def slow_render(cancelled: threading.Event):
+    async def render():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    return render()
+
+def test_cancel_requested_by_on_tick():
+    cancelled = threading.Event()
+    progress = RenderProgress(lambda progress: True, interval=0.01)
+
+    with pytest.raises(GenerationCancelled):
+        run_sync(slow_render(cancelled), progress)
+    assert cancelled.wait(1)
+
+def test_failing_on_tick_cancels_render():
+    cancelled = threading.Event()
+
+    def on_tick(progress):
+        raise RuntimeError('database is locked')
+
+    with pytest.raises(RuntimeError, match='database is locked'):
+        run_sync(slow_render(cancelled), RenderProgress(on_tick, interval=0.01))
+    # Генерация не продолжается в цикле событий после ошибки
+    assert cancelled.wait(1)
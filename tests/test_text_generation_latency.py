@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from generators.text_gen import TextGenerator, PostRequest
+from tests.fake_servers import fake_openai_server
+
+DELAY = 0.5
+
+@pytest.fixture
+def server():
+    server = fake_openai_server(delay=DELAY)
+    yield server
+    server.stop()
+
+def make_generator(server, timeout=5.0):
+    return TextGenerator(api_key='test', base_url=f'{server.url}/v1', timeout=timeout)
+
+def test_post_and_image_prompt_run_concurrently(server):
+    generator = make_generator(server)
+    request = PostRequest(topic='воздух Исландии', tone='восторженный')
+
+    started = time.monotonic()
+    message, image_description = generator.generate_post_with_image_description(request)
+    elapsed = time.monotonic() - started
+
+    # Два запроса к модели параллельно - задержка примерно одного вызова, а не двух
+    assert elapsed < DELAY * 1.6
+    assert server.max_inflight == 2
+    assert 'воздух Исландии' in message and 'восторженный' in message
+    assert 'воздух Исландии' in image_description
+
+def test_timeout_is_shared_by_both_calls(server):
+    generator = make_generator(server, timeout=DELAY / 2)
+    request = PostRequest(topic='тема', tone='тон')
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        generator.generate_post_with_image_description(request)
+    # Общий срок на оба ответа, а не по таймауту на каждый
+    assert time.monotonic() - started < DELAY
@@ -0,0 +1,50 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from generators.text_gen import TextGenerator, PostRequest
+
+THREADS = 32
+REQUESTS = 200
+
+class EchoCompletions:
+    """Имитация chat.completions: отвечает текстом запроса после случайной паузы"""
+
+    def create(self, model, messages, timeout=None, **params):
+        # Пауза перемешивает запросы разных потоков во времени
+        time.sleep(random.uniform(0, 0.005))
+        content = messages[-1]['content']
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+def make_generator():
+    generator = TextGenerator(api_key='test', base_url='http://127.0.0.1:9', max_workers=8)
+    generator.client = SimpleNamespace(chat=SimpleNamespace(completions=EchoCompletions()))
+    return generator
+
+def make_requests():
+    return [PostRequest(topic=f'тема-{i:04d}', tone=f'тон-{i:04d}') for i in range(REQUESTS)]
+
+def test_concurrent_posts_do_not_mix_prompts():
+    generator = make_generator()
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(lambda request: (request, generator.generate_post(request)), make_requests()))
+
+    for request, message in results:
+        assert f'тон: {request.tone},' in message
+        assert message.endswith(f'темой {request.topic}')
+
+def test_concurrent_post_and_image_prompt_do_not_mix():
+    generator = make_generator()
+
+    def generate(request):
+        return request, generator.generate_post_with_image_description(request)
+
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        results = list(pool.map(generate, make_requests()))
+
+    for request, (message, image_description) in results:
+        assert message.endswith(f'темой {request.topic}')
+        assert f'тон: {request.tone},' in message
+        assert f'темой {request.topic}.' in image_description
@@ -0,0 +1,216 @@
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from generators import image_prep, vk_rate_limiter, vk_publisher
+from generators.vk_publisher import VKPublisher, VKAPIError, EXECUTE_MAX_CALLS
+from tests.fake_servers import FakeServer, JSONHandler, fake_vk_server
+
+@pytest.fixture
+def rate_limit():
+    """Настройки лимита запросов на время теста с восстановлением исходных"""
+    saved = dict(vk_rate_limiter._settings)
+    yield vk_rate_limiter.configure_rate_limit
+    vk_rate_limiter.configure_rate_limit(**saved)
+
+@pytest.fixture
+def server(rate_limit):
+    # Без ограничения на клиенте, если тест не задал свое
+    rate_limit(requests_per_second=1000, burst=1000)
+    server = fake_vk_server()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def raw_photos(monkeypatch):
+    """Фото загружаются как есть, без пересжатия image_prep"""
+    monkeypatch.setitem(image_prep._settings, 'enabled', False)
+
+def make_publisher(server, token='token'):
+    return VKPublisher(token, group_id='42', base_url=f'{server.url}/method')
+
+def test_execute_batch_splits_calls_by_limit(server):
+    publisher = make_publisher(server)
+    batch = publisher.execute_batch()
+    for group_id in range(1, 61):
+        batch.add('groups.getById', {'group_id': group_id})
+    batch.add('groups.unknown', {})
+
+    results = batch.execute()
+
+    # 61 вызов - три запроса execute по EXECUTE_MAX_CALLS, а не 61 запрос
+    assert server.vk.methods == {'execute': -(-61 // EXECUTE_MAX_CALLS)}
+    assert [result[0]['id'] for result in results[:60]] == list(range(1, 61))
+    assert isinstance(results[60], VKAPIError)
+    assert results[60].code == 3
+
+def test_posts_stats_use_one_request(server):
+    publisher = make_publisher(server)
+    post_ids = [str(post_id) for post_id in range(1, 251)]
+
+    result = publisher.get_posts_stats(post_ids)
+
+    assert result['success']
+    assert result['missing'] == []
+    assert server.vk.methods == {'execute': 1}
+    assert result['stats']['10'] == {'post_id': 10, 'likes': 3, 'reposts': 1, 'comments': 0, 'views': 100}
+
+def test_publish_post_with_photo(server, raw_photos, tmp_path):
+    publisher = make_publisher(server)
+    photo = os.urandom(300 * 1024)
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(photo)
+
+    for source in (photo, str(path)):
+        result = publisher.publish_post('Пост с фото', photo=source, group_id='42')
+        assert result['success'], result
+
+    # Файл дошел до сервера загрузки без изменений, а photos.save получил его hash
+    assert server.vk.uploads == [photo, photo]
+    assert [saved['hash'] for saved in server.vk.saved] == [hashlib.md5(photo).hexdigest()] * 2
+    assert all(saved['group_id'] == '42' for saved in server.vk.saved)
+    # getUploadServer и один execute на пост: photos.save и wall.post внутри него
+    assert server.vk.methods['photos.getUploadServer'] == 2
+    assert server.vk.methods['execute'] == 2
+
+def test_upload_photo_returns_attachment(server, raw_photos):
+    publisher = make_publisher(server)
+
+    attachment = publisher.upload_photo(b'photo-bytes', group_id='42')
+
+    assert attachment.startswith('photo-42_')
+    assert server.vk.uploads == [b'photo-bytes']
+
+def test_publish_to_groups_batches_calls(server, raw_photos):
+    publisher = make_publisher(server)
+    group_ids = [str(group_id) for group_id in range(1, 31)]
+
+    result = publisher.publish_to_groups('Пост', group_ids, photo=b'photo-bytes')
+
+    assert result['success']
+    assert all(result['results'][group_id]['success'] for group_id in group_ids)
+    assert len(server.vk.uploads) == 30
+    # getUploadServer, photos.save и wall.post - по 2 execute на 30 групп
+    assert server.vk.methods == {'execute': 6}
+
+def test_rate_limit_errors_are_retried(rate_limit):
+    # Клиент без ограничения упирается в лимит сервера и повторяет запросы
+    rate_limit(requests_per_second=1000, burst=1000, max_retries=20, backoff_base=0.05, backoff_max=0.5)
+    server = fake_vk_server(rps=10)
+    try:
+        publisher = make_publisher(server)
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(pool.map(lambda _: publisher.check_token(), range(20)))
+    finally:
+        server.stop()
+
+    assert all(result['success'] for result in results)
+    assert server.vk.throttled > 0
+    assert vk_rate_limiter.get_bucket('token').metrics()['retries'] == server.vk.throttled
+
+def test_token_bucket_stays_under_server_limit(rate_limit):
+    rate_limit(requests_per_second=8, burst=1)
+    server = fake_vk_server(rps=10)
+    try:
+        publisher = make_publisher(server)
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda _: publisher.check_token(), range(12)))
+        elapsed = time.monotonic() - started
+    finally:
+        server.stop()
+
+    assert all(result['success'] for result in results)
+    assert server.vk.throttled == 0
+    # 12 запросов при 8 в секунду без всплеска - не меньше 11/8 секунды
+    assert elapsed >= 11 / 8 * 0.9
+
+def test_session_reuses_connections(server):
+    publisher = make_publisher(server)
+
+    for _ in range(10):
+        assert publisher.check_token()['success']
+
+    assert server.requests == 10
+    assert server.connections == 1
+
+def test_internal_error_retried_only_for_reads(rate_limit, raw_photos):
+    rate_limit(requests_per_second=1000, burst=1000, backoff_base=0.01)
+    server = fake_vk_server()
+    try:
+        publisher = make_publisher(server)
+        server.vk.errors = {'users.get': [10], 'wall.post': [10], 'execute': [10]}
+
+        # Чтение повторяется после внутренней ошибки VK
+        assert publisher.check_token()['success']
+        assert server.vk.methods['users.get'] == 2
+
+        # Пост мог уже опубликоваться - без повтора
+        assert not publisher.publish_post('Пост', group_id='42')['success']
+        assert server.vk.methods['wall.post'] == 1
+        assert not publisher.publish_post('Пост', photo=b'photo-bytes', group_id='42')['success']
+        assert server.vk.methods['execute'] == 1
+
+        # Ошибка 6 означает, что запрос отклонен до выполнения - его повторяем и для записи
+        server.vk.errors = {'wall.post': [6]}
+        assert publisher.publish_post('Пост', group_id='42')['success']
+        assert server.vk.methods['wall.post'] == 3
+    finally:
+        server.stop()
+
+def test_execute_batch_with_writes_is_not_retried(server):
+    publisher = make_publisher(server)
+    server.vk.errors = {'execute': [10]}
+
+    reads = publisher.execute_batch()
+    reads.add('groups.getById', {'group_id': 1})
+    assert reads.execute()[0][0]['id'] == 1
+
+    server.vk.errors = {'execute': [10]}
+    writes = publisher.execute_batch()
+    writes.add('wall.post', {'owner_id': -1, 'message': 'Пост'})
+    with pytest.raises(VKAPIError):
+        writes.execute()
+    assert server.vk.methods['execute'] == 3
+
+class BadGatewayHandler(JSONHandler):
+    """Шлюз перед API отвечает 502 - запрос мог уже выполниться"""
+
+    def _handle(self):
+        self.server_state.enter()
+        try:
+            self._body()
+            self._json({'error': 'bad gateway'}, 502)
+        finally:
+            self.server_state.leave()
+
+    do_GET = _handle
+    do_POST = _handle
+
+@pytest.fixture
+def one_retry():
+    retries = vk_publisher._session_settings['retries']
+    vk_publisher.configure_session(retries=1)
+    yield
+    vk_publisher.configure_session(retries=retries)
+
+def test_gateway_errors_retry_only_get(rate_limit, one_retry):
+    rate_limit(requests_per_second=1000, burst=1000)
+    server = FakeServer(BadGatewayHandler).start()
+    try:
+        publisher = make_publisher(server)
+
+        with pytest.raises(requests.exceptions.RequestException):
+            publisher._request('wall.post', {'message': 'Пост'}, http_method='POST')
+        # POST не повторяется: VK мог уже опубликовать пост
+        assert server.requests == 1
+
+        with pytest.raises(requests.exceptions.RequestException):
+            publisher._request('users.get')
+        assert server.requests == 1 + 2
+    finally:
+        server.stop()